@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""原子写入输出文件，内容没有变化时不替换
+
+先写入同目录下的临时文件，再与现有文件比较sha256: 内容相同时删除临时文件，现有文件
+(包括修改时间)保持不变；不同时用os.replace原子替换，读取方不会看到写了一半的文件。
+监视配置文件的Clash只在内容确实改变时才会重新加载。
+"""
+
+import hashlib
+import os
+import tempfile
+
+def file_sha256(path):
+    """计算文件内容的sha256，文件不存在时返回None"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def _new_file_mode(probe_path):
+    """新建文件的权限，与open()创建文件时相同
+
+    mkstemp创建的文件权限固定为0600，这里按open()的方式创建probe_path，由系统应用umask后读取权限。
+    不通过os.umask读取，它会临时修改整个进程的umask，在多线程的服务中不安全。
+    """
+    fd = os.open(probe_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        return os.fstat(fd).st_mode & 0o7777
+    finally:
+        os.close(fd)
+        os.remove(probe_path)
+
+class AtomicWriter:
+    """with AtomicWriter(path) as f: ... 写入临时文件，退出with块时替换path
+
+    退出后changed表示文件内容是否改变，sha256为写入内容的哈希。with块内抛出异常时
+    删除临时文件，path保持不变。path是符号链接时替换链接指向的文件。
+    """
+
+    def __init__(self, path, binary=False, encoding='utf-8', newline=None):
+        self.path = os.path.realpath(path)
+        self.binary = binary
+        self.encoding = encoding
+        self.newline = newline
+        self.changed = None
+        self.sha256 = None
+        self._file = None
+        self._temp_path = None
+
+    def __enter__(self):
+        directory, name = os.path.split(self.path)
+        fd, self._temp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+        try:
+            if self.binary:
+                self._file = os.fdopen(fd, 'wb')
+            else:
+                self._file = os.fdopen(fd, 'w', encoding=self.encoding, newline=self.newline)
+        except BaseException:
+            os.close(fd)
+            os.remove(self._temp_path)
+            raise
+        return self._file
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._file.close()
+            if exc_type is not None:
+                return False
+
+            self.sha256 = file_sha256(self._temp_path)
+            self.changed = self.sha256 != file_sha256(self.path)
+            if self.changed:
+                try:
+                    mode = os.stat(self.path).st_mode & 0o7777
+                except FileNotFoundError:
+                    mode = _new_file_mode(self._temp_path + '.mode')
+                os.chmod(self._temp_path, mode)
+                os.replace(self._temp_path, self.path)
+        finally:
+            if os.path.exists(self._temp_path):
+                os.remove(self._temp_path)
+        return False
+
+def write_if_changed(path, data, encoding='utf-8'):
+    """原子写入字符串或字节，返回文件内容是否改变"""
+    binary = isinstance(data, bytes)
+    writer = AtomicWriter(path, binary=binary, encoding=encoding)
+    with writer as f:
+        f.write(data)
+    return writer.changed
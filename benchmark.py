@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""性能基准测试
+
+生成指定规模的合成vmess链接和original_config.yaml(ws/h2/grpc/http混合)，分别测量
+decode_vmess_link、vmess_to_clash_config、process_vmess_links、generate_clash_config、
+process_config以及rebuild_yaml完整流程的耗时、吞吐量和tracemalloc峰值内存，
+并比较同一配置输出为YAML和JSON后的加载耗时。compact_proxies与vmess_to_clash_config相同，
+但把结果转换为proxy_model的紧凑表示，两者的峰值内存之差就是紧凑表示节省的内存；
+dump_yaml和dump_streaming分别测量整体序列化与分批写入文件的峰值内存。
+结果可以保存为JSON基线，之后与基线比较，超过阈值时以非零状态退出。
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import clash_template
+import proxy_model
+import rebuild_yaml
+import serializer
+import vmess_to_yaml
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_NETWORKS = ['ws', 'h2', 'grpc', 'http']
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.3
+MIN_ROUND_SECONDS = 0.2
+BASELINE_VERSION = 1
+
+REGIONS = [
+    ('香港', '🇭🇰'), ('台湾', '🇹🇼'), ('日本', '🇯🇵'), ('新加坡', '🇸🇬'),
+    ('美国', '🇺🇸'), ('韩国', '🇰🇷'), ('英国', '🇬🇧'), ('德国', '🇩🇪'),
+]
+
+def synthetic_vmess_data(index, network, rng):
+    """生成一个vmess节点的JSON数据"""
+    region, flag = REGIONS[index % len(REGIONS)]
+    tls = rng.random() < 0.5
+    host = f"cdn{index % 97}.example.com"
+    data = {
+        'v': '2',
+        'ps': f"{flag} {region} {index:06d}",
+        'add': f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        'port': str(rng.choice([443, 8443, 80, 2053, 2096, rng.randint(10000, 60000)])),
+        'id': '%08x-%04x-%04x-%04x-%012x' % (rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16),
+                                             rng.getrandbits(16), rng.getrandbits(48)),
+        'aid': '0',
+        'scy': 'auto',
+        'net': network,
+        'type': 'none',
+        'host': host,
+        'path': f"/{network}{index % 13}" if network != 'grpc' else f"svc{index % 13}",
+        'tls': 'tls' if tls else '',
+    }
+    if tls and rng.random() < 0.5:
+        data['sni'] = host
+    return data
+
+def synthetic_vmess_links(count, networks=DEFAULT_NETWORKS, seed=0):
+    """生成count个vmess链接，传输方式按networks轮流分配"""
+    rng = random.Random(seed)
+    links = []
+    for index in range(count):
+        data = synthetic_vmess_data(index, networks[index % len(networks)], rng)
+        encoded = base64.b64encode(json.dumps(data, ensure_ascii=False).encode('utf-8')).decode('ascii')
+        links.append('vmess://' + encoded)
+    return links
+
+def synthetic_original_config(links):
+    """用合成节点构造original_config.yaml的内容"""
+    proxies = [vmess_to_yaml.vmess_to_clash_config(vmess_to_yaml.decode_vmess_link(link)) for link in links]
+    return {
+        'mixed-port': 7890,
+        'allow-lan': True,
+        'mode': 'rule',
+        'log-level': 'info',
+        'external-controller': '127.0.0.1:9090',
+        'proxies': proxies,
+    }
+
+def write_fixtures(directory, count, networks=DEFAULT_NETWORKS, seed=0):
+    """把合成的input.txt和original_config.yaml写入directory，返回两个文件的路径"""
+    os.makedirs(directory, exist_ok=True)
+    links = synthetic_vmess_links(count, networks, seed)
+    input_path = os.path.join(directory, 'input.txt')
+    config_path = os.path.join(directory, 'original_config.yaml')
+    with open(input_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(links) + '\n')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        serializer.dump(synthetic_original_config(links), f)
+    return input_path, config_path
+
+def measure(func, repeat):
+    """返回(单次最短耗时秒数, tracemalloc峰值字节数)，峰值单独运行一次测量，不影响计时
+
+    单次运行很快的基准在每轮计时中循环多次，使每轮至少MIN_ROUND_SECONDS，减少计时误差。
+    """
+    started = time.perf_counter()
+    func()
+    loops = max(1, int(MIN_ROUND_SECONDS / max(time.perf_counter() - started, 1e-9)))
+
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = (time.perf_counter() - started) / loops
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def benchmark_size(count, networks, repeat, workdir):
+    """对一种规模运行所有基准，返回{基准名称: 结果}"""
+    links = synthetic_vmess_links(count, networks)
+    text = '\n'.join(links)
+    decoded = [vmess_to_yaml.decode_vmess_link(link) for link in links]
+    proxies = [vmess_to_yaml.vmess_to_clash_config(data) for data in decoded]
+    _, config_path = write_fixtures(workdir, count, networks)
+    with open(config_path, 'r', encoding='utf-8') as f:
+        original_config = serializer.load(f)
+    output_path = os.path.join(workdir, 'bench_config.yaml')
+    rebuilt = rebuild_yaml.process_config(original_config)
+    yaml_text = serializer.dump(rebuilt)
+    json_text = serializer.dump_json(rebuilt, compact=True)
+    rebuild_args = rebuild_yaml.parse_args([config_path, output_path])
+
+    def generate():
+        # generate_clash_config从当前目录读取模板，在空的临时目录中运行以生成完整的默认配置
+        previous = os.getcwd()
+        os.chdir(workdir)
+        try:
+            vmess_to_yaml.generate_clash_config(proxies, output_path)
+        finally:
+            os.chdir(previous)
+
+    def dump_streaming():
+        with open(os.devnull, 'w', encoding='utf-8') as f:
+            serializer.dump_streaming(rebuilt, f, cached_keys=clash_template.STATIC_SECTION_KEYS)
+
+    cases = [
+        ('decode_vmess_link', lambda: [vmess_to_yaml.decode_vmess_link(link) for link in links]),
+        ('vmess_to_clash_config', lambda: [vmess_to_yaml.vmess_to_clash_config(data) for data in decoded]),
+        ('compact_proxies',
+         lambda: [proxy_model.compact(vmess_to_yaml.vmess_to_clash_config(data)) for data in decoded]),
+        ('process_vmess_links', lambda: vmess_to_yaml.process_vmess_links(text)),
+        ('generate_clash_config', generate),
+        ('process_config', lambda: rebuild_yaml.process_config(original_config)),
+        ('rebuild', lambda: rebuild_yaml.rebuild(rebuild_args)),
+        # 整体序列化为字符串与分批写入文件的对比，峰值内存差异随节点数增大
+        ('dump_yaml', lambda: serializer.dump_sections(rebuilt, cached_keys=clash_template.STATIC_SECTION_KEYS)),
+        ('dump_streaming', dump_streaming),
+        ('dump_json', lambda: serializer.dump_json(rebuilt, compact=True)),
+        # 同一配置分别以YAML和JSON输出后的加载耗时，load_json_as_yaml为YAML解析器读取JSON输出
+        ('load_yaml', lambda: serializer.load(yaml_text)),
+        ('load_json', lambda: json.loads(json_text)),
+        ('load_json_as_yaml', lambda: serializer.load(json_text)),
+    ]
+
+    results = {}
+    for name, func in cases:
+        # 被测函数会逐个打印转换结果，计时时丢弃这些输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds, peak = measure(func, repeat)
+        results[name] = {
+            'items': count,
+            'seconds': round(seconds, 6),
+            'per_second': round(count / seconds, 1) if seconds else None,
+            'peak_kib': round(peak / 1024, 1),
+        }
+    return results
+
+def run_benchmarks(sizes, networks=DEFAULT_NETWORKS, repeat=DEFAULT_REPEAT):
+    """运行所有规模的基准，返回可以保存为基线的报告"""
+    report = {
+        'version': BASELINE_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'yaml-backend': serializer.backend_name(),
+        'networks': networks,
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='clash-bench-') as workdir:
+        for count in sizes:
+            report['results'][str(count)] = benchmark_size(count, networks, repeat, workdir)
+    return report
+
+def print_report(report):
+    """打印基准结果表格"""
+    print(f"{'规模':>8}  {'基准':<24}{'耗时(s)':>10}{'每秒':>14}{'峰值内存(KiB)':>16}")
+    for count, results in report['results'].items():
+        for name, result in results.items():
+            per_second = f"{result['per_second']:.0f}" if result['per_second'] else '-'
+            print(f"{count:>8}  {name:<24}{result['seconds']:>10.4f}{per_second:>14}{result['peak_kib']:>16.1f}")
+
+def compare_with_baseline(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """返回超过基线阈值的项目列表[(规模, 基准, 指标, 基线值, 当前值)]"""
+    regressions = []
+    for count, results in report['results'].items():
+        for name, result in results.items():
+            expected = baseline.get('results', {}).get(count, {}).get(name)
+            if not expected:
+                continue
+            for metric in ('seconds', 'peak_kib'):
+                if expected.get(metric) and result[metric] > expected[metric] * (1 + threshold):
+                    regressions.append((count, name, metric, expected[metric], result[metric]))
+    return regressions
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='两个脚本的性能基准测试')
+    parser.add_argument('-n', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help=f"合成节点的数量，可指定多个 (默认: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument('--networks', default=','.join(DEFAULT_NETWORKS),
+                        help=f"传输方式组合，逗号分隔 (默认: {','.join(DEFAULT_NETWORKS)})")
+    parser.add_argument('-r', '--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f'每项基准重复次数，取最短耗时 (默认: {DEFAULT_REPEAT})')
+    parser.add_argument('--save-baseline', metavar='FILE', help='把结果保存为JSON基线')
+    parser.add_argument('--baseline', metavar='FILE', help='与JSON基线比较，超过阈值时返回非零状态')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'允许的耗时和内存增长比例 (默认: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--write-fixtures', metavar='DIR',
+                        help='只生成合成的input.txt和original_config.yaml到DIR，不运行基准 (使用第一个规模)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    networks = [network.strip() for network in args.networks.split(',') if network.strip()]
+
+    if args.write_fixtures:
+        paths = write_fixtures(args.write_fixtures, args.sizes[0], networks)
+        print(f"已生成 {args.sizes[0]} 个节点: {', '.join(paths)}")
+        return 0
+
+    report = run_benchmarks(args.sizes, networks, max(1, args.repeat))
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.threshold)
+        for count, name, metric, expected, actual in regressions:
+            print(f"性能退化: {count} 个节点 {name} 的 {metric} 从 {expected} 增加到 {actual}")
+        if regressions:
+            return 1
+        print(f"与基线 {args.baseline} 相比没有超过 {args.threshold:.0%} 的退化")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+
+"""两个脚本共用的Clash配置模板
+
+DNS、规则集、规则和代理组在vmess_to_yaml.py和rebuild_yaml.py中完全相同，统一在这里定义。
+这些对象只读，static_sections()直接返回它们，批量处理时所有配置共享同一份，不再逐个深拷贝；
+修改代理组的group_filter和probe会替换为新的dict，不修改原对象。序列化时可以按内容哈希复用渲染结果，
+见serializer.dump_sections。
+"""
+
+# 国内DNS服务器
+DOMESTIC_NAMESERVERS = [
+    'https://dns.alidns.com/dns-query',  # 阿里云公共DNS
+    'https://doh.pub/dns-query',         # 腾讯DNSPod
+    'https://doh.360.cn/dns-query',      # 360安全DNS
+]
+
+# 国外DNS服务器
+FOREIGN_NAMESERVERS = [
+    'https://1.1.1.1/dns-query',         # Cloudflare(主)
+    'https://1.0.0.1/dns-query',         # Cloudflare(备)
+    'https://208.67.222.222/dns-query',  # OpenDNS(主)
+    'https://208.67.220.220/dns-query',  # OpenDNS(备)
+    'https://194.242.2.2/dns-query',     # Mullvad(主)
+    'https://194.242.2.3/dns-query',     # Mullvad(备)
+]
+
+# DNS配置
+DNS_CONFIG = {
+    'enable': True,
+    'listen': '0.0.0.0:1053',
+    'ipv6': True,
+    'use-system-hosts': False,
+    'cache-algorithm': 'arc',
+    'enhanced-mode': 'fake-ip',
+    'fake-ip-range': '198.18.0.1/16',
+    'fake-ip-filter': [
+        '+.lan',
+        '+.local',
+        '+.msftconnecttest.com',
+        '+.msftncsi.com',
+        'localhost.ptlogin2.qq.com',
+        'localhost.sec.qq.com',
+        'localhost.work.weixin.qq.com',
+    ],
+    'default-nameserver': ['223.5.5.5', '119.29.29.29', '1.1.1.1', '8.8.8.8'],
+    'nameserver': DOMESTIC_NAMESERVERS + FOREIGN_NAMESERVERS,
+    'proxy-server-nameserver': DOMESTIC_NAMESERVERS + FOREIGN_NAMESERVERS,
+    'nameserver-policy': {
+        'geosite:private,cn,geolocation-cn': list(DOMESTIC_NAMESERVERS),
+        'geosite:google,youtube,telegram,gfw,geolocation-!cn': list(FOREIGN_NAMESERVERS),
+    },
+}
+
+# 规则集通用配置
+RULE_PROVIDER_COMMON = {
+    'type': 'http',
+    'format': 'yaml',
+    'interval': 86400,
+}
+
+LOYALSOLDIER_URL = 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/'
+
+def _loyalsoldier(name, behavior):
+    return {
+        **RULE_PROVIDER_COMMON,
+        'behavior': behavior,
+        'url': f'{LOYALSOLDIER_URL}{name}.txt',
+        'path': f'./ruleset/loyalsoldier/{name}.yaml',
+    }
+
+# 规则集配置
+RULE_PROVIDERS = {
+    'reject': _loyalsoldier('reject', 'domain'),
+    'icloud': _loyalsoldier('icloud', 'domain'),
+    'apple': _loyalsoldier('apple', 'domain'),
+    'google': _loyalsoldier('google', 'domain'),
+    'proxy': _loyalsoldier('proxy', 'domain'),
+    'direct': _loyalsoldier('direct', 'domain'),
+    'private': _loyalsoldier('private', 'domain'),
+    'gfw': _loyalsoldier('gfw', 'domain'),
+    'tld-not-cn': _loyalsoldier('tld-not-cn', 'domain'),
+    'telegramcidr': _loyalsoldier('telegramcidr', 'ipcidr'),
+    'cncidr': _loyalsoldier('cncidr', 'ipcidr'),
+    'lancidr': _loyalsoldier('lancidr', 'ipcidr'),
+    'applications': _loyalsoldier('applications', 'classical'),
+    'openai': {
+        **RULE_PROVIDER_COMMON,
+        'behavior': 'classical',
+        'url': 'https://fastly.jsdelivr.net/gh/blackmatrix7/ios_rule_script@master/rule/Clash/OpenAI/OpenAI.yaml',
+        'path': './ruleset/blackmatrix7/openai.yaml',
+    },
+}
+
+# 规则配置
+RULES = [
+    # 自定义规则
+    'DOMAIN-SUFFIX,googleapis.cn,节点选择',  # Google服务
+    'DOMAIN-SUFFIX,gstatic.com,节点选择',  # Google静态资源
+    'DOMAIN-SUFFIX,xn--ngstr-lra8j.com,节点选择',  # Google Play下载服务
+    'DOMAIN-SUFFIX,github.io,节点选择',  # Github Pages
+    'DOMAIN,v2rayse.com,节点选择',  # V2rayse节点工具
+    # blackmatrix7 规则集
+    'RULE-SET,openai,ChatGPT',
+    # Loyalsoldier 规则集
+    'RULE-SET,applications,全局直连',
+    'RULE-SET,private,全局直连',
+    'RULE-SET,reject,广告过滤',
+    'RULE-SET,icloud,微软服务',
+    'RULE-SET,apple,苹果服务',
+    'RULE-SET,google,谷歌服务',
+    'RULE-SET,proxy,节点选择',
+    'RULE-SET,gfw,节点选择',
+    'RULE-SET,tld-not-cn,节点选择',
+    'RULE-SET,direct,全局直连',
+    'RULE-SET,lancidr,全局直连,no-resolve',
+    'RULE-SET,cncidr,全局直连,no-resolve',
+    'RULE-SET,telegramcidr,电报消息,no-resolve',
+    # 其他规则
+    'GEOIP,LAN,全局直连,no-resolve',
+    'GEOIP,CN,全局直连,no-resolve',
+    'MATCH,漏网之鱼',
+]
+
+# 代理组通用配置
+GROUP_BASE_OPTION = {
+    'interval': 300,
+    'timeout': 3000,
+    'url': 'https://www.google.com/generate_204',
+    'lazy': True,
+    'max-failed-times': 3,
+    'hidden': False,
+}
+
+# ChatGPT可用地区的节点名称过滤规则
+CHATGPT_FILTER = 'AD|🇦🇩|AE|🇦🇪|AF|🇦🇫|AG|🇦🇬|AL|🇦🇱|AM|🇦🇲|AO|🇦🇴|AR|🇦🇷|AT|🇦🇹|AU|🇦🇺|AZ|🇦🇿|BA|🇧🇦|BB|🇧🇧|BD|🇧🇩|BE|🇧🇪|BF|🇧🇫|BG|🇧🇬|BH|🇧🇭|BI|🇧🇮|BJ|🇧🇯|BN|🇧🇳|BO|🇧🇴|BR|🇧🇷|BS|🇧🇸|BT|🇧🇹|BW|🇧🇼|BZ|🇧🇿|CA|🇨🇦|CD|🇨🇩|CF|🇨🇫|CG|🇨🇬|CH|🇨🇭|CI|🇨🇮|CL|🇨🇱|CM|🇨🇲|CO|🇨🇴|CR|🇨🇷|CV|🇨🇻|CY|🇨🇾|CZ|🇨🇿|DE|🇩🇪|DJ|🇩🇯|DK|🇩🇰|DM|🇩🇲|DO|🇩🇴|DZ|🇩🇿|EC|🇪🇨|EE|🇪🇪|EG|🇪🇬|ER|🇪🇷|ES|🇪🇸|ET|🇪🇹|FI|🇫🇮|FJ|🇫🇯|FM|🇫🇲|FR|🇫🇷|GA|🇬🇦|GB|🇬🇧|GD|🇬🇩|GE|🇬🇪|GH|🇬🇭|GM|🇬🇲|GN|🇬🇳|GQ|🇬🇶|GR|🇬🇷|GT|🇬🇹|GW|🇬🇼|GY|🇬🇾|HN|🇭🇳|HR|🇭🇷|HT|🇭🇹|HU|🇭🇺|ID|🇮🇩|IE|🇮🇪|IL|🇮🇱|IN|🇮🇳|IQ|🇮🇶|IS|🇮🇸|IT|🇮🇹|JM|🇯🇲|JO|🇯🇴|JP|🇯🇵|KE|🇰🇪|KG|🇰🇬|KH|🇰🇭|KI|🇰🇮|KM|🇰🇲|KN|🇰🇳|KR|🇰🇷|KW|🇰🇼|KZ|🇰🇿|LA|🇱🇦|LB|🇱🇧|LC|🇱🇨|LI|🇱🇮|LK|🇱🇰|LR|🇱🇷|LS|🇱🇸|LT|🇱🇹|LU|🇱🇺|LV|🇱🇻|LY|🇱🇾|MA|🇲🇦|MC|🇲🇨|MD|🇲🇩|ME|🇲🇪|MG|🇲🇬|MH|🇲🇭|MK|🇲🇰|ML|🇲🇱|MM|🇲🇲|MN|🇲🇳|MR|🇲🇷|MT|🇲🇹|MU|🇲🇺|MV|🇲🇻|MW|🇲🇼|MX|🇲🇽|MY|🇲🇾|MZ|🇲🇿|NA|🇳🇦|NE|🇳🇪|NG|🇳🇬|NI|🇳🇮|NL|🇳🇱|NO|🇳🇴|NP|🇳🇵|NR|🇳🇷|NZ|🇳🇿|OM|🇴🇲|PA|🇵🇦|PE|🇵🇪|PG|🇵🇬|PH|🇵🇭|PK|🇵🇰|PL|🇵🇱|PS|🇵🇸|PT|🇵🇹|PW|🇵🇼|PY|🇵🇾|QA|🇶🇦|RO|🇷🇴|RS|🇷🇸|RW|🇷🇼|SA|🇸🇦|SB|🇸🇧|SC|🇸🇨|SD|🇸🇩|SE|🇸🇪|SG|🇸🇬|SI|🇸🇮|SK|🇸🇰|SL|🇸🇱|SM|🇸🇲|SN|🇸🇳|SO|🇸🇴|SR|🇸🇷|SS|🇸🇸|ST|🇸🇹|SV|🇸🇻|SZ|🇸🇿|TD|🇹🇩|TG|🇹🇬|TH|🇹🇭|TJ|🇹🇯|TL|🇹🇱|TM|🇹🇲|TN|🇹🇳|TO|🇹🇴|TR|🇹🇷|TT|🇹🇹|TV|🇹🇻|TW|🇹🇼|TZ|🇹🇿|UA|🇺🇦|UG|🇺🇬|US|🇺🇸|UY|🇺🇾|UZ|🇺🇿|VA|🇻🇦|VC|🇻🇨|VN|🇻🇳|VU|🇻🇺|WS|🇼🇸|YE|🇾🇪|ZA|🇿🇦|ZM|🇿🇲|ZW|🇿🇼'
+
+ICON_BASE_URL = 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/'
+
+# 代理组规格，按顺序协调:
+#   update   - 不存在时创建，已存在时用fields中的字段覆盖
+#   preserve - 不存在时创建，已存在时保持原样
+PROXY_GROUP_SPECS = [
+    {
+        'policy': 'update',
+        'fields': {
+            'proxies': ['延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)'],
+            'include-all': True,
+        },
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '节点选择',
+            'type': 'select',
+            'proxies': ['延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)'],
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'adjust.svg'
+        },
+    },
+    {
+        'policy': 'update',
+        'fields': {'include-all': True},
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '延迟选优',
+            'type': 'url-test',
+            'tolerance': 100,
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'speed.svg'
+        },
+    },
+    {
+        'policy': 'update',
+        'fields': {'include-all': True},
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '故障转移',
+            'type': 'fallback',
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'ambulance.svg'
+        },
+    },
+    {
+        'policy': 'update',
+        'fields': {'include-all': True},
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '负载均衡(散列)',
+            'type': 'load-balance',
+            'strategy': 'consistent-hashing',
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'merry_go.svg'
+        },
+    },
+    {
+        'policy': 'update',
+        'fields': {'include-all': True},
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '负载均衡(轮询)',
+            'type': 'load-balance',
+            'strategy': 'round-robin',
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'balance.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '谷歌服务',
+            'type': 'select',
+            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'google.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '国外媒体',
+            'type': 'select',
+            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'youtube.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '电报消息',
+            'type': 'select',
+            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'telegram.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'url': 'https://chatgpt.com',
+            'expected-status': '200',
+            'name': 'ChatGPT',
+            'type': 'select',
+            'include-all': True,
+            'filter': CHATGPT_FILTER,
+            'icon': ICON_BASE_URL + 'chatgpt.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '微软服务',
+            'type': 'select',
+            'proxies': ['全局直连', '节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)'],
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'microsoft.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '苹果服务',
+            'type': 'select',
+            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'apple.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '广告过滤',
+            'type': 'select',
+            'proxies': ['REJECT', 'DIRECT'],
+            'icon': ICON_BASE_URL + 'bug.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '全局直连',
+            'type': 'select',
+            'proxies': ['DIRECT', '节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)'],
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'link.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '全局拦截',
+            'type': 'select',
+            'proxies': ['REJECT', 'DIRECT'],
+            'icon': ICON_BASE_URL + 'block.svg'
+        },
+    },
+    {
+        'policy': 'preserve',
+        'group': {
+            **GROUP_BASE_OPTION,
+            'name': '漏网之鱼',
+            'type': 'select',
+            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
+            'include-all': True,
+            'icon': ICON_BASE_URL + 'fish.svg'
+        },
+    },
+]
+
+# rebuild_yaml.py直接使用的完整代理组列表
+PROXY_GROUPS = [spec['group'] for spec in PROXY_GROUP_SPECS]
+
+# 内容固定的顶层段，序列化时可以复用缓存的渲染结果
+STATIC_SECTION_KEYS = ('dns', 'proxy-groups', 'rule-providers', 'rules')
+
+def static_sections():
+    """返回DNS、代理组、规则集和规则，这些对象是共享的，调用方不能就地修改"""
+    return {
+        'dns': DNS_CONFIG,
+        'proxy-groups': PROXY_GROUPS,
+        'rule-providers': RULE_PROVIDERS,
+        'rules': RULES,
+    }
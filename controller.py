@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""通过external-controller把配置增量推送到运行中的Clash
+
+PUT /configs重新加载整个配置时，Clash会断开所有连接，重新加载DNS、规则集并对所有节点做健康检查，
+两万个节点需要数秒。推送前先通过控制器API读取运行中的状态，与新配置比较:
+  - 代理组、规则、规则集、提供者的名称或内联节点不同，或者与上次推送相比配置结构有变化
+    (DNS等API读不到的部分按内容哈希比较)，才用PUT /configs完整重新加载；
+  - 否则只用PATCH /configs修改变化的常规设置(端口、模式、日志级别等)，
+    并对分片文件有变化或节点数与运行中不一致的提供者调用PUT /providers/proxies/{name}刷新。
+
+每次推送成功后把配置结构的哈希和各提供者文件的哈希保存在配置文件旁的.push.json中，
+没有记录时(第一次推送)总是完整重新加载。
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import sys
+from urllib.parse import quote, urlsplit
+
+import atomic_write
+import serializer
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_ADDRESS = '127.0.0.1:9090'
+STATE_VERSION = 1
+
+# PATCH /configs可以直接修改、不需要重新加载的常规设置
+PATCHABLE_KEYS = ('port', 'socks-port', 'redir-port', 'tproxy-port', 'mixed-port',
+                  'allow-lan', 'bind-address', 'mode', 'log-level', 'ipv6')
+
+# /proxies中的内置策略，不属于配置中的节点
+BUILTIN_PROXIES = {'DIRECT', 'REJECT', 'REJECT-DROP', 'PASS', 'COMPATIBLE', 'GLOBAL'}
+
+# /providers/proxies中代表配置文件本身的提供者
+_DEFAULT_PROVIDER_TYPES = {'Compatible'}
+
+# 逻辑规则的payload在API中的写法与配置不同，只比较类型和策略
+_LOGIC_RULE_TYPES = {'and', 'or', 'not', 'subrule'}
+
+class ControllerError(Exception):
+    """控制器不可用或返回错误"""
+
+class ControllerClient:
+    """external-controller的HTTP客户端，同一连接上发送所有请求"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, secret=None, timeout=DEFAULT_TIMEOUT):
+        parts = urlsplit(address if '://' in address else 'http://' + address)
+        host = parts.hostname or '127.0.0.1'
+        # 监听所有地址时从本机连接
+        if host in ('0.0.0.0', '::'):
+            host = '127.0.0.1'
+        self.address = f"{host}:{parts.port or 9090}"
+        self.secret = secret
+        self._connection = http.client.HTTPConnection(host, parts.port or 9090, timeout=timeout)
+
+    def request(self, method, path, body=None):
+        """发送请求，返回解析后的JSON(没有响应体时返回None)，状态码不是2xx时抛出ControllerError"""
+        headers = {}
+        data = None
+        if self.secret:
+            headers['Authorization'] = f'Bearer {self.secret}'
+        if body is not None:
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            self._connection.request(method, path, body=data, headers=headers)
+            response = self._connection.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError) as e:
+            self._connection.close()
+            raise ControllerError(f"无法连接控制器 {self.address}: {e}")
+        if not 200 <= response.status < 300:
+            message = payload.decode('utf-8', errors='replace').strip()
+            raise ControllerError(f"{method} {path} 返回 {response.status}: {message}")
+        if not payload:
+            return None
+        return json.loads(payload)
+
+    def close(self):
+        self._connection.close()
+
+def controller_address(config, override=None):
+    """推送的控制器地址: 命令行指定的地址优先，其次是配置中的external-controller"""
+    return override or config.get('external-controller') or DEFAULT_ADDRESS
+
+def state_path(config_file):
+    """返回记录上次推送状态的文件路径"""
+    return config_file + '.push.json'
+
+def load_state(config_file):
+    try:
+        with open(state_path(config_file), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return state if state.get('version') == STATE_VERSION else None
+
+def structure_hash(config):
+    """配置中除常规设置以外所有内容的哈希，提供者只包含其定义，不包含分片文件的内容"""
+    structure = {key: value for key, value in config.items() if key not in PATCHABLE_KEYS}
+    data = json.dumps(structure, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def _rule_key(rule_type, payload, proxy):
+    rule_type = rule_type.replace('-', '').lower()
+    if rule_type in _LOGIC_RULE_TYPES:
+        return rule_type, '', proxy
+    return rule_type, payload.lower(), proxy
+
+def config_rule_key(rule):
+    """把配置中的规则字符串转换为与/rules比较的(类型, 内容, 策略)"""
+    fields = [field.strip() for field in rule.split(',')]
+    if fields[0].upper() == 'MATCH':
+        return _rule_key(fields[0], '', fields[1] if len(fields) > 1 else '')
+    # 末尾的no-resolve、src等是规则参数，不是策略
+    while len(fields) > 3 and fields[-1].lower() in ('no-resolve', 'src'):
+        fields.pop()
+    return _rule_key(fields[0], ','.join(fields[1:-1]), fields[-1])
+
+def local_snapshot(config, base_dir='.'):
+    """新配置中可以与控制器API比较的部分，以及各文件类型提供者的分片文件哈希"""
+    provider_files = {}
+    for name, provider in (config.get('proxy-providers') or {}).items():
+        if provider.get('type') == 'file' and provider.get('path'):
+            path = os.path.normpath(os.path.join(base_dir, provider['path']))
+            provider_files[name] = atomic_write.file_sha256(path)
+    return {
+        'proxies': sorted(proxy['name'] for proxy in config.get('proxies') or []),
+        'groups': sorted(group['name'] for group in config.get('proxy-groups') or []),
+        'providers': sorted(config.get('proxy-providers') or {}),
+        'rule-providers': sorted(config.get('rule-providers') or {}),
+        'rules': [config_rule_key(rule) for rule in config.get('rules') or []],
+        'provider-files': provider_files,
+    }
+
+def running_snapshot(client):
+    """通过控制器API读取运行中的状态"""
+    general = client.request('GET', '/configs') or {}
+    proxies = (client.request('GET', '/proxies') or {}).get('proxies', {})
+    providers = {name: provider
+                 for name, provider in ((client.request('GET', '/providers/proxies') or {}).get('providers', {})).items()
+                 if provider.get('vehicleType') not in _DEFAULT_PROVIDER_TYPES}
+    rule_providers = (client.request('GET', '/providers/rules') or {}).get('providers', {})
+    rules = (client.request('GET', '/rules') or {}).get('rules', [])
+
+    provider_members = {member['name'] for provider in providers.values() for member in provider.get('proxies', [])}
+    return {
+        'general': general,
+        'proxies': sorted(name for name, proxy in proxies.items()
+                          if 'all' not in proxy and name not in BUILTIN_PROXIES and name not in provider_members),
+        'groups': sorted(name for name, proxy in proxies.items() if 'all' in proxy and name not in BUILTIN_PROXIES),
+        'providers': sorted(providers),
+        'provider-counts': {name: len(provider.get('proxies', [])) for name, provider in providers.items()},
+        'rule-providers': sorted(rule_providers),
+        'rules': [_rule_key(rule.get('type', ''), rule.get('payload', ''), rule.get('proxy', '')) for rule in rules],
+    }
+
+def _same_setting(value, running):
+    if isinstance(value, str) and isinstance(running, str):
+        return value.lower() == running.lower()
+    return value == running
+
+def plan_push(config, local, running, state):
+    """比较新配置与运行中的状态，返回推送计划
+
+    计划为{'reload': 完整重新加载的原因或None, 'patch': 要修改的常规设置, 'refresh': 要刷新的提供者}。
+    """
+    plan = {'reload': None, 'patch': {}, 'refresh': []}
+    labels = {
+        'groups': '代理组',
+        'providers': '代理提供者',
+        'rule-providers': '规则集',
+        'rules': '规则',
+        'proxies': '内联节点',
+    }
+    for key, label in labels.items():
+        if local[key] != running[key]:
+            plan['reload'] = f"{label}与运行中的配置不同"
+            return plan
+    if state is None:
+        plan['reload'] = "没有上次推送的记录"
+        return plan
+    if state.get('structure') != structure_hash(config):
+        plan['reload'] = "配置结构与上次推送时不同"
+        return plan
+
+    plan['patch'] = {key: config[key] for key in PATCHABLE_KEYS
+                     if key in config and not _same_setting(config[key], running['general'].get(key))}
+    pushed = state.get('providers', {})
+    for name, digest in local['provider-files'].items():
+        record = pushed.get(name) or {}
+        if record.get('sha256') != digest or record.get('count') != running['provider-counts'].get(name):
+            plan['refresh'].append(name)
+    return plan
+
+def save_state(config_file, config, local, provider_counts):
+    state = {
+        'version': STATE_VERSION,
+        'structure': structure_hash(config),
+        'providers': {name: {'sha256': digest, 'count': provider_counts.get(name)}
+                      for name, digest in local['provider-files'].items()},
+    }
+    atomic_write.write_if_changed(state_path(config_file), json.dumps(state, ensure_ascii=False, indent=2))
+
+def push_config(config_file, address=None, secret=None, dry_run=False, timeout=DEFAULT_TIMEOUT):
+    """把config_file推送到运行中的Clash，返回执行的推送计划
+
+    secret为None时使用配置中的secret。dry_run为True时只返回计划，不发送修改请求。
+    """
+    with open(config_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    config = serializer.load(text)
+    base_dir = os.path.dirname(config_file) or '.'
+    if secret is None:
+        secret = config.get('secret')
+
+    client = ControllerClient(controller_address(config, address), secret, timeout)
+    try:
+        local = local_snapshot(config, base_dir)
+        plan = plan_push(config, local, running_snapshot(client), load_state(config_file))
+        if dry_run:
+            return plan
+
+        if plan['reload']:
+            client.request('PUT', '/configs?force=true', {'path': '', 'payload': text})
+        else:
+            if plan['patch']:
+                client.request('PATCH', '/configs', plan['patch'])
+            for name in plan['refresh']:
+                client.request('PUT', f"/providers/proxies/{quote(name, safe='')}")
+        # 重新读取提供者的节点数，下次推送时可以发现运行中的提供者被修改或加载失败
+        counts = running_snapshot(client)['provider-counts']
+    finally:
+        client.close()
+    save_state(config_file, config, local, counts)
+    return plan
+
+def print_plan(plan, config_file, dry_run=False):
+    """打印推送计划或推送结果"""
+    prefix = '将' if dry_run else '已'
+    if plan['reload']:
+        print(f"{plan['reload']}，{prefix}完整重新加载 {config_file} (PUT /configs)")
+        return
+    if not plan['patch'] and not plan['refresh']:
+        print("运行中的配置已是最新，无需推送")
+        return
+    if plan['patch']:
+        settings = ', '.join(f"{key}={value}" for key, value in plan['patch'].items())
+        print(f"{prefix}修改常规设置: {settings}")
+    for name in plan['refresh']:
+        print(f"{prefix}刷新代理提供者: {name}")
+
+def push_and_report(config_file, address=None, secret=None, dry_run=False):
+    """推送并打印结果，失败时只打印错误，返回是否成功，供两个脚本的--push使用"""
+    try:
+        plan = push_config(config_file, address, secret, dry_run)
+    except (ControllerError, OSError, ValueError) as e:
+        print(f"推送失败: {e}")
+        return False
+    print_plan(plan, config_file, dry_run)
+    return True
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description='把配置增量推送到运行中的Clash')
+    parser.add_argument('config_file', nargs='?', default='modified_config.yaml',
+                        help='要推送的配置文件 (默认: modified_config.yaml)')
+    parser.add_argument('--controller', help='控制器地址，如127.0.0.1:9090 (默认: 配置中的external-controller)')
+    parser.add_argument('--secret', help='控制器的secret (默认: 配置中的secret)')
+    parser.add_argument('--dry-run', action='store_true', help='只打印推送计划，不修改运行中的配置')
+    args = parser.parse_args(argv)
+    return 0 if push_and_report(args.config_file, args.controller, args.secret, args.dry_run) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
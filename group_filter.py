@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""代理组filter的离线计算
+
+include-all代理组的filter(如ChatGPT组约400个分支的地区代码正则)在Clash每次加载和刷新
+时都要对所有节点名称匹配一遍。这里在生成配置时用Python离线求值: 由纯文字分支组成的正则
+按分支长度取名称的子串做集合查找，结果可以写成显式的proxies列表，或者写成按前缀合并的
+更短正则，两种方式的成员与原正则完全一致。
+
+直接运行本文件会在随机生成的大量节点名称上验证三种匹配方式的结果一致。
+"""
+
+import argparse
+import random
+import re
+import sys
+
+from clash_template import CHATGPT_FILTER
+
+# 出现这些字符的分支不是纯文字，回退到正则匹配
+_REGEX_METACHARS = set('.^$*+?{}[]\\|()')
+
+def literal_tokens(pattern):
+    """pattern由纯文字分支用|连接时返回分支列表，否则返回None"""
+    tokens = pattern.split('|')
+    for token in tokens:
+        if not token or _REGEX_METACHARS.intersection(token):
+            return None
+    return tokens
+
+def compile_filter(pattern):
+    """返回判断节点名称是否匹配filter的函数，语义与Clash的非锚定正则查找相同"""
+    # Clash允许用`分隔多个正则，满足任意一个即可
+    if '`' in pattern:
+        matchers = [compile_filter(part) for part in pattern.split('`') if part]
+        return lambda name: any(matcher(name) for matcher in matchers)
+
+    tokens = literal_tokens(pattern)
+    if tokens is None:
+        regex = re.compile(pattern)
+        return lambda name: regex.search(name) is not None
+
+    token_set = frozenset(tokens)
+    lengths = sorted({len(token) for token in tokens})
+
+    def matcher(name):
+        for length in lengths:
+            for start in range(len(name) - length + 1):
+                if name[start:start + length] in token_set:
+                    return True
+        return False
+    return matcher
+
+def _trie_regex(node):
+    """把前缀树转换为正则，叶子节点返回None"""
+    alternatives = []
+    leaves = []
+    for char in sorted(key for key in node if key):
+        child = _trie_regex(node[char])
+        if child is None:
+            leaves.append(re.escape(char))
+        else:
+            alternatives.append(re.escape(char) + child)
+    if leaves:
+        alternatives.append(leaves[0] if len(leaves) == 1 else '[' + ''.join(leaves) + ']')
+    if not alternatives:
+        return None
+
+    optional = '' in node
+    if len(alternatives) == 1 and (not optional or len(alternatives[0]) == 1 or alternatives[0].startswith('[')):
+        regex = alternatives[0]
+    else:
+        regex = '(?:' + '|'.join(alternatives) + ')'
+    return regex + '?' if optional else regex
+
+def optimize_filter(pattern):
+    """把纯文字分支的filter按公共前缀合并为更短的等价正则，无法优化时返回None"""
+    tokens = literal_tokens(pattern)
+    if tokens is None:
+        return None
+
+    root = {}
+    for token in tokens:
+        node = root
+        for char in token:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    alternatives = []
+    for char in sorted(root):
+        child = _trie_regex(root[char])
+        alternatives.append(re.escape(char) + (child or ''))
+    return '|'.join(alternatives)
+
+def find_mismatches(pattern, names, matcher):
+    """返回matcher与原正则结果不一致的名称"""
+    regex = re.compile(pattern.replace('`', '|'))
+    return [name for name in names if (regex.search(name) is not None) != matcher(name)]
+
+def expand_group_filters(config, mode='list', verify=False, originals=None):
+    """离线计算include-all代理组的filter
+
+    mode='list': 把匹配的节点写成显式proxies列表，去掉include-all和filter；
+    mode='regex': 保留include-all，把filter替换为更短的等价正则。
+    配置中有proxy-providers或没有节点匹配时，list模式退回regex模式。
+    originals不为None时把展开为列表的组原来的定义按组名记录在其中。
+    处理过的组替换为新的dict，原来的组和列表不会被修改，可以与其他配置共享(见clash_template)。
+    返回[(组名, 处理方式, 说明)]。
+    """
+    names = [proxy['name'] for proxy in config.get('proxies') or []]
+    has_providers = bool(config.get('proxy-providers'))
+    summary = []
+    groups = list(config.get('proxy-groups') or [])
+    for position, group in enumerate(groups):
+        pattern = group.get('filter')
+        if not pattern or not group.get('include-all'):
+            continue
+
+        matcher = compile_filter(pattern)
+        if verify:
+            mismatches = find_mismatches(pattern, names, matcher)
+            if mismatches:
+                raise ValueError(f"代理组 {group['name']} 的filter离线计算结果与正则不一致: {mismatches[:5]}")
+
+        if mode == 'list' and not has_providers:
+            members = [name for name in names if matcher(name)]
+            if members:
+                # 原有的proxies排在include-all的节点之前，与Clash的顺序一致
+                expanded = {}
+                for key, value in group.items():
+                    if key == 'include-all':
+                        expanded['proxies'] = list(group.get('proxies') or []) + members
+                    elif key not in ('filter', 'proxies'):
+                        expanded[key] = value
+                groups[position] = expanded
+                if originals is not None:
+                    originals[group['name']] = group
+                summary.append((group['name'], 'list', f"{len(members)}/{len(names)} 个节点"))
+                continue
+
+        optimized = optimize_filter(pattern)
+        if optimized is not None and len(optimized) < len(pattern):
+            if verify:
+                mismatches = find_mismatches(pattern, names, compile_filter(optimized))
+                if mismatches:
+                    raise ValueError(f"代理组 {group['name']} 精简后的filter与原正则不一致: {mismatches[:5]}")
+            groups[position] = {**group, 'filter': optimized}
+            summary.append((group['name'], 'regex', f"{len(pattern)} -> {len(optimized)} 个字符"))
+    if summary:
+        config['proxy-groups'] = groups
+    return summary
+
+def print_expand_summary(summary, log_file=None):
+    """打印filter离线计算的结果"""
+    for name, mode, detail in summary:
+        action = '展开为显式节点列表' if mode == 'list' else '精简filter正则'
+        print(f"代理组 {name}: {action} ({detail})", file=log_file)
+
+def random_names(pattern, count, seed=0):
+    """生成随机节点名称语料，一部分包含filter中的分支，一部分不包含"""
+    rng = random.Random(seed)
+    tokens = literal_tokens(pattern) or ['HK', 'US']
+    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 -_|'
+    extras = ['香港', '美国', '日本', '🇨🇳', '🇭🇰', '🇺🇸', '⚡', '\U0001F1E6', '\U0001F1E9', '高速', '专线']
+    names = []
+    for _ in range(count):
+        parts = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 6)))]
+        for _ in range(rng.randint(0, 3)):
+            parts.append(rng.choice(tokens) if rng.random() < 0.3 else rng.choice(extras))
+            parts.append(''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 3))))
+        rng.shuffle(parts)
+        names.append(''.join(parts))
+    return names
+
+def main(argv=None):
+    """在随机语料上验证集合查找、精简正则与原正则的匹配结果一致"""
+    parser = argparse.ArgumentParser(description='验证代理组filter离线计算与原正则的一致性')
+    parser.add_argument('-n', '--count', type=int, default=200000, help='随机节点名称的数量 (默认: 200000)')
+    parser.add_argument('--pattern', help='要验证的filter，默认使用ChatGPT组的地区过滤规则')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子 (默认: 0)')
+    args = parser.parse_args(argv)
+
+    if args.pattern is None:
+        args.pattern = CHATGPT_FILTER
+    names = random_names(args.pattern, args.count, args.seed)
+    optimized = optimize_filter(args.pattern)
+
+    failed = False
+    checks = [('集合查找', compile_filter(args.pattern))]
+    if optimized is not None:
+        checks.append(('精简正则', compile_filter(optimized)))
+    for label, matcher in checks:
+        mismatches = find_mismatches(args.pattern, names, lambda name: bool(matcher(name)))
+        print(f"{label}: {len(names)} 个名称，不一致 {len(mismatches)} 个")
+        failed = failed or bool(mismatches)
+    if optimized is not None:
+        print(f"filter长度: {len(args.pattern)} -> {len(optimized)} 个字符")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""节点连通性探测
+
+用asyncio并发对每个节点的server:port做TCP连接(可选再做TLS握手)，限制同时进行的探测数，
+每个节点单独超时，记录握手延迟。写入配置前删除或后移不可达的节点，减少Clash健康检查的负担。
+相同的server/port/TLS参数只探测一次。hysteria2、tuic等只使用UDP(QUIC)的节点无法用TCP探测，
+不探测，结果为未知，不会被删除或后移。
+"""
+
+import asyncio
+import json
+import ssl
+from collections import namedtuple
+
+DEFAULT_TIMEOUT = 3.0
+DEFAULT_CONCURRENCY = 256
+
+# 只使用UDP的节点类型，TCP连接失败不代表节点不可用
+UDP_PROXY_TYPES = {'hysteria', 'hysteria2', 'tuic', 'wireguard'}
+
+# 总是使用TLS的节点类型，配置中没有tls键
+TLS_PROXY_TYPES = {'trojan'}
+
+# reachable为None表示未探测(UDP节点)，latency为毫秒，不可达或未探测时为None
+ProbeResult = namedtuple('ProbeResult', ['name', 'server', 'port', 'reachable', 'latency', 'error'])
+
+def _probe_key(proxy, tls):
+    """探测目标: 相同目标的节点共享一次探测结果"""
+    use_tls = tls and (proxy.get('type') in TLS_PROXY_TYPES or bool(proxy.get('tls')))
+    server_name = proxy.get('servername') or proxy.get('sni') or proxy.get('server') if use_tls else None
+    return proxy.get('server'), proxy.get('port'), use_tls, server_name
+
+def _tls_context():
+    # 只检查握手是否成功，与节点配置中的skip-cert-verify一致，不校验证书
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+async def _probe_target(key, semaphore, timeout, context):
+    """探测单个目标，返回(是否可达, 延迟毫秒, 错误信息)"""
+    server, port, use_tls, server_name = key
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    server, int(port),
+                    ssl=context if use_tls else None,
+                    server_hostname=server_name,
+                ),
+                timeout,
+            )
+        except Exception as e:
+            return False, None, str(e) or type(e).__name__
+        latency = (loop.time() - started) * 1000
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), timeout)
+        except Exception:
+            pass
+        return True, round(latency, 1), None
+
+async def _probe_all(keys, timeout, concurrency, tls):
+    semaphore = asyncio.Semaphore(concurrency)
+    context = _tls_context() if tls else None
+    outcomes = await asyncio.gather(*(_probe_target(key, semaphore, timeout, context) for key in keys))
+    return dict(zip(keys, outcomes))
+
+def probe_proxies(proxies, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY, tls=False):
+    """并发探测所有节点，按输入顺序返回ProbeResult列表"""
+    keys = [None if proxy.get('type') in UDP_PROXY_TYPES else _probe_key(proxy, tls) for proxy in proxies]
+    targets = [key for key in dict.fromkeys(keys) if key and key[0] and key[1]]
+    outcomes = asyncio.run(_probe_all(targets, timeout, concurrency, tls)) if targets else {}
+
+    results = []
+    for proxy, key in zip(proxies, keys):
+        if key is None:
+            reachable, latency, error = None, None, '只使用UDP，未探测'
+        else:
+            reachable, latency, error = outcomes.get(key, (False, None, '缺少server或port'))
+        results.append(ProbeResult(proxy.get('name'), proxy.get('server'), proxy.get('port'),
+                                   reachable, latency, error))
+    return results
+
+def apply_probe_results(config, results, action='drop'):
+    """根据探测结果处理config中的节点，返回不可达节点的名称列表
+
+    action='drop' 删除不可达节点，并从代理组的显式proxies列表中移除；
+    action='demote' 保留不可达节点但移到列表末尾，故障转移等组会优先使用可达节点。
+    未探测的节点按可达处理，保持原有位置。代理组替换为新的dict，原来的组不会被修改。
+    """
+    proxies = config.get('proxies') or []
+    alive = [proxy for proxy, result in zip(proxies, results) if result.reachable is not False]
+    dead = [proxy for proxy, result in zip(proxies, results) if result.reachable is False]
+    dead_names = [proxy['name'] for proxy in dead]
+
+    if action == 'demote':
+        config['proxies'] = alive + dead
+        return dead_names
+
+    config['proxies'] = alive
+    removed = set(dead_names)
+    if removed and config.get('proxy-groups'):
+        config['proxy-groups'] = [
+            {**group, 'proxies': [name for name in group['proxies'] if name not in removed]}
+            if group.get('proxies') else group
+            for group in config['proxy-groups']
+        ]
+    return dead_names
+
+def print_probe_summary(results, dead_names, action):
+    """打印探测摘要"""
+    latencies = sorted(result.latency for result in results if result.reachable)
+    reachable = len(latencies)
+    skipped = sum(result.reachable is None for result in results)
+    message = f"节点探测: 可达 {reachable} 个，不可达 {len(results) - reachable - skipped} 个"
+    if skipped:
+        message += f"，未探测UDP节点 {skipped} 个"
+    if latencies:
+        message += f"，延迟中位数 {latencies[len(latencies) // 2]:.1f} ms"
+    print(message)
+    if dead_names:
+        verb = '已删除' if action == 'drop' else '已移到末尾'
+        print(f"{verb}不可达节点 {len(dead_names)} 个")
+
+def write_probe_report(path, results):
+    """把每个节点的探测结果保存为JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([result._asdict() for result in results], f, ensure_ascii=False, indent=2)
+
+def probe_config(config, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY, tls=False,
+                 action='drop', report_file=None):
+    """探测config中的所有节点并按action处理不可达节点"""
+    results = probe_proxies(config.get('proxies') or [], timeout, concurrency, tls)
+    dead_names = apply_probe_results(config, results, action)
+    print_probe_summary(results, dead_names, action)
+    if report_file:
+        write_probe_report(report_file, results)
+        print(f"探测结果已保存到 {report_file}")
+    return results
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""按阶段记录耗时和内存的性能剖析
+
+两个脚本用 ``with profiler.stage('dump'):`` 标记流水线的各个阶段(读取、扫描、解码、
+代理组协调、序列化、写入等)。启用后记录每个阶段的墙钟时间、CPU时间和tracemalloc峰值内存，
+结束时打印汇总表，也可以保存为JSON报告。未启用时stage返回同一个空上下文管理器，
+几乎没有额外开销。
+
+阶段可以嵌套，内层阶段的内存峰值会计入外层阶段。同名阶段多次执行时累加耗时、取最大峰值。
+"""
+
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+
+REPORT_VERSION = 1
+
+_NULL_STAGE = contextlib.nullcontext()
+
+_active = None
+
+class _Frame:
+    __slots__ = ('start_memory', 'peak')
+
+    def __init__(self, start_memory):
+        self.start_memory = start_memory
+        self.peak = start_memory
+
+class Profiler:
+    """记录各阶段的统计，stages按首次出现的顺序保存"""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._stack = []
+        self._started = None
+        self._cpu_started = None
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        self.wall = time.perf_counter() - self._started
+        self.cpu = time.process_time() - self._cpu_started
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _enter_memory(self):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, peak)
+        # 每个阶段从当前占用重新统计峰值，旧版本Python没有reset_peak时峰值可能偏大
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self._stack.append(_Frame(current))
+
+    def _exit_memory(self):
+        _, peak = tracemalloc.get_traced_memory()
+        frame = self._stack.pop()
+        frame.peak = max(frame.peak, peak)
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, frame.peak)
+        return frame.peak - frame.start_memory
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            self._enter_memory()
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+            peak = self._exit_memory() if tracing else 0
+            record = self.stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak': 0})
+            record['calls'] += 1
+            record['wall'] += wall
+            record['cpu'] += cpu
+            record['peak'] = max(record['peak'], peak)
+
+    def report(self):
+        """返回可以保存为JSON的报告，时间单位为秒，内存单位为KiB"""
+        return {
+            'version': REPORT_VERSION,
+            'trace-memory': self.trace_memory,
+            'wall': round(self.wall, 6),
+            'cpu': round(self.cpu, 6),
+            'stages': [
+                {
+                    'name': name,
+                    'calls': record['calls'],
+                    'wall': round(record['wall'], 6),
+                    'cpu': round(record['cpu'], 6),
+                    'peak_kib': round(record['peak'] / 1024, 1),
+                }
+                for name, record in self.stages.items()
+            ],
+        }
+
+    def print_summary(self, file=None):
+        """打印各阶段的汇总表，占比按总墙钟时间计算"""
+        file = file or sys.stdout
+        print(f"{'阶段':<18}{'次数':>6}{'墙钟(s)':>11}{'CPU(s)':>11}{'占比':>8}{'峰值内存(KiB)':>16}", file=file)
+        for name, record in self.stages.items():
+            share = record['wall'] / self.wall if self.wall else 0
+            print(f"{name:<18}{record['calls']:>6}{record['wall']:>11.4f}{record['cpu']:>11.4f}"
+                  f"{share:>8.1%}{record['peak'] / 1024:>16.1f}", file=file)
+        print(f"{'总计':<18}{'':>6}{self.wall:>11.4f}{self.cpu:>11.4f}", file=file)
+        if self.trace_memory:
+            print("注: 启用tracemalloc后耗时会明显增加，比较耗时时可以使用--profile-no-memory", file=file)
+
+def stage(name):
+    """返回标记阶段的上下文管理器，未启用剖析时什么也不做"""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+@contextlib.contextmanager
+def session(enabled, report_file=None, trace_memory=True, file=None):
+    """在with块内启用剖析，结束时打印汇总表，report_file不为None时保存JSON报告
+
+    enabled为False时什么也不做，便于调用方无条件使用。
+    """
+    global _active
+    if not enabled:
+        yield None
+        return
+
+    profiler = Profiler(trace_memory)
+    previous, _active = _active, profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active = previous
+        profiler.print_summary(file)
+        if report_file:
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(profiler.report(), f, ensure_ascii=False, indent=2)
+            print(f"性能剖析报告已保存到 {report_file}", file=file)
+
+def wrap(func, enabled, report_file=None, trace_memory=True, file=None):
+    """返回每次调用都在单独的剖析会话中执行func的函数，用于监视模式的重复生成"""
+    if not enabled:
+        return func
+
+    def run():
+        with session(True, report_file, trace_memory, file):
+            return func()
+    return run
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""节点配置的紧凑表示
+
+十万个以上的节点每个都是一个dict，还带着ws-opts/h2-opts等嵌套dict，dict本身的开销和
+重复的键字符串占了大部分内存。这里把节点转换为只读的CompactProxy:
+  - 键的组合(形状)只保存一份，所有相同形状的节点共享，每个节点只保存值的元组；
+  - 嵌套的选项对象按内容共享，path/host相同的节点引用同一个对象；
+  - 列表转换为只读的FrozenList。
+
+CompactProxy实现了Mapping接口，读取方式与dict相同。序列化层(serializer)为这两种类型注册了
+表示方式，写入时直接输出为普通的映射和列表，不生成锚点，结果与dict完全一致；
+需要普通dict时调用to_plain。
+"""
+
+from collections.abc import Mapping
+
+# 共享对象缓存的条目数上限，超过时清空，长期运行的进程内存不会无限增长
+MAX_SHARED_VALUES = 100000
+
+_shapes = {}
+_shared_values = {}
+
+def _strict_equal(values, others):
+    """逐个比较值，类型也必须相同，避免True和1这样相等但序列化结果不同的值被共享"""
+    return len(values) == len(others) and all(
+        type(value) is type(other) and value == other for value, other in zip(values, others))
+
+class FrozenList(tuple):
+    """只读列表，序列化为普通的YAML/JSON列表"""
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return isinstance(other, FrozenList) and _strict_equal(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+class _Shape:
+    """一组键及其位置，相同键组合的CompactProxy共享同一个_Shape"""
+    __slots__ = ('keys', 'index')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = {key: position for position, key in enumerate(keys)}
+
+def _shape(keys):
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = _shapes[keys] = _Shape(keys)
+    return shape
+
+class CompactProxy(Mapping):
+    """只读的紧凑映射，键的顺序与创建时的dict相同"""
+    __slots__ = ('_shape', '_values')
+
+    def __init__(self, shape, values):
+        self._shape = shape
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._shape.index[key]]
+
+    def __contains__(self, key):
+        return key in self._shape.index
+
+    def __iter__(self):
+        return iter(self._shape.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def items(self):
+        return zip(self._shape.keys, self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, CompactProxy):
+            return self._shape is other._shape and _strict_equal(self._values, other._values)
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return hash((self._shape.keys, self._values))
+
+    def __repr__(self):
+        return f"CompactProxy({to_plain(self)!r})"
+
+    def __reduce__(self):
+        # 在子进程和主进程之间传递时重新压缩，恢复共享
+        return compact, (to_plain(self),)
+
+def _share(value):
+    """相同内容的嵌套对象只保留一个"""
+    try:
+        shared = _shared_values.get(value)
+    except TypeError:
+        # 含有无法哈希的值，不共享
+        return value
+    if shared is not None:
+        return shared
+    if len(_shared_values) >= MAX_SHARED_VALUES:
+        _shared_values.clear()
+    _shared_values[value] = value
+    return value
+
+def compact(value, shared=False):
+    """把dict/list递归转换为CompactProxy/FrozenList，其他值原样返回
+
+    shared为True时按内容共享结果，用于节点内的嵌套选项。
+    """
+    if isinstance(value, dict):
+        result = CompactProxy(_shape(tuple(value)), tuple(compact(item, True) for item in value.values()))
+    elif isinstance(value, list):
+        result = FrozenList(compact(item, True) for item in value)
+    else:
+        return value
+    return _share(result) if shared else result
+
+def to_plain(value):
+    """把CompactProxy/FrozenList递归转换回dict/list"""
+    if isinstance(value, Mapping):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, FrozenList):
+        return [to_plain(item) for item in value]
+    return value
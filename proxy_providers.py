@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""把节点分片写入本地proxy-providers文件
+
+节点按来源订阅或地区分片，每个分片写成只有proxies的YAML文件，主配置的proxy-providers
+以file类型引用这些文件；代理组使用include-all，自动包含所有提供者的节点。
+
+分片文件通过atomic_write写入，内容没有变化的分片不会改写。订阅更新后只有变化的分片文件
+被替换，主配置只在分片增减时才改变，Clash只需刷新对应的提供者，不必重新加载整个配置
+(DNS、规则和所有规则集)。
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import atomic_write
+import serializer
+import subscription
+from clash_template import GROUP_BASE_OPTION
+
+DEFAULT_DIRECTORY = 'providers'
+
+SHARD_MODES = ('source', 'region')
+
+HEALTH_CHECK = {
+    'enable': True,
+    'url': GROUP_BASE_OPTION['url'],
+    'interval': GROUP_BASE_OPTION['interval'],
+    'lazy': True,
+}
+
+# 常见地区的提供者名称和节点名称中的关键字，没有国旗emoji时按关键字识别
+REGIONS = [
+    ('HK', '香港', ['香港', 'Hong Kong', 'HK']),
+    ('TW', '台湾', ['台湾', '台灣', 'Taiwan', 'TW']),
+    ('JP', '日本', ['日本', 'Japan', 'JP']),
+    ('SG', '新加坡', ['新加坡', 'Singapore', 'SG']),
+    ('US', '美国', ['美国', 'United States', 'USA', 'US']),
+    ('KR', '韩国', ['韩国', 'Korea', 'KR']),
+    ('GB', '英国', ['英国', 'United Kingdom', 'UK', 'GB']),
+    ('DE', '德国', ['德国', 'Germany', 'DE']),
+]
+OTHER_REGION = ('OTHER', '其他')
+
+REGION_NAMES = {code: name for code, name, _ in REGIONS}
+
+# 英文关键字前后不能紧跟字母，避免USA中的US之外还匹配到RUS、PLUS等
+_REGION_PATTERNS = [
+    (code, re.compile('|'.join(
+        re.escape(keyword) if not keyword.isascii() else rf'(?<![A-Za-z]){re.escape(keyword)}(?![A-Za-z])'
+        for keyword in keywords)))
+    for code, _, keywords in REGIONS
+]
+
+_FLAG_PATTERN = re.compile('[\U0001F1E6-\U0001F1FF]{2}')
+
+_UNSAFE_FILENAME = re.compile(r'[^\w.-]+')
+
+# 分片目录中记录本模块写入的文件名的清单，只删除清单中的文件
+MANIFEST_FILENAME = '.shards.json'
+
+# changed: 分片文件的内容是否改变
+ShardResult = namedtuple('ShardResult', ['name', 'path', 'count', 'changed'])
+
+def region_code(name):
+    """从节点名称识别地区代码，优先使用国旗emoji，无法识别时返回OTHER"""
+    match = _FLAG_PATTERN.search(name)
+    if match:
+        return ''.join(chr(ord(char) - 0x1F1E6 + ord('A')) for char in match.group())
+    for code, pattern in _REGION_PATTERNS:
+        if pattern.search(name):
+            return code
+    return OTHER_REGION[0]
+
+def region_provider_name(code):
+    """地区代码对应的提供者名称"""
+    if code == OTHER_REGION[0]:
+        return OTHER_REGION[1]
+    return REGION_NAMES.get(code, code)
+
+def source_provider_name(source):
+    """来源(订阅地址或输入文件)对应的提供者名称
+
+    订阅地址使用主机名加地址的哈希，同一主机的不同订阅不会冲突；输入文件使用不带扩展名的文件名。
+    """
+    if subscription.is_url(source):
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:8]
+        return f"{urlsplit(source).hostname or 'subscription'}-{digest}"
+    return os.path.splitext(os.path.basename(source))[0] or source
+
+def shard_proxies(tagged_proxies, mode='source'):
+    """把[(来源, 节点)]分片，返回{提供者名称: 节点列表}，按首次出现的顺序排列"""
+    if mode not in SHARD_MODES:
+        raise ValueError(f"未知的分片方式: {mode}")
+    shards = {}
+    for source, proxy in tagged_proxies:
+        if mode == 'source':
+            name = source_provider_name(source)
+        else:
+            name = region_provider_name(region_code(proxy['name']))
+        shards.setdefault(name, []).append(proxy)
+    return shards
+
+def shard_filename(name):
+    """提供者名称对应的分片文件名"""
+    return (_UNSAFE_FILENAME.sub('_', name).strip('._') or 'provider') + '.yaml'
+
+def write_shards(shards, directory=DEFAULT_DIRECTORY, base_dir='.'):
+    """把每个分片写入directory下的文件，返回(ShardResult列表, 删除的文件路径列表)
+
+    directory是相对于base_dir(Clash的工作目录，即主配置所在目录)的路径，ShardResult.path
+    是写入主配置的相对路径。内容没有变化的分片文件保持不变。写入的文件名记录在directory下的
+    清单中，上次写入、这次已经没有节点的分片文件会被删除；directory中的其他文件不受影响。
+    """
+    full_directory = os.path.join(base_dir, directory)
+    os.makedirs(full_directory, exist_ok=True)
+    results = []
+    written = set()
+    for name, proxies in shards.items():
+        filename = shard_filename(name)
+        writer = atomic_write.AtomicWriter(os.path.join(full_directory, filename))
+        with writer as f:
+            serializer.dump_streaming({'proxies': proxies}, f)
+        results.append(ShardResult(name, _config_path(directory, filename), len(proxies), writer.changed))
+        written.add(filename)
+
+    removed = []
+    for filename in sorted(_load_manifest(full_directory) - written):
+        try:
+            os.remove(os.path.join(full_directory, filename))
+        except FileNotFoundError:
+            continue
+        removed.append(_config_path(directory, filename))
+    atomic_write.write_if_changed(os.path.join(full_directory, MANIFEST_FILENAME),
+                                  json.dumps(sorted(written), ensure_ascii=False))
+    return results, removed
+
+def _config_path(directory, filename):
+    """写入主配置的相对路径，例如./providers/a.yaml"""
+    return './' + os.path.normpath(os.path.join(directory, filename)).replace(os.sep, '/')
+
+def _load_manifest(directory):
+    """上次写入directory的分片文件名集合，没有清单时为空"""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            names = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    # 清单被改坏时不删除任何文件，也不接受带路径的名称
+    if not isinstance(names, list):
+        return set()
+    return {name for name in names
+            if isinstance(name, str) and name.endswith('.yaml') and name == os.path.basename(name)}
+
+def _is_managed(provider, directory):
+    """provider是否为之前写入directory的分片"""
+    if not isinstance(provider, dict) or provider.get('type') != 'file' or not provider.get('path'):
+        return False
+    return (os.path.dirname(os.path.normpath(provider['path'])) or '.') == os.path.normpath(directory)
+
+def apply_providers(config, results, directory=DEFAULT_DIRECTORY):
+    """用分片结果更新config的proxy-providers
+
+    模板中原有的其他提供者保留在前面；之前写入directory、这次已经没有节点的分片从配置中删除。
+    """
+    providers = {name: provider for name, provider in (config.get('proxy-providers') or {}).items()
+                 if not _is_managed(provider, directory)}
+    for result in results:
+        providers[result.name] = {
+            'type': 'file',
+            'path': result.path,
+            'health-check': dict(HEALTH_CHECK),
+        }
+    config['proxy-providers'] = providers
+    return config
+
+def print_shard_results(results, removed=()):
+    """打印每个分片的节点数和是否改变，以及删除的分片文件"""
+    for result in results:
+        state = '已更新' if result.changed else '未变化'
+        print(f"提供者 {result.name}: {result.count} 个节点，{result.path} {state}")
+    for path in removed:
+        print(f"已删除不再使用的分片文件 {path}")
+    changed = sum(result.changed for result in results)
+    print(f"共 {len(results)} 个提供者，{changed} 个分片文件已更新")
@@ -1,4 +1,14 @@
+import argparse
+import contextlib
+import copy
+import glob
+import io
+import json
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 # 检查并安装必要的依赖
 try:
@@ -27,303 +37,254 @@ except ImportError:
         print("然后重新运行此脚本")
         sys.exit(1)
 
+import atomic_write
+import clash_template
+import controller
+import group_filter
+import probe
+import profiler
+import serializer
+import watch
+
+# 批量模式在目录中查找的配置文件
+BATCH_PATTERNS = ('*.yaml', '*.yml')
+
+# 批量模式的输出文件与输入文件放在同一目录，文件名加上这个后缀
+DEFAULT_BATCH_SUFFIX = '.modified'
+
 def process_config(original_config):
-    # 国内DNS服务器
-    domestic_nameservers = [
-        "https://dns.alidns.com/dns-query",  # 阿里云公共DNS
-        "https://doh.pub/dns-query",         # 腾讯DNSPod
-        "https://doh.360.cn/dns-query"       # 360安全DNS
-    ]
+    # DNS、代理组、规则集和规则使用共用模板，批量处理时所有配置共享同一份，不深拷贝，见clash_template模块
+    sections = clash_template.static_sections()
     
-    # 国外DNS服务器
-    foreign_nameservers = [
-        "https://1.1.1.1/dns-query",         # Cloudflare(主)
-        "https://1.0.0.1/dns-query",         # Cloudflare(备)
-        "https://208.67.222.222/dns-query",  # OpenDNS(主)
-        "https://208.67.220.220/dns-query",  # OpenDNS(备)
-        "https://194.242.2.2/dns-query",     # Mullvad(主)
-        "https://194.242.2.3/dns-query"      # Mullvad(备)
-    ]
-    
-    # DNS配置
-    dns_config = {
-        "enable": True,
-        "listen": "0.0.0.0:1053",
-        "ipv6": True,
-        "use-system-hosts": False,
-        "cache-algorithm": "arc",
-        "enhanced-mode": "fake-ip",
-        "fake-ip-range": "198.18.0.1/16",
-        "fake-ip-filter": [
-            "+.lan",
-            "+.local",
-            "+.msftconnecttest.com",
-            "+.msftncsi.com",
-            "localhost.ptlogin2.qq.com",
-            "localhost.sec.qq.com",
-            "localhost.work.weixin.qq.com"
-        ],
-        "default-nameserver": ["223.5.5.5", "119.29.29.29", "1.1.1.1", "8.8.8.8"],
-        "nameserver": domestic_nameservers + foreign_nameservers,
-        "proxy-server-nameserver": domestic_nameservers + foreign_nameservers,
-        "nameserver-policy": {
-            "geosite:private,cn,geolocation-cn": domestic_nameservers,
-            "geosite:google,youtube,telegram,gfw,geolocation-!cn": foreign_nameservers
-        }
-    }
+    # 修改配置
+    config = original_config.copy()
+    config["dns"] = sections["dns"]
+    config["proxy-groups"] = sections["proxy-groups"]
+    config["rule-providers"] = sections["rule-providers"]
+    config["rules"] = sections["rules"]
     
-    # 规则集通用配置
-    rule_provider_common = {
-        "type": "http",
-        "format": "yaml",
-        "interval": 86400
-    }
+    return config
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='优化现有的Clash配置文件')
+    parser.add_argument('input_file', nargs='?', default='original_config.yaml',
+                        help='原始配置文件 (默认: original_config.yaml)')
+    parser.add_argument('output_file', nargs='?', default='modified_config.yaml',
+                        help='输出的配置文件 (默认: modified_config.yaml)')
+    parser.add_argument('--format', choices=['yaml', 'json'], default='yaml',
+                        help='输出格式: json是合法的YAML，Clash和其他程序加载更快 (默认: yaml)')
+    parser.add_argument('--compact', action='store_true',
+                        help='--format json时输出不缩进的紧凑JSON')
+    parser.add_argument('--expand-filters', choices=['list', 'regex'],
+                        help='离线计算include-all代理组的filter: list写成显式节点列表，regex写成更短的等价正则')
+    parser.add_argument('--verify-filters', action='store_true',
+                        help='离线计算filter时用原正则逐个核对节点，结果不一致时报错')
+    parser.add_argument('--probe', choices=['drop', 'demote'],
+                        help='写入前并发探测节点的TCP连通性: drop删除不可达节点，demote移到列表末尾')
+    parser.add_argument('--probe-tls', action='store_true',
+                        help='对启用TLS的节点在TCP连接后再做TLS握手')
+    parser.add_argument('--probe-timeout', type=float, default=probe.DEFAULT_TIMEOUT,
+                        help=f'每个节点的探测超时秒数 (默认: {probe.DEFAULT_TIMEOUT})')
+    parser.add_argument('--probe-concurrency', type=int, default=probe.DEFAULT_CONCURRENCY,
+                        help=f'同时进行的探测数 (默认: {probe.DEFAULT_CONCURRENCY})')
+    parser.add_argument('--probe-report', help='把每个节点的探测结果和延迟保存为JSON文件')
+    parser.add_argument('--watch', action='store_true',
+                        help='常驻模式: 监视原始配置文件，内容变化时在当前进程内重新生成')
+    parser.add_argument('--watch-interval', type=float, default=watch.DEFAULT_INTERVAL,
+                        help=f'监视模式检查文件的间隔秒数 (默认: {watch.DEFAULT_INTERVAL})')
+    parser.add_argument('--push', action='store_true',
+                        help='写入后通过external-controller推送到运行中的Clash: 只有结构变化时才完整重新加载，'
+                             '否则只修改常规设置和刷新变化的代理提供者')
+    parser.add_argument('--controller', help='--push使用的控制器地址 (默认: 配置中的external-controller)')
+    parser.add_argument('--controller-secret', help='--push使用的控制器secret (默认: 配置中的secret)')
+    parser.add_argument('--batch', metavar='DIR_OR_MANIFEST',
+                        help='批量模式: 处理目录中所有yaml文件，或清单文件中列出的文件(每行一个，可用制表符分隔指定输出文件)')
+    parser.add_argument('--batch-suffix', default=DEFAULT_BATCH_SUFFIX,
+                        help=f'批量模式输出文件名的后缀，输出与输入放在同一目录 (默认: {DEFAULT_BATCH_SUFFIX})')
+    parser.add_argument('--batch-report', help='批量模式下把每个文件的处理结果保存为JSON文件')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='批量模式使用的进程数，0表示使用全部CPU核心 (默认: 1)')
+    parser.add_argument('--profile', action='store_true',
+                        help='记录读取、处理、序列化、写入等各阶段的耗时和峰值内存，结束时打印汇总表')
+    parser.add_argument('--profile-report', help='把性能剖析结果保存为JSON文件 (需要--profile)')
+    parser.add_argument('--profile-no-memory', action='store_true',
+                        help='性能剖析时不使用tracemalloc统计内存，耗时更接近未剖析时')
+    args = parser.parse_args(argv)
+    if args.jobs <= 0:
+        args.jobs = os.cpu_count() or 1
+    return args
+
+def rebuild(args):
+    """读取原始配置，处理后写入输出文件，返回输出文件的内容是否改变"""
+    # 读取原始配置
+    with profiler.stage('read'):
+        with open(args.input_file, "r", encoding="utf-8") as f:
+            text = f.read()
+    with profiler.stage('load'):
+        original_config = serializer.load(text)
     
-    # 规则集配置
-    rule_providers = {
-        "reject": {**rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/reject.txt",
-            "path": "./ruleset/loyalsoldier/reject.yaml"
-        },
-        "icloud": {** rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/icloud.txt",
-            "path": "./ruleset/loyalsoldier/icloud.yaml"
-        },
-        "apple": {**rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/apple.txt",
-            "path": "./ruleset/loyalsoldier/apple.yaml"
-        },
-        "google": {**rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/google.txt",
-            "path": "./ruleset/loyalsoldier/google.yaml"
-        },
-        "proxy": {**rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/proxy.txt",
-            "path": "./ruleset/loyalsoldier/proxy.yaml"
-        },
-        "direct": {**rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/direct.txt",
-            "path": "./ruleset/loyalsoldier/direct.yaml"
-        },
-        "private": {**rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/private.txt",
-            "path": "./ruleset/loyalsoldier/private.yaml"
-        },
-        "gfw": {**rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/gfw.txt",
-            "path": "./ruleset/loyalsoldier/gfw.yaml"
-        },
-        "tld-not-cn": {**rule_provider_common,
-            "behavior": "domain",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/tld-not-cn.txt",
-            "path": "./ruleset/loyalsoldier/tld-not-cn.yaml"
-        },
-        "telegramcidr": {**rule_provider_common,
-            "behavior": "ipcidr",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/telegramcidr.txt",
-            "path": "./ruleset/loyalsoldier/telegramcidr.yaml"
-        },
-        "cncidr": {**rule_provider_common,
-            "behavior": "ipcidr",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/cncidr.txt",
-            "path": "./ruleset/loyalsoldier/cncidr.yaml"
-        },
-        "lancidr": {**rule_provider_common,
-            "behavior": "ipcidr",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/lancidr.txt",
-            "path": "./ruleset/loyalsoldier/lancidr.yaml"
-        },
-        "applications": {**rule_provider_common,
-            "behavior": "classical",
-            "url": "https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/applications.txt",
-            "path": "./ruleset/loyalsoldier/applications.yaml"
-        },
-        "openai": {
-            **rule_provider_common,
-            "behavior": "classical",
-            "url": "https://fastly.jsdelivr.net/gh/blackmatrix7/ios_rule_script@master/rule/Clash/OpenAI/OpenAI.yaml",
-            "path": "./ruleset/blackmatrix7/openai.yaml"
-        }
-    }
+    # 检查是否有代理节点
+    if not original_config.get("proxies") and not original_config.get("proxy-providers"):
+        raise ValueError("配置文件中未找到任何代理")
     
-    # 规则配置
-    rules = [
-        # 自定义规则
-        "DOMAIN-SUFFIX,googleapis.cn,节点选择", # Google服务
-        "DOMAIN-SUFFIX,gstatic.com,节点选择", # Google静态资源
-        "DOMAIN-SUFFIX,xn--ngstr-lra8j.com,节点选择", # Google Play下载服务
-        "DOMAIN-SUFFIX,github.io,节点选择", # Github Pages
-        "DOMAIN,v2rayse.com,节点选择", # V2rayse节点工具
-        # blackmatrix7 规则集
-        "RULE-SET,openai,ChatGPT",
-        # Loyalsoldier 规则集
-        "RULE-SET,applications,全局直连",
-        "RULE-SET,private,全局直连",
-        "RULE-SET,reject,广告过滤",
-        "RULE-SET,icloud,微软服务",
-        "RULE-SET,apple,苹果服务",
-        "RULE-SET,google,谷歌服务",
-        "RULE-SET,proxy,节点选择",
-        "RULE-SET,gfw,节点选择",
-        "RULE-SET,tld-not-cn,节点选择",
-        "RULE-SET,direct,全局直连",
-        "RULE-SET,lancidr,全局直连,no-resolve",
-        "RULE-SET,cncidr,全局直连,no-resolve",
-        "RULE-SET,telegramcidr,电报消息,no-resolve",
-        # 其他规则
-        "GEOIP,LAN,全局直连,no-resolve",
-        "GEOIP,CN,全局直连,no-resolve",
-        "MATCH,漏网之鱼"
-    ]
+    # 处理配置
+    with profiler.stage('process'):
+        modified_config = process_config(original_config)
+    if args.probe:
+        with profiler.stage('probe'):
+            probe.probe_config(modified_config, timeout=args.probe_timeout,
+                               concurrency=max(1, args.probe_concurrency), tls=args.probe_tls,
+                               action=args.probe, report_file=args.probe_report)
+    if args.expand_filters:
+        with profiler.stage('expand-filters'):
+            summary = group_filter.expand_group_filters(modified_config, args.expand_filters, args.verify_filters)
+        group_filter.print_expand_summary(summary)
     
-    # 代理组通用配置
-    group_base_option = {
-        "interval": 300,
-        "timeout": 3000,
-        "url": "https://www.google.com/generate_204",
-        "lazy": True,
-        "max-failed-times": 3,
-        "hidden": False
-    }
+    # 保存修改后的配置，内容与现有输出文件相同时不替换，避免Clash无谓地重新加载
+    if args.format == 'json':
+        with profiler.stage('dump'):
+            text = serializer.dump_json(modified_config, compact=args.compact)
+        with profiler.stage('write'):
+            changed = atomic_write.write_if_changed(args.output_file, text)
+    else:
+        # proxies分批序列化后直接写入临时文件，不在内存中生成完整的YAML文本，
+        # 序列化与写入交替进行，无法分开计时，合并为dump-write阶段
+        writer = atomic_write.AtomicWriter(args.output_file)
+        with profiler.stage('dump-write'):
+            with writer as f:
+                serializer.dump_streaming(modified_config, f, cached_keys=clash_template.STATIC_SECTION_KEYS)
+        changed = writer.changed
     
-    # 代理组配置
-    proxy_groups = [
-        {** group_base_option,
-            "name": "节点选择",
-            "type": "select",
-            "proxies": ["延迟选优", "故障转移", "负载均衡(散列)", "负载均衡(轮询)"],
-            "include-all": True,
-            "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/adjust.svg"
-        },
-        {** group_base_option,
-        "name": "延迟选优",
-        "type": "url-test",
-        "tolerance": 100,
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/speed.svg"
-        },
-        {** group_base_option,
-        "name": "故障转移",
-        "type": "fallback",
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/ambulance.svg"
-        },
-        {** group_base_option,
-        "name": "负载均衡(散列)",
-        "type": "load-balance",
-        "strategy": "consistent-hashing",
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/merry_go.svg"
-        },
-        {** group_base_option,
-        "name": "负载均衡(轮询)",
-        "type": "load-balance",
-        "strategy": "round-robin",
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/balance.svg"
-        },
-        {** group_base_option,
-        "name": "谷歌服务",
-        "type": "select",
-        "proxies": ["节点选择", "延迟选优", "故障转移", "负载均衡(散列)", "负载均衡(轮询)", "全局直连"],
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/google.svg"
-        },
-        {** group_base_option,
-        "name": "国外媒体",
-        "type": "select",
-        "proxies": ["节点选择", "延迟选优", "故障转移", "负载均衡(散列)", "负载均衡(轮询)", "全局直连"],
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/youtube.svg"
-        },
-        {** group_base_option,
-        "name": "电报消息",
-        "type": "select",
-        "proxies": ["节点选择", "延迟选优", "故障转移", "负载均衡(散列)", "负载均衡(轮询)", "全局直连"],
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/telegram.svg"
-        },
-        {** group_base_option,
-        "url": "https://chatgpt.com",
-        "expected-status": "200",
-        "name": "ChatGPT",
-        "type": "select",
-        "include-all": True,
-        "filter": "AD|🇦🇩|AE|🇦🇪|AF|🇦🇫|AG|🇦🇬|AL|🇦🇱|AM|🇦🇲|AO|🇦🇴|AR|🇦🇷|AT|🇦🇹|AU|🇦🇺|AZ|🇦🇿|BA|🇧🇦|BB|🇧🇧|BD|🇧🇩|BE|🇧🇪|BF|🇧🇫|BG|🇧🇬|BH|🇧🇭|BI|🇧🇮|BJ|🇧🇯|BN|🇧🇳|BO|🇧🇴|BR|🇧🇷|BS|🇧🇸|BT|🇧🇹|BW|🇧🇼|BZ|🇧🇿|CA|🇨🇦|CD|🇨🇩|CF|🇨🇫|CG|🇨🇬|CH|🇨🇭|CI|🇨🇮|CL|🇨🇱|CM|🇨🇲|CO|🇨🇴|CR|🇨🇷|CV|🇨🇻|CY|🇨🇾|CZ|🇨🇿|DE|🇩🇪|DJ|🇩🇯|DK|🇩🇰|DM|🇩🇲|DO|🇩🇴|DZ|🇩🇿|EC|🇪🇨|EE|🇪🇪|EG|🇪🇬|ER|🇪🇷|ES|🇪🇸|ET|🇪🇹|FI|🇫🇮|FJ|🇫🇯|FM|🇫🇲|FR|🇫🇷|GA|🇬🇦|GB|🇬🇧|GD|🇬🇩|GE|🇬🇪|GH|🇬🇭|GM|🇬🇲|GN|🇬🇳|GQ|🇬🇶|GR|🇬🇷|GT|🇬🇹|GW|🇬🇼|GY|🇬🇾|HN|🇭🇳|HR|🇭🇷|HT|🇭🇹|HU|🇭🇺|ID|🇮🇩|IE|🇮🇪|IL|🇮🇱|IN|🇮🇳|IQ|🇮🇶|IS|🇮🇸|IT|🇮🇹|JM|🇯🇲|JO|🇯🇴|JP|🇯🇵|KE|🇰🇪|KG|🇰🇬|KH|🇰🇭|KI|🇰🇮|KM|🇰🇲|KN|🇰🇳|KR|🇰🇷|KW|🇰🇼|KZ|🇰🇿|LA|🇱🇦|LB|🇱🇧|LC|🇱🇨|LI|🇱🇮|LK|🇱🇰|LR|🇱🇷|LS|🇱🇸|LT|🇱🇹|LU|🇱🇺|LV|🇱🇻|LY|🇱🇾|MA|🇲🇦|MC|🇲🇨|MD|🇲🇩|ME|🇲🇪|MG|🇲🇬|MH|🇲🇭|MK|🇲🇰|ML|🇲🇱|MM|🇲🇲|MN|🇲🇳|MR|🇲🇷|MT|🇲🇹|MU|🇲🇺|MV|🇲🇻|MW|🇲🇼|MX|🇲🇽|MY|🇲🇾|MZ|🇲🇿|NA|🇳🇦|NE|🇳🇪|NG|🇳🇬|NI|🇳🇮|NL|🇳🇱|NO|🇳🇴|NP|🇳🇵|NR|🇳🇷|NZ|🇳🇿|OM|🇴🇲|PA|🇵🇦|PE|🇵🇪|PG|🇵🇬|PH|🇵🇭|PK|🇵🇰|PL|🇵🇱|PS|🇵🇸|PT|🇵🇹|PW|🇵🇼|PY|🇵🇾|QA|🇶🇦|RO|🇷🇴|RS|🇷🇸|RW|🇷🇼|SA|🇸🇦|SB|🇸🇧|SC|🇸🇨|SD|🇸🇩|SE|🇸🇪|SG|🇸🇬|SI|🇸🇮|SK|🇸🇰|SL|🇸🇱|SM|🇸🇲|SN|🇸🇳|SO|🇸🇴|SR|🇸🇷|SS|🇸🇸|ST|🇸🇹|SV|🇸🇻|SZ|🇸🇿|TD|🇹🇩|TG|🇹🇬|TH|🇹🇭|TJ|🇹🇯|TL|🇹🇱|TM|🇹🇲|TN|🇹🇳|TO|🇹🇴|TR|🇹🇷|TT|🇹🇹|TV|🇹🇻|TW|🇹🇼|TZ|🇹🇿|UA|🇺🇦|UG|🇺🇬|US|🇺🇸|UY|🇺🇾|UZ|🇺🇿|VA|🇻🇦|VC|🇻🇨|VN|🇻🇳|VU|🇻🇺|WS|🇼🇸|YE|🇾🇪|ZA|🇿🇦|ZM|🇿🇲|ZW|🇿🇼",
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/chatgpt.svg"
-        },
-        {** group_base_option,
-        "name": "微软服务",
-        "type": "select",
-        "proxies": ["全局直连", "节点选择", "延迟选优", "故障转移", "负载均衡(散列)", "负载均衡(轮询)"],
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/microsoft.svg"
-        },
-        {** group_base_option,
-        "name": "苹果服务",
-        "type": "select",
-        "proxies": ["节点选择", "延迟选优", "故障转移", "负载均衡(散列)", "负载均衡(轮询)", "全局直连"],
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/apple.svg"
-        },
-        {** group_base_option,
-        "name": "广告过滤",
-        "type": "select",
-        "proxies": ["REJECT", "DIRECT"],
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/bug.svg"
-        },
-        {** group_base_option,
-        "name": "全局直连",
-        "type": "select",
-        "proxies": ["DIRECT", "节点选择", "延迟选优", "故障转移", "负载均衡(散列)", "负载均衡(轮询)"],
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/link.svg"
-        },
-        {** group_base_option,
-        "name": "全局拦截",
-        "type": "select",
-        "proxies": ["REJECT", "DIRECT"],
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/block.svg"
-        },
-        {** group_base_option,
-        "name": "漏网之鱼",
-        "type": "select",
-        "proxies": ["节点选择", "延迟选优", "故障转移", "负载均衡(散列)", "负载均衡(轮询)", "全局直连"],
-        "include-all": True,
-        "icon": "https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/fish.svg"
-        }
-    ]
+    description = 'JSON格式' if args.format == 'json' else f"YAML后端: {serializer.describe_backend()}"
+    if changed:
+        print(f"配置文件处理完成，已保存为 {args.output_file} ({description})")
+    else:
+        print(f"配置文件处理完成，内容没有变化，{args.output_file} 保持不变 ({description})")
+    return changed
+
+def batch_output_path(input_file, suffix=DEFAULT_BATCH_SUFFIX):
+    """批量模式的输出文件路径: 与输入同目录，扩展名前加上后缀"""
+    root, ext = os.path.splitext(input_file)
+    return root + suffix + (ext or '.yaml')
+
+def collect_batch_tasks(source, suffix=DEFAULT_BATCH_SUFFIX):
+    """返回[(输入文件, 输出文件)]
     
-    # 修改配置
-    config = original_config.copy()
-    config["dns"] = dns_config
-    config["proxy-groups"] = proxy_groups
-    config["rule-providers"] = rule_providers
-    config["rules"] = rules
+    source为目录时处理其中所有yaml文件(跳过带后缀的输出文件)；否则作为清单文件，
+    每行一个输入文件，可以用制表符分隔指定输出文件，相对路径以清单所在目录为基准，#开头的行为注释。
+    """
+    if os.path.isdir(source):
+        inputs = sorted({path for pattern in BATCH_PATTERNS for path in glob.glob(os.path.join(source, pattern))})
+        return [(path, batch_output_path(path, suffix)) for path in inputs
+                if not os.path.splitext(path)[0].endswith(suffix)]
     
-    return config
+    base_dir = os.path.dirname(source)
+    tasks = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            input_file, _, output_file = line.partition('\t')
+            input_file = os.path.join(base_dir, input_file.strip())
+            if output_file.strip():
+                output_file = os.path.join(base_dir, output_file.strip())
+            else:
+                output_file = batch_output_path(input_file, suffix)
+            tasks.append((input_file, output_file))
+    return tasks
 
-# 读取原始配置
-with open("original_config.yaml", "r", encoding="utf-8") as f:
-    original_config = yaml.safe_load(f)
+def rebuild_batch_item(args, task):
+    """处理批量模式中的一个文件，返回状态字典，异常不会向外抛出，可以在子进程中调用"""
+    input_file, output_file = task
+    item_args = copy.copy(args)
+    item_args.input_file, item_args.output_file = input_file, output_file
+    result = {'input': input_file, 'output': output_file, 'status': 'ok', 'changed': False, 'error': None}
+    started = time.perf_counter()
+    try:
+        # 每个文件的处理日志不输出，只在状态报告中汇总
+        with contextlib.redirect_stdout(io.StringIO()):
+            result['changed'] = rebuild(item_args)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['seconds'] = round(time.perf_counter() - started, 6)
+    return result
 
-# 检查是否有代理节点
-if not original_config.get("proxies") and not original_config.get("proxy-providers"):
-    raise ValueError("配置文件中未找到任何代理")
+def iter_batch_results(args, tasks):
+    """按清单顺序生成每个文件的处理结果，jobs大于1时使用进程池
+    
+    每个工作进程只导入一次模板，模板各段的渲染结果在进程内缓存，处理后续文件时直接复用。
+    """
+    jobs = min(args.jobs, len(tasks))
+    if jobs <= 1:
+        for task in tasks:
+            yield rebuild_batch_item(args, task)
+        return
+    
+    # 每批交给子进程若干个文件，减少进程间通信的次数
+    chunksize = max(1, len(tasks) // (jobs * 8))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(partial(rebuild_batch_item, args), tasks, chunksize=chunksize)
 
-# 处理配置
-modified_config = process_config(original_config)
+def run_batch(args):
+    """批量模式: 处理目录或清单中的所有配置，打印每个文件的状态，有失败时返回1"""
+    try:
+        tasks = collect_batch_tasks(args.batch, args.batch_suffix)
+    except FileNotFoundError:
+        print(f"错误: 找不到清单文件 '{args.batch}'")
+        return 1
+    if not tasks:
+        print(f"{args.batch} 中没有需要处理的配置文件")
+        return 1
+    
+    started = time.perf_counter()
+    results = []
+    with profiler.stage('batch'):
+        for result in iter_batch_results(args, tasks):
+            if result['status'] == 'ok':
+                state = '' if result['changed'] else '，内容没有变化'
+                print(f"成功 {result['input']} -> {result['output']} ({result['seconds']:.3f} 秒{state})")
+            else:
+                print(f"失败 {result['input']}: {result['error']}")
+            results.append(result)
+    elapsed = time.perf_counter() - started
+    
+    failed = sum(result['status'] != 'ok' for result in results)
+    changed = sum(result['changed'] for result in results)
+    print(f"批量处理完成: 共 {len(results)} 个文件，成功 {len(results) - failed} 个(内容改变 {changed} 个)，失败 {failed} 个，"
+          f"用时 {elapsed:.3f} 秒 ({len(results) / elapsed:.1f} 个/秒，{min(args.jobs, len(tasks))} 个进程)")
+    
+    if args.batch_report:
+        with open(args.batch_report, 'w', encoding='utf-8') as f:
+            json.dump({'seconds': round(elapsed, 6), 'jobs': min(args.jobs, len(tasks)), 'files': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"处理结果已保存到 {args.batch_report}")
+    return 1 if failed else 0
 
-# 保存修改后的配置
-with open("modified_config.yaml", "w", encoding="utf-8") as f:
-    yaml.dump(modified_config, f, allow_unicode=True, sort_keys=False)
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    trace_memory = not args.profile_no_memory
+    if args.batch:
+        if args.watch or args.probe_report or args.push:
+            print("错误: --batch 不能与 --watch、--probe-report 或 --push 一起使用")
+            return 1
+        return profiler.wrap(lambda: run_batch(args), args.profile, args.profile_report, trace_memory)()
+    
+    def rebuild_and_push():
+        rebuild(args)
+        if args.push:
+            with profiler.stage('push'):
+                controller.push_and_report(args.output_file, args.controller, args.controller_secret)
+    
+    run = profiler.wrap(rebuild_and_push, args.profile, args.profile_report, trace_memory)
+    if args.watch:
+        watch.watch([args.input_file], run, args.watch_interval)
+    else:
+        run()
+    return 0
 
-print("配置文件处理完成，已保存为 modified_config.yaml")
+if __name__ == "__main__":
+    sys.exit(main())
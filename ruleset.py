@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""规则集(rule-providers)的本地化工具
+
+prefetch: 读取Clash配置中的rule-providers，并发下载所有http类型的规则集到各自的path，
+使用ETag/Last-Modified条件请求，未变化的规则集不重复下载。预取后可以保持http类型
+(Clash启动时直接使用已存在的文件)，也可以把规则集改写为file类型，完全不依赖启动时的网络。
+
+compile: 按rules中的顺序把已缓存的domain规则集载入反转标签的后缀树，删除被前面的规则
+或同一规则集中更宽的后缀覆盖、永远不会命中的条目，输出精简后的规则集文件和统计报告。
+
+aggregate: 把已缓存的ipcidr规则集转换为整数区间，排序后合并相邻和嵌套的网段，
+输出覆盖范围完全相同的最少前缀集合(IPv4和IPv6分别处理)。
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import atomic_write
+import serializer
+import subscription
+
+DEFAULT_CONFIG = 'modified_config.yaml'
+DEFAULT_JOBS = 8
+
+# status取值: fetched 已下载新内容, unchanged 服务器确认未变化(304),
+# stale 下载失败但本地已有上次下载的文件, failed 下载失败且没有本地文件
+PrefetchResult = namedtuple('PrefetchResult', ['name', 'path', 'status', 'size', 'error'])
+
+def provider_file_path(provider, base_dir):
+    """返回规则集文件的本地路径，相对路径以base_dir(Clash的工作目录)为基准"""
+    return os.path.normpath(os.path.join(base_dir, provider['path']))
+
+def _meta_path(path):
+    return path + '.meta.json'
+
+def _load_meta(path):
+    """读取上次下载保存的ETag/Last-Modified，文件本身不存在时视为没有缓存"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(_meta_path(path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def prefetch_provider(name, provider, base_dir, pool):
+    """下载单个规则集到本地文件"""
+    path = provider_file_path(provider, base_dir)
+    try:
+        status, headers, body = subscription.conditional_get(provider['url'], pool, _load_meta(path))
+        if status == 304:
+            # 更新修改时间，http类型的规则集在interval内不会被Clash重新下载
+            os.utime(path)
+            return PrefetchResult(name, path, 'unchanged', os.path.getsize(path), None)
+        if status != 200:
+            raise OSError(f"HTTP {status}")
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # 先写临时文件再替换，避免Clash读到写了一半的规则集
+        if not atomic_write.write_if_changed(path, body):
+            # 内容相同时文件不替换，与304一样更新修改时间
+            os.utime(path)
+        meta = {
+            'url': provider['url'],
+            'etag': headers.get('ETag'),
+            'last-modified': headers.get('Last-Modified'),
+        }
+        atomic_write.write_if_changed(_meta_path(path), json.dumps(meta, ensure_ascii=False))
+        return PrefetchResult(name, path, 'fetched', len(body), None)
+    except Exception as e:
+        # 保留上次下载的文件，Clash和--to-file继续使用它
+        if os.path.isfile(path):
+            return PrefetchResult(name, path, 'stale', os.path.getsize(path), str(e))
+        return PrefetchResult(name, path, 'failed', 0, str(e))
+
+def prefetch_rule_providers(rule_providers, base_dir='.', jobs=DEFAULT_JOBS, timeout=subscription.DEFAULT_TIMEOUT):
+    """并发下载所有http类型的规则集，按配置顺序返回PrefetchResult列表"""
+    targets = [(name, provider) for name, provider in rule_providers.items()
+               if provider.get('type') == 'http' and provider.get('url') and provider.get('path')]
+    if not targets:
+        return []
+
+    pool = subscription.ConnectionPool(timeout)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(targets)))) as executor:
+            return list(executor.map(lambda item: prefetch_provider(*item, base_dir, pool), targets))
+    finally:
+        pool.close()
+
+def localize_rule_providers(rule_providers, names):
+    """把已预取的http规则集改写为file类型，保留其余字段的顺序"""
+    localized = {}
+    for name, provider in rule_providers.items():
+        if name in names and provider.get('type') == 'http':
+            provider = {key: ('file' if key == 'type' else value)
+                        for key, value in provider.items() if key not in ('url', 'interval')}
+        localized[name] = provider
+    return localized
+
+# 域名条目的匹配方式: example.com / +.example.com / .example.com / *.example.com
+EXACT = 1
+PLUS = 2
+DOT = 4
+STAR = 8
+
+# 同一规则集内先处理更宽的条目，使其能覆盖后面更具体的条目
+_KIND_ORDER = {PLUS: 0, DOT: 1, STAR: 2, EXACT: 3}
+
+def parse_domain_entry(entry):
+    """解析domain规则集条目，返回(匹配方式, 域名)，无法安全分析的条目返回(None, None)"""
+    entry = entry.strip().lower().rstrip('.')
+    if entry.startswith('+.'):
+        kind, domain = PLUS, entry[2:]
+    elif entry.startswith('*.'):
+        kind, domain = STAR, entry[2:]
+    elif entry.startswith('.'):
+        kind, domain = DOT, entry[1:]
+    else:
+        kind, domain = EXACT, entry
+    # 中间带通配符或为空的条目不参与精简
+    if not domain or '*' in domain or '+' in domain:
+        return None, None
+    return kind, domain
+
+class DomainTrie:
+    """以反转的域名标签为路径的后缀树，节点记录该域名上的匹配方式"""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, kind, domain):
+        node = self.root
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        # 标签不会是None，用None作为匹配方式的键
+        node[None] = node.get(None, 0) | kind
+
+    def covers(self, kind, domain):
+        """判断树中已有的条目是否完全覆盖(kind, domain)能匹配的所有域名"""
+        labels = domain.split('.')[::-1]
+        node = self.root
+        for depth, label in enumerate(labels):
+            flags = node.get(None, 0)
+            # 祖先的 +. 或 . 覆盖该域名及其所有子域
+            if flags & (PLUS | DOT):
+                return True
+            # 父域的 *. 覆盖这一层的精确域名
+            if depth == len(labels) - 1 and flags & STAR and kind == EXACT:
+                return True
+            node = node.get(label)
+            if node is None:
+                return False
+
+        flags = node.get(None, 0)
+        if kind == EXACT:
+            return bool(flags & (EXACT | PLUS))
+        if kind == PLUS:
+            return bool(flags & PLUS) or (bool(flags & EXACT) and bool(flags & DOT))
+        if kind == DOT:
+            return bool(flags & (PLUS | DOT))
+        return bool(flags & (PLUS | DOT | STAR))
+
+def load_provider_payload(path, fmt='yaml'):
+    """读取规则集文件中的条目列表"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if fmt == 'text':
+            return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+        data = serializer.load(f) or {}
+    return [str(entry) for entry in data.get('payload') or []]
+
+def write_provider_payload(path, entries, fmt='yaml'):
+    """写入规则集文件"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if fmt == 'text':
+        data = ''.join(entry + '\n' for entry in entries)
+    else:
+        data = serializer.dump({'payload': entries})
+    atomic_write.write_if_changed(path, data.encode('utf-8'))
+
+def _insert_classical_domains(trie, entries):
+    """classical规则集和rules中的DOMAIN/DOMAIN-SUFFIX规则会先于后面的规则命中"""
+    for entry in entries:
+        parts = [part.strip() for part in entry.split(',')]
+        if len(parts) < 2:
+            continue
+        if parts[0] == 'DOMAIN-SUFFIX':
+            trie.insert(PLUS, parts[1].lower())
+        elif parts[0] == 'DOMAIN':
+            trie.insert(EXACT, parts[1].lower())
+
+def minimize_domain_entries(entries, shadow):
+    """精简一个domain规则集，返回(保留的条目, 被前面规则覆盖数, 集合内冗余数)
+
+    shadow中是前面所有规则的条目；处理完后本规则集的条目也会加入shadow，供后面的规则集使用。
+    """
+    parsed = [parse_domain_entry(entry) for entry in entries]
+    order = sorted(
+        (index for index, (kind, _) in enumerate(parsed) if kind is not None),
+        key=lambda index: (parsed[index][1].count('.'), _KIND_ORDER[parsed[index][0]]),
+    )
+
+    current = DomainTrie()
+    keep = [kind is None for kind, _ in parsed]
+    shadowed = redundant = 0
+    for index in order:
+        kind, domain = parsed[index]
+        if shadow.covers(kind, domain):
+            shadowed += 1
+        elif current.covers(kind, domain):
+            redundant += 1
+        else:
+            keep[index] = True
+            current.insert(kind, domain)
+
+    kept = [entry for entry, flag in zip(entries, keep) if flag]
+    for kind, domain in parsed:
+        if kind is not None:
+            shadow.insert(kind, domain)
+    return kept, shadowed, redundant
+
+def compile_domain_rule_sets(config, base_dir='.', output_dir='ruleset/compiled'):
+    """按rules顺序精简config中已缓存的domain规则集
+
+    返回{规则集名称: 统计信息}，统计信息中的output为精简后文件的路径。
+    """
+    rule_providers = config.get('rule-providers') or {}
+    shadow = DomainTrie()
+    report = {}
+    for rule in config.get('rules') or []:
+        parts = [part.strip() for part in rule.split(',')]
+        if parts[0] == 'MATCH':
+            break
+        if parts[0] in ('DOMAIN', 'DOMAIN-SUFFIX'):
+            _insert_classical_domains(shadow, [rule])
+            continue
+        if parts[0] != 'RULE-SET' or len(parts) < 2:
+            continue
+
+        name = parts[1]
+        provider = rule_providers.get(name)
+        # 同一规则集被多次引用时，以第一次出现的位置为准
+        if not provider or name in report or provider.get('behavior') not in ('domain', 'classical'):
+            continue
+        path = provider_file_path(provider, base_dir)
+        fmt = provider.get('format', 'yaml')
+        try:
+            entries = load_provider_payload(path, fmt)
+        except (OSError, ValueError) as e:
+            print(f"跳过规则集 {name}: {e}")
+            continue
+
+        if provider['behavior'] == 'classical':
+            _insert_classical_domains(shadow, entries)
+            continue
+
+        kept, shadowed, redundant = minimize_domain_entries(entries, shadow)
+        output = os.path.join(base_dir, output_dir, f"{name}.{'txt' if fmt == 'text' else 'yaml'}")
+        write_provider_payload(output, kept, fmt)
+        report[name] = {
+            'before': len(entries),
+            'after': len(kept),
+            'shadowed': shadowed,
+            'redundant': redundant,
+            'output': output,
+        }
+    return report
+
+def use_compiled_rule_sets(rule_providers, report, base_dir='.'):
+    """把rule-providers中已精简的规则集改写为指向精简文件的file类型"""
+    compiled = {}
+    for name, provider in rule_providers.items():
+        if name in report:
+            path = os.path.relpath(report[name]['output'], base_dir).replace(os.sep, '/')
+            provider = {key: value for key, value in provider.items() if key not in ('url', 'interval')}
+            provider['type'] = 'file'
+            provider['path'] = './' + path
+        compiled[name] = provider
+    return compiled
+
+def print_compile_report(report):
+    """打印精简统计表"""
+    print(f"{'规则集':<16}{'原条目':>10}{'精简后':>10}{'被覆盖':>10}{'冗余':>10}")
+    total_before = total_after = 0
+    for name, stats in report.items():
+        total_before += stats['before']
+        total_after += stats['after']
+        print(f"{name:<16}{stats['before']:>10}{stats['after']:>10}{stats['shadowed']:>10}{stats['redundant']:>10}")
+    saved = total_before - total_after
+    ratio = saved / total_before * 100 if total_before else 0
+    print(f"合计: {total_before} -> {total_after}，减少 {saved} 条 ({ratio:.1f}%)")
+
+def _write_config(config, output_file):
+    """原子写入--to-file改写后的配置，返回内容是否改变"""
+    writer = atomic_write.AtomicWriter(output_file)
+    with writer as f:
+        serializer.dump(config, f)
+    return writer.changed
+
+def _print_saved(message, output_file, changed):
+    if changed:
+        print(f"{message}，保存到 {output_file}")
+    else:
+        print(f"{message}，内容没有变化，{output_file} 保持不变")
+
+def run_compile(args):
+    """compile子命令"""
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = serializer.load(f)
+    base_dir = args.base_dir or os.path.dirname(os.path.abspath(args.config))
+
+    report = compile_domain_rule_sets(config, base_dir, args.output_dir)
+    print_compile_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"统计报告已保存到 {args.report}")
+
+    if args.to_file:
+        config['rule-providers'] = use_compiled_rule_sets(config.get('rule-providers') or {}, report, base_dir)
+        output_file = args.output or args.config
+        changed = _write_config(config, output_file)
+        _print_saved(f"已将 {len(report)} 个规则集改写为精简后的file类型", output_file, changed)
+    return 0
+
+# 各IP版本的(地址族, 地址位数)
+_IP_FAMILIES = {4: (socket.AF_INET, 32), 6: (socket.AF_INET6, 128)}
+
+def parse_cidr(entry):
+    """把CIDR条目解析为(IP版本, 起始地址, 结束地址)整数区间，无法解析时返回None"""
+    address, _, prefix = entry.strip().partition('/')
+    version = 6 if ':' in address else 4
+    family, bits = _IP_FAMILIES[version]
+    try:
+        start = int.from_bytes(socket.inet_pton(family, address), 'big')
+        prefix = int(prefix) if prefix else bits
+    except (OSError, ValueError):
+        return None
+    if not 0 <= prefix <= bits:
+        return None
+    # 与Clash一致，忽略主机位
+    host_mask = (1 << (bits - prefix)) - 1
+    start &= ~host_mask
+    return version, start, start | host_mask
+
+def merge_ranges(ranges):
+    """合并已排序区间中重叠和相邻的部分"""
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+def range_to_cidrs(start, end, version):
+    """把连续地址区间拆分为最少的CIDR前缀"""
+    family, bits = _IP_FAMILIES[version]
+    cidrs = []
+    while start <= end:
+        # 起始地址对齐允许的最大块，再缩小到不超过区间末尾
+        size = start & -start if start else 1 << bits
+        while size > end - start + 1:
+            size >>= 1
+        prefix = bits - size.bit_length() + 1
+        address = socket.inet_ntop(family, start.to_bytes(bits // 8, 'big'))
+        cidrs.append(f"{address}/{prefix}")
+        start += size
+    return cidrs
+
+def aggregate_cidrs(entries):
+    """把CIDR条目聚合为覆盖范围相同的最少前缀，IPv4在前、IPv6在后，无法解析的条目原样保留在最后"""
+    ranges = {4: [], 6: []}
+    invalid = []
+    for entry in entries:
+        parsed = parse_cidr(entry)
+        if parsed is None:
+            invalid.append(entry)
+            continue
+        version, start, end = parsed
+        ranges[version].append((start, end))
+
+    aggregated = []
+    for version in (4, 6):
+        ranges[version].sort()
+        for start, end in merge_ranges(ranges[version]):
+            aggregated.extend(range_to_cidrs(start, end, version))
+    return aggregated + invalid
+
+def aggregate_ipcidr_rule_sets(config, base_dir='.', output_dir='ruleset/compiled'):
+    """聚合config中所有已缓存的ipcidr规则集，返回{规则集名称: 统计信息}"""
+    report = {}
+    for name, provider in (config.get('rule-providers') or {}).items():
+        if provider.get('behavior') != 'ipcidr' or not provider.get('path'):
+            continue
+        fmt = provider.get('format', 'yaml')
+        try:
+            entries = load_provider_payload(provider_file_path(provider, base_dir), fmt)
+        except (OSError, ValueError) as e:
+            print(f"跳过规则集 {name}: {e}")
+            continue
+
+        started = time.perf_counter()
+        aggregated = aggregate_cidrs(entries)
+        elapsed = time.perf_counter() - started
+        output = os.path.join(base_dir, output_dir, f"{name}.{'txt' if fmt == 'text' else 'yaml'}")
+        write_provider_payload(output, aggregated, fmt)
+        report[name] = {
+            'before': len(entries),
+            'after': len(aggregated),
+            'seconds': round(elapsed, 4),
+            'output': output,
+        }
+    return report
+
+def run_aggregate(args):
+    """aggregate子命令"""
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = serializer.load(f)
+    base_dir = args.base_dir or os.path.dirname(os.path.abspath(args.config))
+
+    report = aggregate_ipcidr_rule_sets(config, base_dir, args.output_dir)
+    print(f"{'规则集':<16}{'原前缀':>10}{'聚合后':>10}{'耗时(秒)':>12}")
+    for name, stats in report.items():
+        print(f"{name:<16}{stats['before']:>10}{stats['after']:>10}{stats['seconds']:>12.4f}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"统计报告已保存到 {args.report}")
+
+    if args.to_file:
+        config['rule-providers'] = use_compiled_rule_sets(config.get('rule-providers') or {}, report, base_dir)
+        output_file = args.output or args.config
+        changed = _write_config(config, output_file)
+        _print_saved(f"已将 {len(report)} 个规则集改写为聚合后的file类型", output_file, changed)
+    return 0
+
+def run_prefetch(args):
+    """prefetch子命令"""
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = serializer.load(f)
+    rule_providers = config.get('rule-providers') or {}
+    base_dir = args.base_dir or os.path.dirname(os.path.abspath(args.config))
+
+    results = prefetch_rule_providers(rule_providers, base_dir, jobs=args.jobs, timeout=args.timeout)
+    status_text = {'fetched': '已更新', 'unchanged': '未变化', 'stale': '下载失败，使用本地文件', 'failed': '下载失败'}
+    for result in results:
+        message = f"规则集 {result.name}: {status_text[result.status]}"
+        if result.error:
+            message += f" ({result.error})"
+        else:
+            message += f" ({result.size / 1024:.1f} KB)"
+        print(message)
+    failed = [result for result in results if result.status == 'failed']
+    print(f"预取完成: 共 {len(results)} 个规则集，失败 {len(failed)} 个")
+
+    if args.to_file:
+        ready = {result.name for result in results if result.status != 'failed'}
+        config['rule-providers'] = localize_rule_providers(rule_providers, ready)
+        output_file = args.output or args.config
+        changed = _write_config(config, output_file)
+        _print_saved(f"已将 {len(ready)} 个规则集改写为file类型", output_file, changed)
+    return 1 if failed else 0
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='Clash规则集(rule-providers)本地化工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    prefetch = subparsers.add_parser('prefetch', help='并发下载配置中的http规则集到本地path')
+    prefetch.add_argument('-c', '--config', default=DEFAULT_CONFIG,
+                          help=f'Clash配置文件 (默认: {DEFAULT_CONFIG})')
+    prefetch.add_argument('--base-dir',
+                          help='规则集相对路径的基准目录，即Clash的工作目录 (默认: 配置文件所在目录)')
+    prefetch.add_argument('-j', '--jobs', type=int, default=DEFAULT_JOBS,
+                          help=f'并发下载数 (默认: {DEFAULT_JOBS})')
+    prefetch.add_argument('--timeout', type=float, default=subscription.DEFAULT_TIMEOUT,
+                          help=f'单个请求的超时秒数 (默认: {subscription.DEFAULT_TIMEOUT})')
+    prefetch.add_argument('--to-file', action='store_true',
+                          help='把预取成功的规则集改写为file类型，不再依赖启动时下载')
+    prefetch.add_argument('-o', '--output',
+                          help='--to-file时改写后的配置保存位置 (默认: 覆盖原配置文件)')
+    prefetch.set_defaults(handler=run_prefetch)
+
+    compile_parser = subparsers.add_parser('compile', help='精简已缓存的domain规则集，删除永远不会命中的条目')
+    compile_parser.add_argument('-c', '--config', default=DEFAULT_CONFIG,
+                                help=f'Clash配置文件 (默认: {DEFAULT_CONFIG})')
+    compile_parser.add_argument('--base-dir',
+                                help='规则集相对路径的基准目录，即Clash的工作目录 (默认: 配置文件所在目录)')
+    compile_parser.add_argument('--output-dir', default='ruleset/compiled',
+                                help='精简后规则集的输出目录，相对于base-dir (默认: ruleset/compiled)')
+    compile_parser.add_argument('--report', help='把统计报告以JSON格式保存到指定文件')
+    compile_parser.add_argument('--to-file', action='store_true',
+                                help='把精简过的规则集改写为指向精简文件的file类型')
+    compile_parser.add_argument('-o', '--output',
+                                help='--to-file时改写后的配置保存位置 (默认: 覆盖原配置文件)')
+    compile_parser.set_defaults(handler=run_compile)
+
+    aggregate = subparsers.add_parser('aggregate', help='聚合已缓存的ipcidr规则集为最少的等价前缀')
+    aggregate.add_argument('-c', '--config', default=DEFAULT_CONFIG,
+                           help=f'Clash配置文件 (默认: {DEFAULT_CONFIG})')
+    aggregate.add_argument('--base-dir',
+                           help='规则集相对路径的基准目录，即Clash的工作目录 (默认: 配置文件所在目录)')
+    aggregate.add_argument('--output-dir', default='ruleset/compiled',
+                           help='聚合后规则集的输出目录，相对于base-dir (默认: ruleset/compiled)')
+    aggregate.add_argument('--report', help='把统计报告以JSON格式保存到指定文件')
+    aggregate.add_argument('--to-file', action='store_true',
+                           help='把聚合过的规则集改写为指向聚合文件的file类型')
+    aggregate.add_argument('-o', '--output',
+                           help='--to-file时改写后的配置保存位置 (默认: 覆盖原配置文件)')
+    aggregate.set_defaults(handler=run_aggregate)
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    try:
+        return args.handler(args)
+    except FileNotFoundError as e:
+        print(f"错误: 找不到文件 '{e.filename}'")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
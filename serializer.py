@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+
+"""Clash配置文件的序列化层
+
+两个脚本共用的YAML读写入口。libyaml可用时使用C实现(CSafeLoader/CSafeDumper)，
+否则回退到纯Python实现，两种后端生成的文件内容完全一致。
+可以通过环境变量 CLASH_YAML_BACKEND=pure-python 强制使用纯Python实现。
+
+dump_json用标准库的C实现输出JSON。JSON是合法的YAML，Clash和yaml/json库加载JSON都比块状YAML快，
+适合只给程序读取的配置。
+
+proxy_model的CompactProxy和FrozenList按普通映射和列表输出，不生成锚点，结果与dict/list相同。
+
+dump_sections按顶层键分段序列化，内容固定的段(DNS、规则集等)按内容哈希缓存渲染结果，
+每次只序列化变化的部分。块状顶层映射的各个键互不影响，拼接结果与整体序列化逐字节一致。
+set_fragment_cache指定目录后渲染结果同时保存在磁盘上，下次运行的进程也可以复用。
+
+dump_streaming在此基础上把proxies等大列表分批序列化，逐批写入文件。PyYAML整体序列化时
+先为整个文档建立节点图，内存占用是数据本身的数倍；分批后只保留一批的节点图，内存不随节点数增长。
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections.abc import Mapping
+from itertools import islice
+
+import atomic_write
+import proxy_model
+
+C_BACKEND = 'libyaml'
+PURE_BACKEND = 'pure-python'
+
+# libyaml对可打印字符的判断与纯Python实现不同，即使在allow_unicode下也会把
+# BMP以外的字符(如国旗emoji)和NEL、BOM等字符转义。序列化前检查数据中的字符串，
+# 含有这些字符(以及需要转义的反斜杠)时直接使用纯Python实现，保证与原有输出逐字节一致，
+# 不需要先用libyaml生成一次再丢弃
+_LIBYAML_UNSAFE = re.compile(r'[^\n\x20-\x5b\x5d-\x7e\xa0-\ud7ff\ue000-\ufefe\uff00-\ufffd]')
+
+# 缓存的渲染结果数量上限，内存中超过时全部丢弃，磁盘上超过时删除最久未使用的文件
+MAX_CACHED_FRAGMENTS = 64
+
+# dump_streaming每批序列化的列表元素数
+STREAM_CHUNK_SIZE = 256
+
+_backend = None
+_loader = None
+_dumper = None
+_pure_dumper = None
+_last_dump_backend = None
+_fragments = {}
+_fragment_dir = None
+
+def _compact_dumper(base):
+    """base的子类，CompactProxy/FrozenList按普通映射和列表输出
+
+    共享的嵌套对象不能生成锚点，否则输出与dict不同。
+    """
+    class Dumper(base):
+        def ignore_aliases(self, data):
+            if isinstance(data, (proxy_model.CompactProxy, proxy_model.FrozenList)):
+                return True
+            return super().ignore_aliases(data)
+
+    Dumper.add_representer(proxy_model.CompactProxy, lambda dumper, data: dumper.represent_dict(data))
+    Dumper.add_representer(proxy_model.FrozenList, lambda dumper, data: dumper.represent_list(data))
+    return Dumper
+
+def configure(backend=None):
+    """选择序列化后端，backend为None时自动选择，返回实际使用的后端名称"""
+    global _backend, _loader, _dumper, _pure_dumper
+    # 依赖由调用脚本负责安装，这里延迟导入
+    import yaml
+
+    backend = backend or os.environ.get('CLASH_YAML_BACKEND') or C_BACKEND
+    _pure_dumper = _compact_dumper(yaml.SafeDumper)
+    if backend == C_BACKEND and getattr(yaml, '__with_libyaml__', False):
+        _loader, _dumper = yaml.CSafeLoader, _compact_dumper(yaml.CSafeDumper)
+    else:
+        backend = PURE_BACKEND
+        _loader, _dumper = yaml.SafeLoader, _pure_dumper
+    _backend = backend
+    return _backend
+
+def backend_name():
+    """返回当前使用的后端名称"""
+    if _backend is None:
+        configure()
+    return _backend
+
+def last_dump_backend():
+    """返回最近一次dump实际使用的后端名称"""
+    return _last_dump_backend
+
+def load(stream):
+    """解析YAML文档，stream可以是字符串或文件对象"""
+    import yaml
+
+    if _backend is None:
+        configure()
+    return yaml.load(stream, Loader=_loader)
+
+def _needs_pure_backend(data):
+    """data的键或值中是否有libyaml与纯Python实现输出不同的字符"""
+    seen = set()
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            if _LIBYAML_UNSAFE.search(item):
+                return True
+        elif isinstance(item, (Mapping, list, tuple)):
+            # 别名加载后是共享对象，甚至可能引用自身，每个容器只检查一次
+            if id(item) in seen:
+                continue
+            seen.add(id(item))
+            if isinstance(item, Mapping):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            else:
+                stack.extend(item)
+    return False
+
+def dump(data, stream=None, **options):
+    """序列化为YAML，stream为None时返回字符串"""
+    global _last_dump_backend
+    import yaml
+
+    if _backend is None:
+        configure()
+    options.setdefault('allow_unicode', True)
+    options.setdefault('sort_keys', False)
+
+    if _backend == C_BACKEND and not _needs_pure_backend(data):
+        text = yaml.dump(data, Dumper=_dumper, **options)
+        _last_dump_backend = C_BACKEND
+    else:
+        text = yaml.dump(data, Dumper=_pure_dumper, **options)
+        _last_dump_backend = PURE_BACKEND
+
+    if stream is None:
+        return text
+    stream.write(text)
+
+def _json_default(value):
+    """CompactProxy转换为dict，FrozenList是tuple，JSON编码器直接输出为数组"""
+    if isinstance(value, proxy_model.CompactProxy):
+        return dict(value.items())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dump_json(data, stream=None, compact=False):
+    """序列化为JSON，compact为True时不缩进、不加空格，stream为None时返回字符串"""
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_json_default) + '\n'
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2, default=_json_default) + '\n'
+    if stream is None:
+        return text
+    stream.write(text)
+
+def set_fragment_cache(directory):
+    """渲染结果另外保存在directory中，供之后的进程复用；directory为None时只在进程内缓存"""
+    global _fragment_dir
+    _fragment_dir = directory
+
+def _fragment_hash(key, value):
+    """段内容的哈希，JSON保留键顺序并区分True/1，无法编码时返回None
+
+    哈希包含PyYAML的版本，升级后磁盘上的旧渲染结果不再使用。
+    """
+    import yaml
+
+    try:
+        data = json.dumps([yaml.__version__, key, value], ensure_ascii=False, allow_nan=False)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def _fragment_backend(value):
+    """渲染value时dump会使用的后端"""
+    if backend_name() == C_BACKEND and not _needs_pure_backend(value):
+        return C_BACKEND
+    return PURE_BACKEND
+
+def _load_fragment(digest, value):
+    """从磁盘读取渲染结果，不存在或无法读取时返回None"""
+    path = os.path.join(_fragment_dir, digest + '.yaml')
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+        # 更新修改时间，清理时保留最近使用的文件
+        os.utime(path)
+    except OSError:
+        return None
+    return text, _fragment_backend(value)
+
+def _save_fragment(digest, text):
+    """把渲染结果保存到磁盘，文件数超过MAX_CACHED_FRAGMENTS时删除最久未使用的文件"""
+    try:
+        os.makedirs(_fragment_dir, exist_ok=True)
+        atomic_write.write_if_changed(os.path.join(_fragment_dir, digest + '.yaml'), text.encode('utf-8'))
+        paths = [entry.path for entry in os.scandir(_fragment_dir)
+                 if entry.is_file() and entry.name.endswith('.yaml')]
+        if len(paths) > MAX_CACHED_FRAGMENTS:
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - MAX_CACHED_FRAGMENTS]:
+                os.remove(path)
+    except OSError:
+        # 缓存只影响速度，写入失败时下次重新渲染
+        pass
+
+def _render_fragment(key, value):
+    """渲染顶层键key所在的段，按内容哈希缓存，返回(文本, 使用的后端)"""
+    digest = _fragment_hash(key, value)
+    cached = _fragments.get(digest) if digest else None
+    if cached is not None:
+        return cached
+    fragment = _load_fragment(digest, value) if digest and _fragment_dir else None
+    if fragment is None:
+        text = dump({key: value})
+        fragment = text, _last_dump_backend
+        if digest and _fragment_dir:
+            _save_fragment(digest, text)
+    if digest:
+        if len(_fragments) >= MAX_CACHED_FRAGMENTS:
+            _fragments.clear()
+        _fragments[digest] = fragment
+    return fragment
+
+def dump_sections(data, stream=None, cached_keys=()):
+    """按顶层键分段序列化，结果与dump(data)相同，stream为None时返回字符串
+
+    cached_keys中的段复用按内容哈希缓存的渲染结果，其余相邻的键合并在一次dump中序列化。
+    各段之间共享对象(如模板文件中的YAML别名)时整体序列化会生成锚点，分段的结果不再相同，
+    此时退回整体序列化。
+    """
+    global _last_dump_backend
+
+    if not data or not cached_keys:
+        return dump(data, stream)
+
+    # 把顶层键分成缓存段和连续的未缓存键
+    segments = []
+    for key, value in data.items():
+        if key in cached_keys:
+            segments.append((key, value))
+        elif segments and isinstance(segments[-1], dict):
+            segments[-1][key] = value
+        else:
+            segments.append({key: value})
+    # 输入文件中的YAML别名加载后就是共享对象。同一段内的共享对象也算在内: 整体序列化时锚点
+    # 按出现顺序编号，单独序列化一段时编号不同；内容哈希也不区分对象是否共享，这样的段不能缓存
+    if _has_shared_objects(data):
+        return dump(data, stream)
+
+    parts = []
+    backends = set()
+    for segment in segments:
+        if isinstance(segment, dict):
+            parts.append(dump(segment))
+            backends.add(_last_dump_backend)
+        else:
+            text, backend = _render_fragment(*segment)
+            parts.append(text)
+            backends.add(backend)
+    # 与整体序列化一致: 任何一段需要纯Python实现时整体都会使用纯Python实现
+    _last_dump_backend = PURE_BACKEND if PURE_BACKEND in backends else C_BACKEND
+
+    text = ''.join(parts)
+    if stream is None:
+        return text
+    stream.write(text)
+
+def _has_shared_objects(value):
+    """value中是否有被引用多次的dict或list，整体序列化时它们会生成锚点"""
+    ids = set()
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (dict, list)):
+            if id(item) in ids:
+                return True
+            ids.add(id(item))
+            stack.extend(item.values() if isinstance(item, dict) else item)
+    return False
+
+def dump_streaming(data, stream, key='proxies', cached_keys=(), chunk_size=STREAM_CHUNK_SIZE):
+    """序列化到stream，顶层键key的列表分批序列化并逐批写入，结果与dump(data)相同
+
+    data[key]可以是任意可迭代对象(如生成器)，此时由调用方保证各元素之间以及与其他段不共享对象；
+    为列表时会检查共享对象，有共享时退回整体序列化。其他顶层键按dump_sections的方式序列化。
+    """
+    global _last_dump_backend
+
+    items = data.get(key) if data else None
+    if items is None or isinstance(items, dict) or (isinstance(items, list) and _has_shared_objects(data)):
+        dump_sections(data, stream, cached_keys)
+        return
+
+    keys = list(data)
+    position = keys.index(key)
+    backends = set()
+    head = {name: data[name] for name in keys[:position]}
+    if head:
+        dump_sections(head, stream, cached_keys)
+        backends.add(_last_dump_backend)
+
+    iterator = iter(items)
+    chunk = list(islice(iterator, chunk_size))
+    if not chunk:
+        stream.write(dump({key: []}))
+        backends.add(_last_dump_backend)
+    else:
+        # 块状顶层映射中的列表不缩进，与单独序列化的列表逐行相同，只需写出键所在的行
+        stream.write(dump({key: [None]}).split('\n', 1)[0] + '\n')
+        while chunk:
+            stream.write(dump(chunk))
+            backends.add(_last_dump_backend)
+            chunk = list(islice(iterator, chunk_size))
+
+    tail = {name: data[name] for name in keys[position + 1:]}
+    if tail:
+        dump_sections(tail, stream, cached_keys)
+        backends.add(_last_dump_backend)
+    _last_dump_backend = PURE_BACKEND if PURE_BACKEND in backends else C_BACKEND
+
+def describe_backend():
+    """返回用于日志输出的后端说明"""
+    description = f"读取 {backend_name()}"
+    if _last_dump_backend:
+        description += f", 写入 {_last_dump_backend}"
+    return description
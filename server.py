@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""HTTP转换服务
+
+常驻进程提供两个接口，省去每次请求启动解释器和导入PyYAML的开销:
+    POST /convert  请求体为vmess链接文本，返回生成的Clash配置
+    POST /rebuild  请求体为Clash配置，返回rebuild_yaml优化后的配置
+    GET  /stats    返回响应缓存的命中统计(JSON)
+
+响应按输入内容寻址缓存: 接口、查询参数、模板和请求体的sha256作为缓存键和ETag，
+相同输入直接返回缓存内容；请求带If-None-Match且与ETag相同时不做任何计算，直接返回304。
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import clash_template
+import group_filter
+import rebuild_yaml
+import serializer
+import vmess_to_yaml
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_CACHE_ENTRIES = 256
+DEFAULT_CACHE_MB = 256
+MAX_BODY_BYTES = 64 * 1024 * 1024
+CONTENT_TYPE = 'text/yaml; charset=utf-8'
+
+# 每个接口接受的查询参数及取值，None表示不限制取值
+ENDPOINT_OPTIONS = {
+    '/convert': {
+        'dedupe': ('name', 'fingerprint'),
+        'rename': ('suffix', 'skip'),
+        'expand-filters': ('list', 'regex'),
+    },
+    '/rebuild': {
+        'expand-filters': ('list', 'regex'),
+    },
+}
+
+class RequestError(Exception):
+    """请求本身有问题，返回4xx状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ResponseCache:
+    """线程安全的LRU缓存，同时限制条目数和响应总字节数"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data
+            self._size += len(data)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+def parse_options(path, query):
+    """校验并规范化查询参数，返回按名称排序的字典"""
+    allowed = ENDPOINT_OPTIONS[path]
+    options = {}
+    for name, values in parse_qs(query).items():
+        if name not in allowed:
+            raise RequestError(400, f"不支持的参数: {name}")
+        value = values[-1]
+        if allowed[name] is not None and value not in allowed[name]:
+            raise RequestError(400, f"参数 {name} 的取值必须是 {'/'.join(allowed[name])}")
+        options[name] = value
+    return dict(sorted(options.items()))
+
+class ConversionService:
+    """复用两个脚本的转换逻辑，结果按输入哈希缓存"""
+
+    def __init__(self, template=None, cache=None):
+        # 每次转换都会修改配置，使用模板时先深拷贝
+        self.template = template
+        self.cache = cache or ResponseCache()
+        template_text = serializer.dump(template) if template is not None else ''
+        self._template_hash = hashlib.sha256(template_text.encode('utf-8')).hexdigest()
+        self._devnull = open(os.devnull, 'w')
+
+    def etag(self, path, options, body):
+        """输入内容的哈希，同时作为缓存键和ETag"""
+        digest = hashlib.sha256()
+        digest.update(path.encode('utf-8') + b'\0')
+        digest.update(json.dumps(options, sort_keys=True).encode('utf-8') + b'\0')
+        digest.update(self._template_hash.encode('ascii') + b'\0')
+        digest.update(body)
+        return f'"{digest.hexdigest()}"'
+
+    def convert(self, text, options):
+        proxies = vmess_to_yaml.process_vmess_links(text, log_file=self._devnull)
+        if not proxies:
+            raise RequestError(400, "未找到有效的代理链接")
+        config = copy.deepcopy(self.template) if self.template is not None else None
+        config = vmess_to_yaml.build_clash_config(proxies, config,
+                                                  dedupe=options.get('dedupe', 'name'),
+                                                  rename=options.get('rename', 'suffix'),
+                                                  expand_filters=options.get('expand-filters'),
+                                                  log_file=self._devnull)
+        return serializer.dump_sections(config, cached_keys=clash_template.STATIC_SECTION_KEYS)
+
+    def rebuild(self, text, options):
+        try:
+            original_config = serializer.load(text)
+        except Exception as e:
+            raise RequestError(400, f"无法解析配置: {e}")
+        if not isinstance(original_config, dict):
+            raise RequestError(400, "配置必须是YAML映射")
+        if not original_config.get('proxies') and not original_config.get('proxy-providers'):
+            raise RequestError(400, "配置文件中未找到任何代理")
+        config = rebuild_yaml.process_config(original_config)
+        if options.get('expand-filters'):
+            group_filter.expand_group_filters(config, options['expand-filters'])
+        return serializer.dump_sections(config, cached_keys=clash_template.STATIC_SECTION_KEYS)
+
+    def handle(self, path, options, body, if_none_match=None):
+        """返回(状态码, ETag, 响应内容, 是否命中缓存)，304时响应内容为空"""
+        etag = self.etag(path, options, body)
+        if if_none_match and etag in (tag.strip() for tag in if_none_match.split(',')):
+            return 304, etag, b'', True
+        data = self.cache.get(etag)
+        if data is not None:
+            return 200, etag, data, True
+
+        try:
+            text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            raise RequestError(400, "请求体必须是UTF-8文本")
+        if path == '/convert':
+            data = self.convert(text, options).encode('utf-8')
+        else:
+            data = self.rebuild(text, options).encode('utf-8')
+        self.cache.put(etag, data)
+        return 200, etag, data, False
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    # 保持连接，客户端可以在同一连接上连续发送请求
+    protocol_version = 'HTTP/1.1'
+    server_version = 'rebuild-yaml-for-clash'
+    service = None
+    access_log = False
+
+    def _send(self, status, data=b'', content_type='text/plain; charset=utf-8', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if data and self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        if status in (411, 413):
+            # 请求体没有读取，连接上的后续数据无法解析
+            self.close_connection = True
+        self._send(status, (message + '\n').encode('utf-8'))
+
+    def _read_body(self):
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(411, "缺少Content-Length")
+        try:
+            length = int(length)
+        except ValueError:
+            raise RequestError(400, "Content-Length无效")
+        if length < 0 or length > MAX_BODY_BYTES:
+            raise RequestError(413, f"请求体不能超过 {MAX_BODY_BYTES} 字节")
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/stats':
+            data = json.dumps(self.service.cache.stats()).encode('utf-8')
+            self._send(200, data, 'application/json')
+            return
+        self._send_error(404, "未知的接口")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in ENDPOINT_OPTIONS:
+            self._send_error(404, "未知的接口")
+            return
+        try:
+            body = self._read_body()
+            options = parse_options(url.path, url.query)
+            status, etag, data, cached = self.service.handle(url.path, options, body,
+                                                             self.headers.get('If-None-Match'))
+        except RequestError as e:
+            self._send_error(e.status, str(e))
+            return
+        except Exception as e:
+            self._send_error(500, f"转换失败: {e}")
+            return
+        self._send(status, data, CONTENT_TYPE, {
+            'ETag': etag,
+            'Cache-Control': 'no-cache',
+            'X-Cache': 'HIT' if cached else 'MISS',
+        })
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, service=None, access_log=False):
+    """创建多线程HTTP服务器，port为0时由系统分配端口"""
+    handler = type('BoundConversionHandler', (ConversionHandler,), {
+        'service': service or ConversionService(),
+        'access_log': access_log,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='vmess链接转换和配置优化的HTTP服务')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'监听地址 (默认: {DEFAULT_HOST})')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help=f'监听端口 (默认: {DEFAULT_PORT})')
+    parser.add_argument('--template',
+                        help='/convert使用的模板配置，相当于vmess_to_yaml.py读取的modified_config.yaml (默认: 内置基本配置)')
+    parser.add_argument('--cache-entries', type=int, default=DEFAULT_CACHE_ENTRIES,
+                        help=f'响应缓存的最大条目数 (默认: {DEFAULT_CACHE_ENTRIES})')
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_MB,
+                        help=f'响应缓存的最大总大小(MB) (默认: {DEFAULT_CACHE_MB})')
+    parser.add_argument('--access-log', action='store_true', help='把每个请求记录到标准错误')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    template = None
+    if args.template:
+        try:
+            with open(args.template, 'r', encoding='utf-8') as f:
+                template = serializer.load(f)
+        except FileNotFoundError:
+            print(f"错误: 找不到文件 '{args.template}'")
+            return 1
+
+    cache = ResponseCache(max(1, args.cache_entries), int(args.cache_mb * 1024 * 1024))
+    server = make_server(args.host, args.port, ConversionService(template, cache), args.access_log)
+    host, port = server.server_address[:2]
+    print(f"转换服务已启动: http://{host}:{port} (POST /convert, POST /rebuild, GET /stats)，按Ctrl+C退出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
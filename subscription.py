@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""订阅地址的并发下载与本地HTTP缓存
+
+多个订阅地址并发下载，同一主机复用连接。响应的ETag/Last-Modified和内容保存在缓存目录中，
+再次下载时发送条件请求，服务器返回304时直接使用缓存内容，几乎不消耗流量。
+"""
+
+import base64
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import ssl
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_CACHE_DIR = '.subscription_cache'
+DEFAULT_TIMEOUT = 30
+DEFAULT_JOBS = 8
+MAX_REDIRECTS = 5
+USER_AGENT = 'rebuild-yaml-for-clash'
+
+# status取值: fetched 已下载新内容, unchanged 服务器确认未变化(304),
+# stale 下载失败但使用了旧缓存, failed 下载失败且没有缓存
+FetchResult = namedtuple('FetchResult', ['url', 'text', 'status', 'error'])
+
+def is_url(value):
+    """判断参数是否为http(s)订阅地址"""
+    return isinstance(value, str) and value.lower().startswith(('http://', 'https://'))
+
+class ConnectionPool:
+    """按(协议, 主机, 端口)复用HTTP连接，可在多个线程间共享"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        return conn, False
+
+    def _release(self, key, conn):
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    def request(self, url, headers):
+        """发送GET请求，返回(状态码, 响应头, 响应体)"""
+        parts = urlsplit(url)
+        key = (parts.scheme.lower(), parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            conn, reused = self._acquire(key)
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                # 复用的空闲连接可能已被服务器关闭，换新连接重试
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            return response.status, response.headers, body
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            for connections in self._idle.values():
+                for conn in connections:
+                    conn.close()
+            self._idle.clear()
+
+def decode_subscription(body):
+    """解码订阅内容，兼容明文链接列表和整体base64编码的订阅"""
+    text = body.decode('utf-8', errors='replace').strip()
+    if '://' in text:
+        return text
+
+    compact = ''.join(text.split())
+    compact += '=' * (-len(compact) % 4)
+    for decode in (base64.b64decode, base64.urlsafe_b64decode):
+        try:
+            return decode(compact).decode('utf-8')
+        except (ValueError, UnicodeDecodeError):
+            continue
+    return text
+
+class SubscriptionCache:
+    """订阅缓存目录: 每个地址对应一个元数据文件和一个内容文件"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, url, suffix):
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.cache_dir, digest + suffix)
+
+    def load(self, url):
+        """返回(元数据, 内容)，没有缓存时返回(None, None)"""
+        try:
+            with open(self._path(url, '.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._path(url, '.body'), 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def load_output_state(self, output_file):
+        """返回上次从订阅生成output_file时记录的状态，没有记录时返回None"""
+        try:
+            with open(self._path('output:' + os.path.abspath(output_file), '.output.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_output_state(self, output_file, state):
+        """记录生成output_file时的选项哈希和输出内容的哈希"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._path('output:' + os.path.abspath(output_file), '.output.json'), 'w', encoding='utf-8') as f:
+            json.dump(dict(state, output=os.path.abspath(output_file)), f, ensure_ascii=False)
+
+    def save(self, url, headers, body):
+        """保存内容和用于条件请求的响应头"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last-modified': headers.get('Last-Modified'),
+        }
+        # 先写内容再写元数据，中途失败时不会留下指向旧内容的校验信息
+        with open(self._path(url, '.body'), 'wb') as f:
+            f.write(body)
+        with open(self._path(url, '.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+def conditional_get(url, pool, meta=None):
+    """发送条件GET请求，跟随重定向并解压gzip，返回(状态码, 响应头, 响应体)
+
+    meta为上次保存的{'etag', 'last-modified'}，内容未变化时返回304和空响应体。
+    """
+    headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip'}
+    if meta:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last-modified'):
+            headers['If-Modified-Since'] = meta['last-modified']
+
+    location = url
+    for _ in range(MAX_REDIRECTS + 1):
+        status, response_headers, body = pool.request(location, headers)
+        if status in (301, 302, 303, 307, 308) and response_headers.get('Location'):
+            location = urljoin(location, response_headers['Location'])
+            continue
+        break
+
+    if status == 200 and response_headers.get('Content-Encoding', '').lower() == 'gzip':
+        body = gzip.decompress(body)
+    return status, response_headers, body
+
+def fetch_subscription(url, pool, cache=None):
+    """下载单个订阅，cache为None时不使用缓存"""
+    meta, cached_body = cache.load(url) if cache else (None, None)
+    try:
+        status, response_headers, body = conditional_get(url, pool, meta if cached_body is not None else None)
+        if status == 304 and cached_body is not None:
+            return FetchResult(url, decode_subscription(cached_body), 'unchanged', None)
+        if status != 200:
+            raise OSError(f"HTTP {status}")
+
+        if cache:
+            cache.save(url, response_headers, body)
+        return FetchResult(url, decode_subscription(body), 'fetched', None)
+    except Exception as e:
+        if cached_body is not None:
+            return FetchResult(url, decode_subscription(cached_body), 'stale', str(e))
+        return FetchResult(url, '', 'failed', str(e))
+
+def fetch_subscriptions(urls, cache_dir=DEFAULT_CACHE_DIR, jobs=DEFAULT_JOBS, timeout=DEFAULT_TIMEOUT):
+    """并发下载多个订阅，按输入顺序返回FetchResult列表；cache_dir为None时不使用缓存"""
+    cache = SubscriptionCache(cache_dir) if cache_dir else None
+    pool = ConnectionPool(timeout)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(urls) or 1))) as executor:
+            return list(executor.map(lambda url: fetch_subscription(url, pool, cache), urls))
+    finally:
+        pool.close()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""测试直接导入仓库根目录下的模块；http_server fixture供需要本地HTTP服务器的测试共用"""
+
+import os
+import sys
+import threading
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# path已去掉查询参数并解码，body为请求体的原始字节
+Request = namedtuple('Request', ['method', 'path', 'headers', 'body'])
+
+def _handler_class(routes):
+    """routes为{(方法, 路径): 处理函数}，路径为'*'的条目匹配该方法的其他路径
+
+    处理函数接收Request，返回(状态码, 响应体bytes, [(响应头, 值)])。
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def handle_request(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            request = Request(self.command, unquote(urlsplit(self.path).path), self.headers,
+                              self.rfile.read(length) if length else b'')
+            route = routes.get((request.method, request.path)) or routes.get((request.method, '*'))
+            status, body, headers = route(request) if route else (404, b'', ())
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_PUT = do_PATCH = do_POST = handle_request
+
+    return Handler
+
+@pytest.fixture
+def http_server():
+    """启动本地HTTP服务器的工厂: http_server(routes)返回服务器地址http://127.0.0.1:端口"""
+    servers = []
+
+    def start(routes):
+        httpd = ThreadingHTTPServer(('127.0.0.1', 0), _handler_class(routes))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f'http://127.0.0.1:{httpd.server_address[1]}'
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
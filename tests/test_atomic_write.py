@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import atomic_write
+
+def test_unchanged_content_keeps_file(tmp_path):
+    path = str(tmp_path / 'config.yaml')
+    assert atomic_write.write_if_changed(path, 'a: 1\n') is True
+    os.utime(path, (0, 0))
+
+    assert atomic_write.write_if_changed(path, 'a: 1\n') is False
+    assert os.stat(path).st_mtime == 0
+    assert atomic_write.write_if_changed(path, 'a: 2\n') is True
+    assert os.listdir(tmp_path) == ['config.yaml']
+
+def test_error_leaves_original(tmp_path):
+    path = str(tmp_path / 'config.yaml')
+    atomic_write.write_if_changed(path, 'a: 1\n')
+    with pytest.raises(RuntimeError):
+        with atomic_write.AtomicWriter(path) as f:
+            f.write('a: 2\n')
+            raise RuntimeError
+    with open(path, 'r', encoding='utf-8') as f:
+        assert f.read() == 'a: 1\n'
+    assert os.listdir(tmp_path) == ['config.yaml']
+
+@pytest.mark.skipif(os.name != 'posix', reason='需要POSIX权限')
+def test_file_mode(tmp_path):
+    path = str(tmp_path / 'config.yaml')
+    umask = os.umask(0o027)
+    try:
+        atomic_write.write_if_changed(path, 'a: 1\n')
+    finally:
+        os.umask(umask)
+    assert os.stat(path).st_mode & 0o777 == 0o640
+
+    # 已有文件保持原来的权限
+    os.chmod(path, 0o600)
+    atomic_write.write_if_changed(path, 'a: 2\n')
+    assert os.stat(path).st_mode & 0o777 == 0o600
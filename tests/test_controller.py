@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from urllib.parse import urlsplit
+
+import pytest
+
+import controller
+import proxy_providers
+import serializer
+
+RULE_TYPES = {'DOMAIN-SUFFIX': 'DomainSuffix', 'GEOIP': 'GeoIP', 'MATCH': 'Match'}
+
+class FakeClash:
+    """模拟Clash的external-controller: 按推送的配置回答GET请求，记录所有修改请求"""
+
+    def __init__(self, home):
+        self.home = home
+        self.config = {}
+        self.providers = {}
+        self.requests = []
+
+    def load_provider(self, name):
+        path = os.path.join(self.home, self.config['proxy-providers'][name]['path'])
+        with open(path, 'r', encoding='utf-8') as f:
+            proxies = serializer.load(f)['proxies']
+        self.providers[name] = [{'name': proxy['name'], 'type': proxy['type']} for proxy in proxies]
+
+    def reload(self, text):
+        self.config = serializer.load(text)
+        self.providers = {}
+        for name in self.config.get('proxy-providers') or {}:
+            self.load_provider(name)
+
+    def snapshot(self, path):
+        config = self.config
+        if path == '/configs':
+            return {key: config.get(key) for key in ('mixed-port', 'mode', 'log-level')}
+        if path == '/proxies':
+            proxies = {'DIRECT': {'type': 'Direct'}, 'GLOBAL': {'type': 'Selector', 'all': []}}
+            proxies.update({proxy['name']: {'type': proxy['type']} for proxy in config.get('proxies') or []})
+            for members in self.providers.values():
+                proxies.update({member['name']: member for member in members})
+            proxies.update({group['name']: {'type': group['type'], 'all': []} for group in config.get('proxy-groups') or []})
+            return {'proxies': proxies}
+        if path == '/providers/proxies':
+            providers = {name: {'vehicleType': 'File', 'proxies': members} for name, members in self.providers.items()}
+            providers['default'] = {'vehicleType': 'Compatible', 'proxies': []}
+            return {'providers': providers}
+        if path == '/providers/rules':
+            return {'providers': {name: {} for name in config.get('rule-providers') or {}}}
+        if path == '/rules':
+            rules = []
+            for rule in config.get('rules') or []:
+                fields = rule.split(',')
+                if fields[0] == 'MATCH':
+                    rules.append({'type': 'Match', 'payload': '', 'proxy': fields[1]})
+                else:
+                    rules.append({'type': RULE_TYPES[fields[0]], 'payload': fields[1], 'proxy': fields[2]})
+            return {'rules': rules}
+        return None
+
+    def routes(self):
+        def reply(status, body=None):
+            return status, b'' if body is None else json.dumps(body).encode('utf-8'), ()
+
+        def get(request):
+            body = self.snapshot(request.path)
+            return reply(404 if body is None else 200, body)
+
+        def put(request):
+            self.requests.append(('PUT', request.path))
+            if request.path == '/configs':
+                self.reload(json.loads(request.body)['payload'])
+            else:
+                self.load_provider(request.path.rsplit('/', 1)[1])
+            return reply(204)
+
+        def patch(request):
+            self.requests.append(('PATCH', request.path))
+            self.config.update(json.loads(request.body))
+            return reply(204)
+
+        return {('GET', '*'): get, ('PUT', '*'): put, ('PATCH', '/configs'): patch}
+
+@pytest.fixture
+def clash(tmp_path, http_server):
+    fake = FakeClash(str(tmp_path))
+    fake.address = urlsplit(http_server(fake.routes())).netloc
+    return fake
+
+def node(name):
+    return {'name': name, 'type': 'vmess', 'server': f'{name}.example.com', 'port': 443,
+            'uuid': '00000000-0000-0000-0000-000000000000', 'alterId': 0, 'cipher': 'auto'}
+
+def write_config(directory, shards):
+    """写入分片文件和引用它们的主配置，返回主配置路径"""
+    results, _ = proxy_providers.write_shards(shards, base_dir=directory)
+    config = {
+        'mixed-port': 7890,
+        'mode': 'rule',
+        'log-level': 'info',
+        'proxies': [],
+        'proxy-groups': [{'name': '自动选择', 'type': 'url-test', 'include-all': True}],
+        'rules': ['DOMAIN-SUFFIX,example.com,自动选择', 'MATCH,DIRECT'],
+    }
+    proxy_providers.apply_providers(config, results)
+    path = os.path.join(directory, 'config.yaml')
+    with open(path, 'w', encoding='utf-8') as f:
+        serializer.dump(config, f)
+    return path
+
+def test_push_reloads_once_then_refreshes_changed_shards(tmp_path, clash):
+    config_file = write_config(str(tmp_path), {'a': [node('a1'), node('a2')], 'b': [node('b1')]})
+
+    # 第一次推送没有记录，完整重新加载
+    plan = controller.push_config(config_file, clash.address)
+    assert plan['reload']
+    assert clash.requests == [('PUT', '/configs')]
+
+    # 内容相同时不发送任何修改请求
+    plan = controller.push_config(config_file, clash.address)
+    assert plan == {'reload': None, 'patch': {}, 'refresh': []}
+    assert clash.requests == [('PUT', '/configs')]
+
+    # 只有分片b变化时只刷新该提供者
+    write_config(str(tmp_path), {'a': [node('a1'), node('a2')], 'b': [node('b1'), node('b2')]})
+    plan = controller.push_config(config_file, clash.address)
+    assert plan == {'reload': None, 'patch': {}, 'refresh': ['b']}
+    assert clash.requests == [('PUT', '/configs'), ('PUT', '/providers/proxies/b')]
+    assert [member['name'] for member in clash.providers['b']] == ['b1', 'b2']
+
+def test_patch_general_settings(tmp_path, clash):
+    config_file = write_config(str(tmp_path), {'a': [node('a1')]})
+    controller.push_config(config_file, clash.address)
+
+    with open(config_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    with open(config_file, 'w', encoding='utf-8') as f:
+        f.write(text.replace('log-level: info', 'log-level: debug'))
+    plan = controller.push_config(config_file, clash.address)
+
+    assert plan == {'reload': None, 'patch': {'log-level': 'debug'}, 'refresh': []}
+    assert clash.requests == [('PUT', '/configs'), ('PATCH', '/configs')]
+
+def test_dry_run_sends_nothing(tmp_path, clash):
+    config_file = write_config(str(tmp_path), {'a': [node('a1')]})
+    plan = controller.push_config(config_file, clash.address, dry_run=True)
+
+    assert plan['reload']
+    assert clash.requests == []
+    assert not os.path.exists(controller.state_path(config_file))
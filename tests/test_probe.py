@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+import pytest
+
+import probe
+
+@pytest.fixture
+def open_port():
+    """本地监听中的TCP端口，连接进入backlog即算可达"""
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(16)
+        yield listener.getsockname()[1]
+
+@pytest.fixture
+def closed_port():
+    """刚释放、没有监听的端口，连接会被拒绝"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def make_config(open_port, closed_port):
+    proxies = [
+        {'name': 'dead', 'type': 'vmess', 'server': '127.0.0.1', 'port': closed_port},
+        {'name': 'alive', 'type': 'vmess', 'server': '127.0.0.1', 'port': open_port},
+        {'name': 'udp', 'type': 'hysteria2', 'server': '127.0.0.1', 'port': closed_port},
+        {'name': 'no-port', 'type': 'ss', 'server': '127.0.0.1'},
+    ]
+    groups = [{'name': '手动选择', 'type': 'select', 'proxies': ['dead', 'alive', 'udp', 'no-port']}]
+    return {'proxies': proxies, 'proxy-groups': groups}
+
+def test_probe_proxies(open_port, closed_port):
+    config = make_config(open_port, closed_port)
+    results = {result.name: result for result in probe.probe_proxies(config['proxies'], timeout=2)}
+
+    assert results['alive'].reachable is True
+    assert results['alive'].latency is not None
+    assert results['dead'].reachable is False
+    assert results['dead'].error
+    assert results['no-port'].reachable is False
+    # hysteria2基于UDP，不做TCP探测
+    assert results['udp'].reachable is None
+    assert results['udp'].latency is None
+
+def test_drop_keeps_udp_nodes(open_port, closed_port):
+    config = make_config(open_port, closed_port)
+    results = probe.probe_proxies(config['proxies'], timeout=2)
+    dead_names = probe.apply_probe_results(config, results, 'drop')
+
+    assert dead_names == ['dead', 'no-port']
+    assert [proxy['name'] for proxy in config['proxies']] == ['alive', 'udp']
+    assert config['proxy-groups'][0]['proxies'] == ['alive', 'udp']
+
+def test_demote_moves_dead_nodes_last(open_port, closed_port):
+    config = make_config(open_port, closed_port)
+    results = probe.probe_proxies(config['proxies'], timeout=2)
+    dead_names = probe.apply_probe_results(config, results, 'demote')
+
+    assert dead_names == ['dead', 'no-port']
+    assert [proxy['name'] for proxy in config['proxies']] == ['alive', 'udp', 'dead', 'no-port']
+    assert config['proxy-groups'][0]['proxies'] == ['dead', 'alive', 'udp', 'no-port']
+
+def test_same_target_probed_once(open_port, monkeypatch):
+    calls = []
+    original = probe._probe_target
+
+    async def counting_probe(key, *args):
+        calls.append(key)
+        return await original(key, *args)
+
+    monkeypatch.setattr(probe, '_probe_target', counting_probe)
+    proxies = [{'name': f'node{i}', 'type': 'trojan', 'server': '127.0.0.1', 'port': open_port} for i in range(3)]
+    results = probe.probe_proxies(proxies, timeout=2)
+
+    assert len(calls) == 1
+    assert all(result.reachable for result in results)
+
+def test_probe_key_tls():
+    trojan = {'name': 't', 'type': 'trojan', 'server': 'example.com', 'port': 443, 'sni': 'sni.test'}
+    vmess = {'name': 'v', 'type': 'vmess', 'server': 'example.com', 'port': 443}
+    # trojan总是使用TLS，配置中没有tls键
+    assert probe._probe_key(trojan, tls=True) == ('example.com', 443, True, 'sni.test')
+    assert probe._probe_key(trojan, tls=False) == ('example.com', 443, False, None)
+    assert probe._probe_key(vmess, tls=True) == ('example.com', 443, False, None)
+    assert probe._probe_key({**vmess, 'tls': True}, tls=True) == ('example.com', 443, True, 'example.com')
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import proxy_model
+import serializer
+
+def node(name, path='/ws'):
+    return {'name': name, 'type': 'vmess', 'server': 'example.com', 'port': 443, 'tls': True,
+            'network': 'ws', 'ws-opts': {'path': path, 'headers': {'host': 'h'}}, 'alpn': ['h2', 'http/1.1']}
+
+def test_round_trip_keeps_values_types_and_order():
+    plain = node('n1')
+    proxy = proxy_model.compact(plain)
+    restored = proxy_model.to_plain(proxy)
+    assert restored == plain
+    assert list(restored) == list(plain)
+    assert type(restored['alpn']) is list and type(restored['ws-opts']) is dict
+    # 1与True相等，但序列化结果不同，不能被当作同一个值
+    assert repr(restored) == repr(plain)
+    assert proxy_model.compact({**plain, 'tls': 1}) != proxy
+
+def test_nested_options_are_shared():
+    first, second, third = (proxy_model.compact(node(name, path)) for name, path in
+                            [('n1', '/ws'), ('n2', '/ws'), ('n3', '/other')])
+    assert first['ws-opts'] is second['ws-opts']
+    assert first['ws-opts'] is not third['ws-opts']
+    assert first._shape is third._shape
+
+def test_pickle_round_trip():
+    proxy = proxy_model.compact(node('n1'))
+    restored = pickle.loads(pickle.dumps(proxy))
+    assert restored == proxy
+    assert restored['ws-opts'] is proxy['ws-opts']
+
+def test_serialized_like_plain_dicts():
+    plain = {'proxies': [node('n1'), node('n2'), node('n3', '/other')]}
+    compacted = {'proxies': [proxy_model.compact(proxy) for proxy in plain['proxies']]}
+    # 共享的嵌套对象不能输出为锚点
+    assert serializer.dump(compacted) == serializer.dump(plain)
+    assert serializer.dump_json(compacted) == serializer.dump_json(plain)
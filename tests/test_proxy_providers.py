@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import proxy_providers
+import serializer
+
+def node(name):
+    return {'name': name, 'type': 'trojan', 'server': 'example.com', 'port': 443, 'password': 'p'}
+
+def test_write_shards_only_rewrites_changed_files(tmp_path):
+    shards = {'a': [node('a1')], 'b': [node('b1')]}
+    results, removed = proxy_providers.write_shards(shards, base_dir=str(tmp_path))
+    assert [(result.path, result.changed) for result in results] == [
+        ('./providers/a.yaml', True), ('./providers/b.yaml', True)]
+    assert removed == []
+
+    shards['b'].append(node('b2'))
+    results, removed = proxy_providers.write_shards(shards, base_dir=str(tmp_path))
+    assert [result.changed for result in results] == [False, True]
+    with open(tmp_path / 'providers' / 'b.yaml', 'r', encoding='utf-8') as f:
+        assert serializer.load(f) == {'proxies': shards['b']}
+
+def test_write_shards_removes_stale_files(tmp_path):
+    proxy_providers.write_shards({'a': [node('a1')], 'b': [node('b1')]}, base_dir=str(tmp_path))
+
+    results, removed = proxy_providers.write_shards({'a': [node('a1')]}, base_dir=str(tmp_path))
+    assert [result.name for result in results] == ['a']
+    assert removed == ['./providers/b.yaml']
+    assert sorted(os.listdir(tmp_path / 'providers')) == [proxy_providers.MANIFEST_FILENAME, 'a.yaml']
+
+def test_write_shards_keeps_unmanaged_files(tmp_path):
+    (tmp_path / 'original_config.yaml').write_text('proxies: []\n', encoding='utf-8')
+    proxy_providers.write_shards({'a': [node('a1')]}, '.', str(tmp_path))
+
+    results, removed = proxy_providers.write_shards({'b': [node('b1')]}, '.', str(tmp_path))
+    assert removed == ['./a.yaml']
+    assert sorted(os.listdir(tmp_path)) == [proxy_providers.MANIFEST_FILENAME, 'b.yaml', 'original_config.yaml']
+
+def test_apply_providers_replaces_managed_entries(tmp_path):
+    config = {'proxy-providers': {
+        'remote': {'type': 'http', 'url': 'https://example.com/sub', 'path': './remote.yaml'},
+        'old': {'type': 'file', 'path': './providers/old.yaml'},
+    }}
+    results, _ = proxy_providers.write_shards({'a': [node('a1')]}, base_dir=str(tmp_path))
+    proxy_providers.apply_providers(config, results)
+    assert list(config['proxy-providers']) == ['remote', 'a']
+    assert config['proxy-providers']['a']['path'] == './providers/a.yaml'
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import copy
+
+import clash_template
+import group_filter
+import probe
+import rebuild_yaml
+import serializer
+
+def original_config():
+    names = ['🇯🇵 日本 01', '🇺🇸 美国 01', 'dead']
+    return {'mixed-port': 7890,
+            'proxies': [{'name': name, 'type': 'trojan', 'server': 'example.com', 'port': 443, 'password': 'p'}
+                        for name in names]}
+
+def test_profiles_share_template_sections_without_modifying_them():
+    snapshot = copy.deepcopy(clash_template.static_sections())
+    first = rebuild_yaml.process_config(original_config())
+    assert first['proxy-groups'] is clash_template.PROXY_GROUPS
+    expected = serializer.dump(first)
+
+    # 展开filter和删除不可达节点只替换这个配置的代理组
+    for mode in ('list', 'regex'):
+        config = rebuild_yaml.process_config(original_config())
+        assert group_filter.expand_group_filters(config, mode)
+        results = [probe.ProbeResult(proxy['name'], None, None, proxy['name'] != 'dead', None, None)
+                   for proxy in config['proxies']]
+        probe.apply_probe_results(config, results, 'drop')
+        assert config['proxy-groups'] is not clash_template.PROXY_GROUPS
+
+    assert clash_template.static_sections() == snapshot
+    assert serializer.dump(rebuild_yaml.process_config(original_config())) == expected
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+import ipaddress
+import os
+
+import pytest
+
+import ruleset
+import serializer
+
+PAYLOAD = b'payload:\n  - +.example.com\n'
+
+class RuleServer:
+    """本地规则集服务器，支持ETag条件请求，记录收到的请求"""
+
+    def __init__(self):
+        self.body = PAYLOAD
+        self.etag = '"r1"'
+        self.fail = False
+        self.requests = []
+
+    def get(self, request):
+        self.requests.append((request.path, request.headers.get('If-None-Match')))
+        if self.fail:
+            return 503, b'unavailable', ()
+        if request.headers.get('If-None-Match') == self.etag:
+            return 304, b'', ()
+        return 200, self.body, [('ETag', self.etag)]
+
+@pytest.fixture
+def server(http_server):
+    state = RuleServer()
+    state.url = http_server({('GET', '*'): state.get})
+    return state
+
+def rule_providers(url):
+    return {
+        'reject': {'type': 'http', 'behavior': 'domain', 'url': url + '/reject.yaml',
+                   'path': './ruleset/reject.yaml', 'interval': 86400},
+        'local': {'type': 'file', 'behavior': 'domain', 'path': './ruleset/local.yaml'},
+    }
+
+def prefetch(server, base_dir):
+    results = ruleset.prefetch_rule_providers(rule_providers(server.url), str(base_dir), timeout=5)
+    assert [result.name for result in results] == ['reject']
+    return results[0]
+
+def test_prefetch_downloads_and_refetches_conditionally(server, tmp_path):
+    result = prefetch(server, tmp_path)
+    assert result.status == 'fetched'
+    assert result.size == len(PAYLOAD)
+    with open(tmp_path / 'ruleset' / 'reject.yaml', 'rb') as f:
+        assert f.read() == PAYLOAD
+
+    # 第二次带上保存的ETag，服务器返回304
+    result = prefetch(server, tmp_path)
+    assert result.status == 'unchanged'
+    assert server.requests[-1] == ('/reject.yaml', '"r1"')
+
+    # 内容变化后重新下载
+    server.body = PAYLOAD + b'  - +.example.org\n'
+    server.etag = '"r2"'
+    result = prefetch(server, tmp_path)
+    assert result.status == 'fetched'
+    with open(tmp_path / 'ruleset' / 'reject.yaml', 'rb') as f:
+        assert f.read() == server.body
+
+def test_prefetch_without_local_file_sends_plain_request(server, tmp_path):
+    prefetch(server, tmp_path)
+    os.remove(tmp_path / 'ruleset' / 'reject.yaml')
+
+    # 元数据还在但文件被删除，不能发送条件请求
+    result = prefetch(server, tmp_path)
+    assert result.status == 'fetched'
+    assert server.requests[-1] == ('/reject.yaml', None)
+
+def test_prefetch_failure_falls_back_to_local_file(server, tmp_path):
+    prefetch(server, tmp_path)
+    server.fail = True
+
+    result = prefetch(server, tmp_path)
+    assert result.status == 'stale'
+    assert '503' in result.error
+    assert result.size == len(PAYLOAD)
+    with open(tmp_path / 'ruleset' / 'reject.yaml', 'rb') as f:
+        assert f.read() == PAYLOAD
+
+def test_prefetch_failure_without_local_file(server, tmp_path):
+    server.fail = True
+    result = prefetch(server, tmp_path)
+    assert result.status == 'failed'
+    assert not os.path.exists(tmp_path / 'ruleset' / 'reject.yaml')
+
+def test_to_file_keeps_stale_rule_sets(server, tmp_path, capsys):
+    config = tmp_path / 'config.yaml'
+    with open(config, 'w', encoding='utf-8') as f:
+        serializer.dump({'rule-providers': rule_providers(server.url)}, f)
+    assert ruleset.main(['prefetch', '-c', str(config)]) == 0
+
+    server.fail = True
+    output = tmp_path / 'local.yaml'
+    assert ruleset.main(['prefetch', '-c', str(config), '--to-file', '-o', str(output)]) == 0
+    assert '下载失败，使用本地文件' in capsys.readouterr().out
+    with open(output, 'r', encoding='utf-8') as f:
+        providers = serializer.load(f)['rule-providers']
+    assert providers['reject'] == {'type': 'file', 'behavior': 'domain', 'path': './ruleset/reject.yaml'}
+
+def test_to_file_keeps_unchanged_output(server, tmp_path, capsys):
+    config = tmp_path / 'config.yaml'
+    with open(config, 'w', encoding='utf-8') as f:
+        serializer.dump({'rule-providers': rule_providers(server.url)}, f)
+    output = tmp_path / 'local.yaml'
+    argv = ['prefetch', '-c', str(config), '--to-file', '-o', str(output)]
+    assert ruleset.main(argv) == 0
+    mtime = os.stat(output).st_mtime_ns
+
+    # 规则集和改写后的配置都没有变化，输出文件不替换，也不留下临时文件
+    capsys.readouterr()
+    assert ruleset.main(argv) == 0
+    assert f'内容没有变化，{output} 保持不变' in capsys.readouterr().out
+    assert os.stat(output).st_mtime_ns == mtime
+    assert sorted(os.listdir(tmp_path / 'ruleset')) == ['reject.yaml', 'reject.yaml.meta.json']
+
+def domain_matches(entry, host):
+    """按Clash的domain规则集语义判断entry是否匹配host"""
+    kind, domain = ruleset.parse_domain_entry(entry)
+    if kind == ruleset.EXACT:
+        return host == domain
+    if kind == ruleset.PLUS:
+        return host == domain or host.endswith('.' + domain)
+    if kind == ruleset.DOT:
+        return host.endswith('.' + domain)
+    return host.endswith('.' + domain) and host.count('.') == domain.count('.') + 1
+
+def matched_hosts(entries, hosts):
+    return {host for host in hosts if any(domain_matches(entry, host) for entry in entries)}
+
+def candidate_hosts(entries):
+    """条目中的域名本身、一级和两级子域，以及无关域名"""
+    hosts = {'unrelated.test'}
+    for entry in entries:
+        domain = entry.lstrip('+*.')
+        hosts.update([domain, 'x.' + domain, 'x.y.' + domain])
+    return hosts
+
+def test_minimize_keeps_membership():
+    entries = ['a.example.com', '+.example.com', '*.example.com', '.example.com', 'b.a.example.com',
+               'ad*.example.com', '.example.net', 'example.net', '*.example.org', 'example.org']
+    kept, shadowed, redundant = ruleset.minimize_domain_entries(entries, ruleset.DomainTrie())
+    # +.example.com 覆盖同一域名下的其他条目；.example.net 不匹配 example.net 本身
+    assert kept == ['+.example.com', 'ad*.example.com', '.example.net', 'example.net',
+                    '*.example.org', 'example.org']
+    assert (shadowed, redundant) == (0, 4)
+
+    analyzable = [entry for entry in entries if ruleset.parse_domain_entry(entry)[0] is not None]
+    hosts = candidate_hosts(analyzable)
+    assert matched_hosts(analyzable, hosts) == matched_hosts([e for e in kept if e in analyzable], hosts)
+
+def test_compile_respects_domain_and_suffix_rules(tmp_path):
+    entries = ['exact.com', 'sub.exact.com', 'suffix.com', 'a.suffix.com', '+.suffix.com', 'keep.org']
+    (tmp_path / 'ruleset').mkdir()
+    with open(tmp_path / 'ruleset' / 'ads.yaml', 'w', encoding='utf-8') as f:
+        serializer.dump({'payload': entries}, f)
+    config = {
+        'rule-providers': {'ads': {'type': 'file', 'behavior': 'domain', 'path': './ruleset/ads.yaml'}},
+        'rules': ['DOMAIN,exact.com,DIRECT', 'DOMAIN-SUFFIX,suffix.com,DIRECT',
+                  'RULE-SET,ads,REJECT', 'MATCH,Proxy'],
+    }
+
+    report = ruleset.compile_domain_rule_sets(config, str(tmp_path))
+    assert (report['ads']['shadowed'], report['ads']['redundant']) == (4, 0)
+    kept = ruleset.load_provider_payload(report['ads']['output'])
+    # DOMAIN 只覆盖域名本身，子域仍由规则集匹配
+    assert kept == ['sub.exact.com', 'keep.org']
+
+    # 前面的规则加上规则集，匹配的域名集合不变
+    earlier = ['exact.com', '+.suffix.com']
+    hosts = candidate_hosts(entries)
+    assert matched_hosts(earlier + entries, hosts) == matched_hosts(earlier + kept, hosts)
+
+def covered_networks(entries):
+    """条目覆盖的地址集合，按IP版本归并为最少的网段"""
+    networks = {4: [], 6: []}
+    for entry in entries:
+        try:
+            network = ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            continue
+        networks[network.version].append(network)
+    return {version: list(ipaddress.collapse_addresses(items)) for version, items in networks.items()}
+
+@pytest.mark.parametrize('entries, expected', [
+    # 相邻的两个/25合并为/24
+    (['10.0.0.128/25', '10.0.0.0/25'], ['10.0.0.0/24']),
+    # 被包含的前缀被去掉
+    (['192.168.1.0/24', '192.168.0.0/16'], ['192.168.0.0/16']),
+    # IPv4在前、IPv6在后
+    (['2001:db8:8000::/33', '10.0.0.0/8', '2001:db8::/33', '1.2.3.4'],
+     ['1.2.3.4/32', '10.0.0.0/8', '2001:db8::/32']),
+    # 主机位被忽略，无法解析的条目原样保留在最后
+    (['10.0.0.1/24', 'not-a-cidr', '10.0.1.0/24', '10.0.0.0/33'],
+     ['10.0.0.0/23', 'not-a-cidr', '10.0.0.0/33']),
+])
+def test_aggregate_cidrs_keeps_address_set(entries, expected):
+    aggregated = ruleset.aggregate_cidrs(entries)
+    assert aggregated == expected
+    assert covered_networks(aggregated) == covered_networks(entries)
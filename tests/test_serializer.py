@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+
+import clash_template
+import proxy_model
+import serializer
+
+@pytest.fixture(params=[serializer.C_BACKEND, serializer.PURE_BACKEND])
+def backend(request):
+    yield serializer.configure(request.param)
+    serializer.configure()
+
+def node(index):
+    # 部分节点名称含有libyaml会转义的国旗emoji，同一文件中两种后端的批次交替出现
+    name = f"🇯🇵 日本 {index}" if index % 3 == 0 else f"node {index}"
+    return {'name': name, 'type': 'vmess', 'server': f'{index}.example.com', 'port': 443,
+            'network': 'ws', 'ws-opts': {'path': '/ws', 'headers': {'host': 'h'}}}
+
+def config(proxies):
+    return {'mixed-port': 7890, 'proxies': proxies,
+            **clash_template.static_sections(), 'mode': 'rule'}
+
+def streamed(data, **options):
+    stream = io.StringIO()
+    serializer.dump_streaming(data, stream, chunk_size=4, **options)
+    return stream.getvalue()
+
+@pytest.mark.parametrize('count', [0, 1, 4, 9])
+def test_dump_streaming_matches_dump(backend, count):
+    plain = config([node(index) for index in range(count)])
+    expected = serializer.dump(plain)
+    assert streamed(plain) == expected
+    assert streamed(plain, cached_keys=clash_template.STATIC_SECTION_KEYS) == expected
+
+    compacted = {**plain, 'proxies': [proxy_model.compact(proxy) for proxy in plain['proxies']]}
+    assert streamed(compacted) == expected
+    # 生成器输入同样分批写入
+    generated = {**plain, 'proxies': (proxy_model.compact(node(index)) for index in range(count))}
+    assert streamed(generated) == expected
+
+def test_dump_streaming_with_shared_objects(backend):
+    # 输入文件中的YAML别名加载后是共享对象，整体序列化时生成锚点，分批时退回整体序列化
+    opts = {'path': '/ws'}
+    data = {'proxies': [{**node(index), 'ws-opts': opts} for index in range(6)], 'mode': 'rule'}
+    assert '&id001' in serializer.dump(data)
+    assert streamed(data) == serializer.dump(data)
+
+@pytest.mark.parametrize('first', [True, False])
+def test_dump_streaming_key_position(backend, first):
+    proxies = [node(index) for index in range(5)]
+    data = {'proxies': proxies, 'mode': 'rule'} if first else {'mode': 'rule', 'proxies': proxies}
+    assert streamed(data) == serializer.dump(data)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+
+import serializer
+import server
+
+def vmess_link(name, address='1.2.3.4'):
+    data = {'ps': name, 'add': address, 'port': '443', 'id': 'u', 'net': 'ws', 'path': '/p', 'host': 'h'}
+    return 'vmess://' + base64.b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+def test_convert_is_quiet_and_cached(capsys):
+    service = server.ConversionService()
+    # 同名节点会被重命名，filter展开会生成摘要，这些都不能输出到服务的标准输出
+    body = '\n'.join([vmess_link('香港 01'), vmess_link('香港 01'), vmess_link('美国 01', '5.6.7.8')]).encode('utf-8')
+    options = {'dedupe': 'fingerprint', 'expand-filters': 'list'}
+
+    status, etag, data, cached = service.handle('/convert', options, body)
+    assert (status, cached) == (200, False)
+    config = serializer.load(data.decode('utf-8'))
+    assert [proxy['name'] for proxy in config['proxies']] == ['香港 01', '美国 01']
+    assert capsys.readouterr().out == ''
+
+    assert service.handle('/convert', options, body) == (200, etag, data, True)
+    assert service.handle('/convert', options, body, if_none_match=etag)[0] == 304
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import gzip
+import json
+import os
+
+import pytest
+
+import subscription
+import vmess_to_yaml
+
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+def vmess_link(name):
+    data = {'ps': name, 'add': '1.2.3.4', 'port': '443', 'id': 'u', 'net': 'ws', 'path': '/p', 'host': 'h'}
+    return 'vmess://' + base64.b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+class SubscriptionServer:
+    """本地订阅服务器: 支持ETag/Last-Modified条件请求、gzip和重定向，记录收到的请求"""
+
+    def __init__(self):
+        self.body = b''
+        self.etag = '"v1"'
+        self.fail = False
+        self.requests = []
+
+    def set_body(self, text, etag):
+        self.body = base64.b64encode(text.encode('utf-8'))
+        self.etag = etag
+
+    def routes(self):
+        def logged(handler):
+            def route(request):
+                self.requests.append((request.path, request.headers.get('If-None-Match'),
+                                      request.headers.get('If-Modified-Since')))
+                if self.fail:
+                    return 500, b'error', ()
+                return handler(request)
+            return route
+
+        def last_modified(request):
+            if request.headers.get('If-Modified-Since') == LAST_MODIFIED:
+                return 304, b'', ()
+            return 200, self.body, [('Last-Modified', LAST_MODIFIED)]
+
+        def etag(request):
+            if request.headers.get('If-None-Match') == self.etag:
+                return 304, b'', [('ETag', self.etag)]
+            return 200, self.body, [('ETag', self.etag)]
+
+        return {
+            ('GET', '/redirect'): logged(lambda request: (302, b'', [('Location', '/sub')])),
+            ('GET', '/last-modified'): logged(last_modified),
+            ('GET', '/gzip'): logged(lambda request: (200, gzip.compress(self.body), [('Content-Encoding', 'gzip')])),
+            ('GET', '*'): logged(etag),
+        }
+
+@pytest.fixture
+def server(http_server):
+    state = SubscriptionServer()
+    state.url = http_server(state.routes())
+    state.set_body('\n'.join(vmess_link(f'node{i}') for i in range(3)), '"v1"')
+    return state
+
+def test_conditional_get_etag(server):
+    pool = subscription.ConnectionPool(timeout=5)
+    try:
+        status, headers, body = subscription.conditional_get(server.url + '/sub', pool)
+        assert status == 200
+        assert body == server.body
+        meta = {'etag': headers.get('ETag'), 'last-modified': headers.get('Last-Modified')}
+
+        status, _, body = subscription.conditional_get(server.url + '/sub', pool, meta)
+        assert status == 304
+        assert body == b''
+        assert server.requests[-1][1] == '"v1"'
+    finally:
+        pool.close()
+
+def test_conditional_get_last_modified(server):
+    pool = subscription.ConnectionPool(timeout=5)
+    try:
+        status, headers, _ = subscription.conditional_get(server.url + '/last-modified', pool)
+        assert status == 200
+        status, _, _ = subscription.conditional_get(server.url + '/last-modified', pool,
+                                                    {'etag': None, 'last-modified': headers['Last-Modified']})
+        assert status == 304
+        assert server.requests[-1] == ('/last-modified', None, LAST_MODIFIED)
+    finally:
+        pool.close()
+
+def test_conditional_get_redirect_and_gzip(server):
+    pool = subscription.ConnectionPool(timeout=5)
+    try:
+        assert subscription.conditional_get(server.url + '/redirect', pool)[2] == server.body
+        assert subscription.conditional_get(server.url + '/gzip', pool)[2] == server.body
+    finally:
+        pool.close()
+
+def test_fetch_subscriptions_cache(server, tmp_path):
+    url = server.url + '/sub'
+    cache_dir = str(tmp_path / 'cache')
+
+    first, = subscription.fetch_subscriptions([url], cache_dir=cache_dir)
+    assert first.status == 'fetched'
+    assert first.text.count('vmess://') == 3
+
+    second, = subscription.fetch_subscriptions([url], cache_dir=cache_dir)
+    assert second.status == 'unchanged'
+    assert second.text == first.text
+
+    server.fail = True
+    stale, = subscription.fetch_subscriptions([url], cache_dir=cache_dir)
+    assert stale.status == 'stale'
+    assert stale.text == first.text
+
+    failed, = subscription.fetch_subscriptions([url], cache_dir=None)
+    assert failed.status == 'failed'
+
+def run_convert(argv):
+    vmess_to_yaml.run_convert(vmess_to_yaml.parse_args(argv))
+
+def test_unchanged_subscriptions_skip_generation(server, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    argv = ['-u', server.url + '/sub', '-o', 'config.yaml', '--cache-dir', 'cache']
+
+    run_convert(argv)
+    assert os.path.exists('config.yaml')
+    capsys.readouterr()
+
+    # 订阅和选项都没有变化时跳过生成
+    run_convert(argv)
+    assert '所有订阅均未变化' in capsys.readouterr().out
+
+    # 选项改变时即使订阅未变化也重新生成
+    run_convert(argv + ['--format', 'json'])
+    assert '所有订阅均未变化' not in capsys.readouterr().out
+    with open('config.yaml', 'r', encoding='utf-8') as f:
+        assert f.read().startswith('{')
+    run_convert(argv + ['--format', 'json'])
+    assert '所有订阅均未变化' in capsys.readouterr().out
+
+    # 输出文件被修改后重新生成
+    with open('config.yaml', 'a', encoding='utf-8') as f:
+        f.write('\n')
+    run_convert(argv + ['--format', 'json'])
+    assert '所有订阅均未变化' not in capsys.readouterr().out
+
+    # 另一个输出文件没有生成记录
+    run_convert(['-u', server.url + '/sub', '-o', 'other.yaml', '--cache-dir', 'cache'])
+    assert '所有订阅均未变化' not in capsys.readouterr().out
+    assert os.path.exists('other.yaml')
+
+def test_changed_subscription_regenerates(server, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    argv = ['-u', server.url + '/sub', '-o', 'config.yaml', '--cache-dir', 'cache']
+    run_convert(argv)
+
+    server.set_body('\n'.join(vmess_link(f'node{i}') for i in range(5)), '"v2"')
+    run_convert(argv)
+    assert '所有订阅均未变化' not in capsys.readouterr().out
+    with open('config.yaml', 'r', encoding='utf-8') as f:
+        assert 'node4' in f.read()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import copy
+import io
+import json
+import os
+
+import pytest
+
+import serializer
+import vmess_to_yaml
+
+def vmess_link(name, address='1.2.3.4'):
+    data = {'ps': name, 'add': address, 'port': '443', 'id': 'u', 'net': 'ws', 'path': '/p', 'host': 'h'}
+    return 'vmess://' + base64.b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+def convert(text):
+    return vmess_to_yaml.process_vmess_links(text, log_file=io.StringIO())
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return serializer.load(f)
+
+def group(config, name):
+    return next(group for group in config['proxy-groups'] if group['name'] == name)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """generate_clash_config从当前目录读取模板，在空的临时目录中运行"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def test_user_defined_group_survives_normal_run(workdir):
+    template = vmess_to_yaml.build_clash_config(convert(vmess_link('n1')))
+    chatgpt = {'name': 'ChatGPT', 'type': 'select', 'proxies': ['n1', 'DIRECT']}
+    template['proxy-groups'] = [chatgpt if g['name'] == 'ChatGPT' else g for g in template['proxy-groups']]
+    with open(vmess_to_yaml.TEMPLATE_FILE, 'w', encoding='utf-8') as f:
+        serializer.dump(template, f)
+
+    vmess_to_yaml.generate_clash_config(convert(vmess_link('n2', '5.6.7.8')), 'out.yaml')
+    assert group(load('out.yaml'), 'ChatGPT') == chatgpt
+
+def test_inline_proxies_migrate_to_providers(workdir):
+    links = '\n'.join([vmess_link('n1'), vmess_link('n2', '5.6.7.8')])
+    vmess_to_yaml.generate_clash_config(convert(links), vmess_to_yaml.TEMPLATE_FILE)
+    assert len(load(vmess_to_yaml.TEMPLATE_FILE)['proxies']) == 2
+
+    # 上次的内联节点不参与去重，全部写入提供者文件，主配置不再内联
+    vmess_to_yaml.generate_provider_config([('input.txt', convert(links))], 'out.yaml', shard_by='source',
+                                           output_format='yaml')
+    config = load('out.yaml')
+    assert config['proxies'] == []
+    [provider] = config['proxy-providers'].values()
+    names = [proxy['name'] for proxy in load(os.path.join(str(workdir), provider['path']))['proxies']]
+    assert names == ['n1', 'n2']
+
+def test_expanded_groups_are_restored(workdir):
+    links = '\n'.join([vmess_link('🇯🇵 日本 01'), vmess_link('🇭🇰 香港 01', '5.6.7.8')])
+    vmess_to_yaml.generate_clash_config(convert(links), vmess_to_yaml.TEMPLATE_FILE, expand_filters='list')
+    expanded = group(load(vmess_to_yaml.TEMPLATE_FILE), 'ChatGPT')
+    assert 'filter' not in expanded
+    assert expanded['proxies'] == ['🇯🇵 日本 01']
+
+    # 普通运行把上次展开的组恢复为include-all和filter，新节点可以加入
+    vmess_to_yaml.generate_clash_config(convert(vmess_link('🇺🇸 美国 01', '9.9.9.9')), vmess_to_yaml.TEMPLATE_FILE)
+    restored = group(load(vmess_to_yaml.TEMPLATE_FILE), 'ChatGPT')
+    assert restored['include-all'] is True
+    assert restored['filter'] == vmess_to_yaml.clash_template.CHATGPT_FILTER
+    assert 'proxies' not in restored
+
+@pytest.mark.parametrize('dedupe', ['name', 'fingerprint'])
+def test_incremental_output_equals_full_generation(workdir, capsys, dedupe):
+    first = [vmess_link('n1'), vmess_link('n2', '5.6.7.8')]
+    # 新节点、同名的不同节点和连接相同的重复节点
+    second = first + [vmess_link('n3', '9.9.9.9'), vmess_link('n1', '8.8.8.8'), vmess_link('n2 copy', '5.6.7.8')]
+    vmess_to_yaml.generate_clash_config(convert('\n'.join(first)), 'incremental.yaml', incremental=True,
+                                        dedupe=dedupe)
+    vmess_to_yaml.generate_clash_config(convert('\n'.join(second)), 'incremental.yaml', incremental=True,
+                                        dedupe=dedupe)
+    assert '已增量追加' in capsys.readouterr().out
+
+    # 一次完整生成全部节点
+    vmess_to_yaml.generate_clash_config(convert('\n'.join(second)), 'full.yaml', dedupe=dedupe)
+    with open('incremental.yaml', 'rb') as incremental, open('full.yaml', 'rb') as full:
+        assert incremental.read() == full.read()
+
+def test_reconcile_proxy_groups_applies_policies():
+    specs = [
+        {'policy': 'update', 'fields': {'include-all': True}, 'group': {'name': 'A', 'type': 'select'}},
+        {'policy': 'preserve', 'group': {'name': 'B', 'type': 'select', 'proxies': ['DIRECT']}},
+        {'policy': 'update', 'fields': {'include-all': True}, 'group': {'name': 'C', 'type': 'url-test', 'include-all': True}},
+    ]
+    groups = [
+        {'name': 'B', 'type': 'fallback', 'proxies': ['user']},
+        {'name': 'A', 'type': 'select', 'proxies': ['x']},
+        {'name': 'A', 'type': 'select', 'proxies': ['duplicate']},
+    ]
+    result = vmess_to_yaml.reconcile_proxy_groups(groups, specs)
+    assert result is groups
+    # 已有的组按策略更新或保留，同名组只更新第一个，缺少的组按规格顺序追加
+    assert groups == [
+        {'name': 'B', 'type': 'fallback', 'proxies': ['user']},
+        {'name': 'A', 'type': 'select', 'proxies': ['x'], 'include-all': True},
+        {'name': 'A', 'type': 'select', 'proxies': ['duplicate']},
+        {'name': 'C', 'type': 'url-test', 'include-all': True},
+    ]
+    # 追加的组是规格的副本，不与规格共享对象
+    assert groups[3] is not specs[2]['group']
+
+    # 已经协调过的组再次协调保持不变
+    assert vmess_to_yaml.reconcile_proxy_groups(copy.deepcopy(groups), specs) == groups
+
+def test_reconcile_proxy_groups_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        vmess_to_yaml.reconcile_proxy_groups([{'name': 'A'}], [{'policy': 'merge', 'group': {'name': 'A'}}])
+
+def select(links, dedupe, rename='suffix', known=()):
+    """按dedupe规则从links中挑选新节点，返回(新节点名称, 摘要)"""
+    known_names = {proxy['name'] for proxy in known}
+    known_fingerprints = {vmess_to_yaml.proxy_fingerprint(proxy): proxy['name'] for proxy in known}
+    summary = vmess_to_yaml.new_merge_summary()
+    proxies = vmess_to_yaml.select_new_proxies(convert('\n'.join(links)), known_names, known_fingerprints,
+                                               dedupe, rename, summary)
+    return [proxy['name'] for proxy in proxies], summary
+
+def test_fingerprint_merges_duplicates_and_renames_conflicts():
+    links = [vmess_link('a'), vmess_link('a copy'), vmess_link('b', '5.6.7.8'),
+             vmess_link('b', '6.6.6.6'), vmess_link('b', '7.7.7.7')]
+    names, summary = select(links, 'fingerprint')
+    assert names == ['a', 'b', 'b (2)', 'b (3)']
+    assert summary == {'duplicates': [('a copy', 'a')], 'renamed': [('b', 'b (2)'), ('b', 'b (3)')],
+                       'skipped': []}
+
+    names, summary = select(links, 'fingerprint', rename='skip')
+    assert names == ['a', 'b']
+    assert summary['skipped'] == ['b', 'b']
+
+    # 按名称去重时连接相同的节点都保留，同名节点只保留第一个
+    names, summary = select(links, 'name')
+    assert names == ['a', 'a copy', 'b']
+    assert summary['skipped'] == ['b', 'b']
+
+def test_fingerprint_dedupes_against_existing_proxies():
+    known = convert('\n'.join([vmess_link('a'), vmess_link('b', '5.6.7.8'), vmess_link('b (2)', '6.6.6.6')]))
+    names, summary = select([vmess_link('a renamed'), vmess_link('b', '9.9.9.9')], 'fingerprint', known=known)
+    # 重命名跳过已被占用的序号
+    assert names == ['b (3)']
+    assert summary['duplicates'] == [('a renamed', 'a')]
+
+def test_fingerprint_ignores_name_and_case():
+    proxy = convert(vmess_link('a'))[0]
+    other = {**proxy, 'name': 'other', 'server': proxy['server'].upper()}
+    assert vmess_to_yaml.proxy_fingerprint(proxy) == vmess_to_yaml.proxy_fingerprint(other)
+    assert vmess_to_yaml.proxy_fingerprint(proxy) != vmess_to_yaml.proxy_fingerprint({**proxy, 'port': 8443})
+
+def test_vless_reality_grpc():
+    proxy = vmess_to_yaml.vless_to_clash_config(
+        'vless://uuid-1@example.com:443?security=reality&type=grpc&serviceName=svc&sni=sni.test'
+        '&fp=chrome&pbk=KEY&sid=ab&flow=xtls-rprx-vision#%E6%97%A5%E6%9C%AC')
+    assert proxy == {
+        'name': '日本', 'type': 'vless', 'server': 'example.com', 'port': 443, 'uuid': 'uuid-1',
+        'udp': True, 'tls': True, 'skip-cert-verify': True, 'flow': 'xtls-rprx-vision',
+        'network': 'grpc', 'grpc-opts': {'service-name': 'svc'},
+        'servername': 'sni.test', 'client-fingerprint': 'chrome',
+        'reality-opts': {'public-key': 'KEY', 'short-id': 'ab'},
+    }
+
+def test_trojan_ws():
+    proxy = vmess_to_yaml.trojan_to_clash_config('trojan://p%40ss@1.2.3.4:8443?peer=sni.test&type=ws&path=/ws&host=h')
+    assert proxy == {
+        'name': '1.2.3.4:8443', 'type': 'trojan', 'server': '1.2.3.4', 'port': 8443, 'password': 'p@ss',
+        'udp': True, 'skip-cert-verify': True, 'sni': 'sni.test',
+        'network': 'ws', 'ws-opts': {'path': '/ws', 'headers': {'host': 'h'}},
+    }
+
+@pytest.mark.parametrize('link', [
+    # SIP002，用户信息为base64
+    'ss://' + base64.urlsafe_b64encode(b'aes-128-gcm:pass').decode('ascii').rstrip('=') + '@1.2.3.4:8388#n',
+    # SIP002，用户信息为明文
+    'ss://aes-128-gcm:pass@1.2.3.4:8388#n',
+    # 整体base64编码的旧格式
+    'ss://' + base64.b64encode(b'aes-128-gcm:pass@1.2.3.4:8388').decode('ascii') + '#n',
+])
+def test_ss_formats(link):
+    assert vmess_to_yaml.ss_to_clash_config(link) == {
+        'name': 'n', 'type': 'ss', 'server': '1.2.3.4', 'port': 8388,
+        'cipher': 'aes-128-gcm', 'password': 'pass', 'udp': True,
+    }
+
+def test_ss_obfs_plugin():
+    proxy = vmess_to_yaml.ss_to_clash_config(
+        'ss://aes-128-gcm:pass@1.2.3.4:8388/?plugin=obfs-local%3Bobfs%3Dtls%3Bobfs-host%3Dh.test#n')
+    assert proxy['plugin'] == 'obfs'
+    assert proxy['plugin-opts'] == {'mode': 'tls', 'host': 'h.test'}
+    with pytest.raises(ValueError):
+        vmess_to_yaml.ss_to_clash_config('ss://aes-128-gcm:pass@1.2.3.4:8388/?plugin=unknown#n')
+
+def test_hysteria2():
+    proxy = vmess_to_yaml.hysteria2_to_clash_config(
+        'hy2://secret@example.com:443?sni=sni.test&obfs=salamander&obfs-password=o&mport=20000-30000#h')
+    assert proxy == {
+        'name': 'h', 'type': 'hysteria2', 'server': 'example.com', 'port': 443, 'password': 'secret',
+        'skip-cert-verify': True, 'sni': 'sni.test', 'obfs': 'salamander', 'obfs-password': 'o',
+        'ports': '20000-30000',
+    }
+
+def test_scanner_dispatches_mixed_links():
+    text = '\n'.join([
+        vmess_link('v'),
+        'trojan://p@1.2.3.4:443#t <br> hy2://p@5.6.7.8:443#h',
+        'vless://u@9.9.9.9:443#l',
+        'ss://aes-128-gcm:pass@1.2.3.4:8388#s,trojan://p@5.6.7.8:443#t%2C2',
+        'ftp://ignored',
+    ])
+    proxies = convert(text)
+    assert [(proxy['type'], proxy['name']) for proxy in proxies] == [
+        ('vmess', 'v'), ('trojan', 't'), ('hysteria2', 'h'), ('vless', 'l'), ('ss', 's'), ('trojan', 't,2')]
@@ -1,11 +1,31 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
 import base64
+import copy
+import hashlib
+import io
 import json
 import sys
 import re
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import atomic_write
+import clash_template
+import controller
+import group_filter
+import probe
+import profiler
+import proxy_model
+import proxy_providers
+import serializer
+import subscription
+import watch
 
 # 检查并安装必要的依赖
 try:
@@ -47,36 +67,21 @@ def decode_vmess_link(vmess_link):
     except Exception as e:
         raise ValueError(f"解码vmess链接失败: {e}")
 
-def vmess_to_clash_config(vmess_data):
-    """将vmess数据转换为Clash配置格式"""
-    # 基本配置
-    clash_config = {
-        'name': vmess_data.get('ps', 'Unknown'),
-        'type': 'vmess',
-        'server': vmess_data.get('add', ''),
-        'port': int(vmess_data.get('port', 0)),
-        'cipher': vmess_data.get('scy', 'auto'),
-        'uuid': vmess_data.get('id', ''),
-        'alterId': int(vmess_data.get('aid', 0)),
-        'tls': vmess_data.get('tls', '') == 'tls',
-        'skip-cert-verify': True,
-    }
-    
-    # 处理网络类型
-    network = vmess_data.get('net', '')
+def apply_transport(clash_config, network, params):
+    """按传输方式写入network和对应的*-opts，params中的path/host与vmess链接的字段含义相同"""
     if network:
         clash_config['network'] = network
     
     # 处理ws配置
     if network == 'ws':
         ws_opts = {
-            'path': vmess_data.get('path', '/')
+            'path': params.get('path', '/')
         }
         
         # 添加headers如果存在
-        if vmess_data.get('host'):
+        if params.get('host'):
             ws_opts['headers'] = {
-                'host': vmess_data.get('host')
+                'host': params.get('host')
             }
         
         clash_config['ws-opts'] = ws_opts
@@ -84,25 +89,25 @@ def vmess_to_clash_config(vmess_data):
     # 处理h2配置
     elif network == 'h2':
         h2_opts = {
-            'path': vmess_data.get('path', '/')
+            'path': params.get('path', '/')
         }
         
         # 添加host如果存在
-        if vmess_data.get('host'):
-            h2_opts['host'] = [vmess_data.get('host')]
+        if params.get('host'):
+            h2_opts['host'] = [params.get('host')]
         
         clash_config['h2-opts'] = h2_opts
     
     # 处理http配置
     elif network == 'http':
         http_opts = {
-            'path': [vmess_data.get('path', '/')]
+            'path': [params.get('path', '/')]
         }
         
         # 添加headers如果存在
-        if vmess_data.get('host'):
+        if params.get('host'):
             http_opts['headers'] = {
-                'host': [vmess_data.get('host')]
+                'host': [params.get('host')]
             }
         
         clash_config['http-opts'] = http_opts
@@ -110,9 +115,27 @@ def vmess_to_clash_config(vmess_data):
     # 处理grpc配置
     elif network == 'grpc':
         grpc_opts = {
-            'service-name': vmess_data.get('path', '')
+            'service-name': params.get('path', '')
         }
         clash_config['grpc-opts'] = grpc_opts
+
+def vmess_to_clash_config(vmess_data):
+    """将vmess数据转换为Clash配置格式"""
+    # 基本配置
+    clash_config = {
+        'name': vmess_data.get('ps', 'Unknown'),
+        'type': 'vmess',
+        'server': vmess_data.get('add', ''),
+        'port': int(vmess_data.get('port', 0)),
+        'cipher': vmess_data.get('scy', 'auto'),
+        'uuid': vmess_data.get('id', ''),
+        'alterId': int(vmess_data.get('aid', 0)),
+        'tls': vmess_data.get('tls', '') == 'tls',
+        'skip-cert-verify': True,
+    }
+    
+    # 处理网络类型
+    apply_transport(clash_config, vmess_data.get('net', ''), vmess_data)
     
     # 处理TLS相关配置
     if clash_config['tls']:
@@ -124,118 +147,566 @@ def vmess_to_clash_config(vmess_data):
     
     return clash_config
 
-def process_vmess_links(input_text):
-    """处理多行vmess链接文本"""
-    # 使用正则表达式匹配vmess链接
-    vmess_links = re.findall(r'vmess://[A-Za-z0-9+/=]+', input_text)
+def _split_uri(link):
+    """拆分标准格式的代理URI，返回(用户信息, 服务器, 端口, 查询参数, 节点名称)"""
+    parts = urlsplit(link)
+    try:
+        port = parts.port
+    except ValueError as e:
+        raise ValueError(f"端口无效: {e}")
+    if not parts.hostname or port is None:
+        raise ValueError("缺少服务器地址或端口")
+    query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    name = unquote(parts.fragment) or f"{parts.hostname}:{port}"
+    # 用户信息可能含有冒号(如ss的method:password)，不能使用parts.username
+    userinfo = parts.netloc.rpartition('@')[0]
+    return unquote(userinfo), parts.hostname, port, query, name
+
+def _uri_transport_params(query):
+    """把vless/trojan链接的查询参数转换为apply_transport使用的path/host"""
+    params = {}
+    path = query.get('serviceName') if query.get('type') == 'grpc' else query.get('path')
+    if path is not None:
+        params['path'] = path
+    if query.get('host'):
+        params['host'] = query['host']
+    return params
+
+def _b64decode_text(data):
+    """解码可能省略填充、使用URL安全字符的base64文本"""
+    data = data.strip()
+    return base64.urlsafe_b64decode(data.replace('+', '-').replace('/', '_') + '=' * (-len(data) % 4)).decode('utf-8')
+
+def vless_to_clash_config(link):
+    """将vless链接转换为Clash配置格式"""
+    uuid, server, port, query, name = _split_uri(link)
+    security = query.get('security', '')
+    clash_config = {
+        'name': name,
+        'type': 'vless',
+        'server': server,
+        'port': port,
+        'uuid': uuid,
+        'udp': True,
+        'tls': security in ('tls', 'reality'),
+        'skip-cert-verify': True,
+    }
+    if query.get('flow'):
+        clash_config['flow'] = query['flow']
     
-    if not vmess_links:
-        print("未找到有效的vmess链接")
-        return []
+    network = query.get('type', '')
+    apply_transport(clash_config, '' if network == 'tcp' else network, _uri_transport_params(query))
+    
+    if clash_config['tls']:
+        if query.get('sni'):
+            clash_config['servername'] = query['sni']
+        elif query.get('host'):
+            clash_config['servername'] = query['host']
+        if query.get('fp'):
+            clash_config['client-fingerprint'] = query['fp']
+    if security == 'reality':
+        clash_config['reality-opts'] = {'public-key': query.get('pbk', '')}
+        if query.get('sid'):
+            clash_config['reality-opts']['short-id'] = query['sid']
+    return clash_config
+
+def trojan_to_clash_config(link):
+    """将trojan链接转换为Clash配置格式"""
+    password, server, port, query, name = _split_uri(link)
+    clash_config = {
+        'name': name,
+        'type': 'trojan',
+        'server': server,
+        'port': port,
+        'password': password,
+        'udp': True,
+        'skip-cert-verify': True,
+    }
+    if query.get('sni') or query.get('peer'):
+        clash_config['sni'] = query.get('sni') or query.get('peer')
     
-    proxies = []
-    for link in vmess_links:
+    network = query.get('type', '')
+    apply_transport(clash_config, '' if network == 'tcp' else network, _uri_transport_params(query))
+    return clash_config
+
+def ss_to_clash_config(link):
+    """将shadowsocks链接转换为Clash配置格式，支持SIP002和整体base64编码的旧格式"""
+    body, _, fragment = link[len('ss://'):].partition('#')
+    if '@' not in body:
+        # 旧格式: ss://base64(method:password@server:port)#name
         try:
-            vmess_data = decode_vmess_link(link)
-            clash_config = vmess_to_clash_config(vmess_data)
-            proxies.append(clash_config)
-            print(f"成功转换: {clash_config['name']}")
+            body = _b64decode_text(body.split('/?')[0].split('?')[0])
         except Exception as e:
-            print(f"转换失败: {e}")
+            raise ValueError(f"解码ss链接失败: {e}")
+    link = 'ss://' + body + ('#' + fragment if fragment else '')
+    userinfo, server, port, query, name = _split_uri(link)
+    if ':' not in userinfo:
+        try:
+            userinfo = _b64decode_text(userinfo)
+        except Exception as e:
+            raise ValueError(f"解码ss链接失败: {e}")
+    cipher, _, password = userinfo.partition(':')
+    if not cipher or not password:
+        raise ValueError("ss链接缺少加密方式或密码")
     
-    return proxies
-
-def generate_clash_config(proxies, output_file='modified_config.yaml'):
-    """生成完整的Clash配置文件"""
-    # 读取现有配置文件作为模板（如果存在）
-    template_file = 'modified_config.yaml'
-    if os.path.exists(template_file):
-        with open(template_file, 'r') as f:
-            config = yaml.safe_load(f)
-    else:
-        # 创建基本配置
-        config = {
-            'mixed-port': 7890,
-            'allow-lan': True,
-            'log-level': 'info',
-            'external-controller': '0.0.0.0:9090',
-            'dns': {
-                'enable': True,
-                'listen': '0.0.0.0:1053',
-                'ipv6': True,
-                'use-system-hosts': False,
-                'cache-algorithm': 'arc',
-                'enhanced-mode': 'fake-ip',
-                'fake-ip-range': '198.18.0.1/16',
-                'fake-ip-filter': [
-                    '+.lan',
-                    '+.local',
-                    '+.msftconnecttest.com',
-                    '+.msftncsi.com',
-                    'localhost.ptlogin2.qq.com',
-                    'localhost.sec.qq.com',
-                    'localhost.work.weixin.qq.com'
-                ],
-                'default-nameserver': [
-                    '223.5.5.5',
-                    '119.29.29.29',
-                    '1.1.1.1',
-                    '8.8.8.8'
-                ],
-                'nameserver': [
-                    'https://dns.alidns.com/dns-query',
-                    'https://doh.pub/dns-query',
-                    'https://doh.360.cn/dns-query',
-                    'https://1.1.1.1/dns-query',
-                    'https://1.0.0.1/dns-query',
-                    'https://208.67.222.222/dns-query',
-                    'https://208.67.220.220/dns-query',
-                    'https://194.242.2.2/dns-query',
-                    'https://194.242.2.3/dns-query'
-                ],
-                'proxy-server-nameserver': [
-                    'https://dns.alidns.com/dns-query',
-                    'https://doh.pub/dns-query',
-                    'https://doh.360.cn/dns-query',
-                    'https://1.1.1.1/dns-query',
-                    'https://1.0.0.1/dns-query',
-                    'https://208.67.222.222/dns-query',
-                    'https://208.67.220.220/dns-query',
-                    'https://194.242.2.2/dns-query',
-                    'https://194.242.2.3/dns-query'
-                ],
-                'nameserver-policy': {
-                    'geosite:private,cn,geolocation-cn': [
-                        'https://dns.alidns.com/dns-query',
-                        'https://doh.pub/dns-query',
-                        'https://doh.360.cn/dns-query'
-                    ],
-                    'geosite:google,youtube,telegram,gfw,geolocation-!cn': [
-                        'https://1.1.1.1/dns-query',
-                        'https://1.0.0.1/dns-query',
-                        'https://208.67.222.222/dns-query',
-                        'https://208.67.220.220/dns-query',
-                        'https://194.242.2.2/dns-query',
-                        'https://194.242.2.3/dns-query'
-                    ]
-                }
-            }
+    clash_config = {
+        'name': name,
+        'type': 'ss',
+        'server': server,
+        'port': port,
+        'cipher': cipher,
+        'password': password,
+        'udp': True,
+    }
+    
+    # 处理插件，格式为 plugin=name;key=value;...
+    plugin, *plugin_args = query.get('plugin', '').split(';')
+    plugin_opts = dict(arg.partition('=')[::2] for arg in plugin_args if arg)
+    if plugin in ('obfs-local', 'simple-obfs'):
+        clash_config['plugin'] = 'obfs'
+        clash_config['plugin-opts'] = {'mode': plugin_opts.get('obfs', 'http')}
+        if plugin_opts.get('obfs-host'):
+            clash_config['plugin-opts']['host'] = plugin_opts['obfs-host']
+    elif plugin == 'v2ray-plugin':
+        clash_config['plugin'] = 'v2ray-plugin'
+        clash_config['plugin-opts'] = {
+            'mode': plugin_opts.get('mode', 'websocket'),
+            'tls': 'tls' in plugin_opts,
+            'host': plugin_opts.get('host', ''),
+            'path': plugin_opts.get('path', '/'),
         }
+    elif plugin:
+        raise ValueError(f"不支持的ss插件: {plugin}")
+    return clash_config
+
+def hysteria2_to_clash_config(link):
+    """将hysteria2(hy2)链接转换为Clash配置格式"""
+    password, server, port, query, name = _split_uri(link)
+    clash_config = {
+        'name': name,
+        'type': 'hysteria2',
+        'server': server,
+        'port': port,
+        'password': password,
+        'skip-cert-verify': True,
+    }
+    if query.get('sni'):
+        clash_config['sni'] = query['sni']
+    if query.get('obfs'):
+        clash_config['obfs'] = query['obfs']
+        clash_config['obfs-password'] = query.get('obfs-password', '')
+    if query.get('mport'):
+        clash_config['ports'] = query['mport']
+    return clash_config
+
+def vmess_link_to_clash_config(link):
+    """将vmess链接转换为Clash配置格式"""
+    return vmess_to_clash_config(decode_vmess_link(link))
+
+# 各协议链接的转换函数，按链接前缀分派
+PROXY_LINK_CONVERTERS = {
+    'vmess': vmess_link_to_clash_config,
+    'vless': vless_to_clash_config,
+    'trojan': trojan_to_clash_config,
+    'ss': ss_to_clash_config,
+    'hysteria2': hysteria2_to_clash_config,
+    'hy2': hysteria2_to_clash_config,
+}
+
+# 所有协议链接的匹配模式，一次扫描找出全部链接。vmess部分与原来的匹配规则相同；
+# 其余协议要求前面不是字母数字，避免把vmess://中的ss://当作ss链接。
+# 链接中的逗号应当编码为%2C，未编码的逗号视为分隔符，逗号分隔的多个链接分别匹配
+PROXY_LINK_PATTERN = re.compile(
+    r'vmess://[A-Za-z0-9+/=]+'
+    r'|(?<![A-Za-z0-9])(?:vless|trojan|ss|hysteria2|hy2)://[^\s\'"<>,]+'
+)
+
+# 流式读取时缓冲区末尾需要保留的长度，足以容纳最长的协议前缀
+LINK_PREFIX_KEEP = max(len(scheme) for scheme in PROXY_LINK_CONVERTERS) + len('://') + 1
+
+# 流式读取时每次读取的字符数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 并行转换时每批提交给子进程的链接数
+PARALLEL_CHUNK_SIZE = 500
+
+def process_vmess_links(input_text, jobs=1, log_file=None):
+    """处理多行代理链接文本(vmess/vless/trojan/ss/hysteria2可以混合)，转换日志写入log_file(默认标准输出)"""
+    # 一次扫描匹配所有协议的链接
+    with profiler.stage('scan'):
+        links = PROXY_LINK_PATTERN.findall(input_text)
+    
+    if not links:
+        print("未找到有效的代理链接", file=log_file)
+        return []
+    
+    # 整份配置会在内存中保留到写入，转换为紧凑表示，键和重复的嵌套选项只保存一份
+    with profiler.stage('decode'):
+        return [proxy_model.compact(proxy) for proxy in iter_clash_proxies(links, log_file=log_file, jobs=jobs)]
+
+def convert_proxy_link(link):
+    """按协议前缀转换单个代理链接，返回(代理配置, 错误信息)"""
+    scheme = link[:link.find('://')]
+    converter = PROXY_LINK_CONVERTERS.get(scheme)
+    if converter is None:
+        return None, f"不支持的链接协议: {scheme}"
+    try:
+        return converter(link), None
+    except Exception as e:
+        return None, str(e)
+
+def convert_link_chunk(links):
+    """转换一批代理链接，供子进程调用"""
+    return [convert_proxy_link(link) for link in links]
+
+def iter_chunks(iterable, size):
+    """将可迭代对象按固定大小分批"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_converted_links(links, jobs=1):
+    """按输入顺序生成每个链接的转换结果，jobs大于1时使用多进程分批转换"""
+    if jobs <= 1:
+        for link in links:
+            yield convert_proxy_link(link)
+        return
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # 限制同时提交的批次数，保证流式输入时内存占用有界
+        pending = deque()
+        for chunk in iter_chunks(links, PARALLEL_CHUNK_SIZE):
+            pending.append(executor.submit(convert_link_chunk, chunk))
+            if len(pending) >= jobs * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def iter_clash_proxies(links, log_file=None, jobs=1):
+    """逐个转换代理链接，生成Clash代理配置"""
+    for clash_config, error in iter_converted_links(links, jobs):
+        if error is not None:
+            print(f"转换失败: {error}", file=log_file)
+            continue
+        print(f"成功转换: {clash_config['name']}", file=log_file)
+        yield clash_config
+
+def iter_proxy_links(stream, chunk_size=STREAM_CHUNK_SIZE):
+    """分块读取输入流，逐个生成各协议的代理链接，内存占用与输入大小无关"""
+    # 缓冲区末尾可能是不完整的链接或前缀，保留到下一块再匹配
+    buffer = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        keep_from = max(0, len(buffer) - LINK_PREFIX_KEEP)
+        for match in PROXY_LINK_PATTERN.finditer(buffer):
+            if match.end() == len(buffer):
+                # 链接可能延续到下一块
+                keep_from = match.start()
+                break
+            yield match.group(0)
+            keep_from = max(keep_from, match.end())
+        buffer = buffer[keep_from:]
+    
+    for match in PROXY_LINK_PATTERN.finditer(buffer):
+        yield match.group(0)
+
+def stream_clash_proxies(streams, output=None, output_format='ndjson', log_file=None, jobs=1):
+    """流式转换: 依次读取各输入流，边读取边输出代理节点，每个节点一行JSON或一个YAML文档"""
+    output = output or sys.stdout
+    count = 0
+    links = chain.from_iterable(iter_proxy_links(stream) for stream in streams)
+    for proxy in iter_clash_proxies(links, log_file=log_file, jobs=jobs):
+        if output_format == 'yaml':
+            serializer.dump(proxy, output, explicit_start=True)
+        else:
+            output.write(json.dumps(proxy, ensure_ascii=False) + '\n')
+        output.flush()
+        count += 1
+    
+    if not count:
+        print("未找到有效的代理链接", file=log_file)
+    return count
+
+def _first_value(value):
+    """列表取第一个元素，用于统一不同传输方式的path/host写法"""
+    if isinstance(value, (list, proxy_model.FrozenList)):
+        return value[0] if value else ''
+    return value or ''
+
+def proxy_fingerprint(proxy):
+    """根据连接参数计算节点指纹，名称不同但连接相同的节点指纹相同"""
+    network = proxy.get('network', '')
+    opts = proxy.get(f'{network}-opts') or {}
+    path = opts.get('path', opts.get('service-name', ''))
+    host = opts.get('host') or (opts.get('headers') or {}).get('host', '')
+    key = [
+        proxy.get('type', ''),
+        str(proxy.get('server', '')).lower(),
+        str(proxy.get('port', '')),
+        proxy.get('uuid') or proxy.get('password', ''),
+        network,
+        _first_value(path),
+        _first_value(host),
+        bool(proxy.get('tls', False)),
+        proxy.get('servername') or proxy.get('sni', ''),
+    ]
+    data = json.dumps(key, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+def new_merge_summary():
+    """创建合并摘要: 重复节点、重命名节点和跳过的同名节点"""
+    return {'duplicates': [], 'renamed': [], 'skipped': []}
+
+def select_new_proxies(proxies, known_names, known_fingerprints, dedupe='name', rename='suffix', summary=None):
+    """从proxies中挑选需要追加的新节点，known_names和known_fingerprints会被就地更新
+    
+    dedupe='name' 时只按名称去重(同名节点跳过)；
+    dedupe='fingerprint' 时按连接指纹去重，名称冲突的不同节点按rename策略处理:
+    'suffix' 追加序号重命名，'skip' 跳过。
+    """
+    if summary is None:
+        summary = new_merge_summary()
+    # 每个名称下一次尝试的序号，保证重命名整体为线性时间
+    next_suffix = {}
+    new_proxies = []
+    for proxy in proxies:
+        name = proxy['name']
+        if dedupe == 'fingerprint':
+            fingerprint = proxy_fingerprint(proxy)
+            if fingerprint in known_fingerprints:
+                summary['duplicates'].append((name, known_fingerprints[fingerprint]))
+                continue
+            if name in known_names:
+                if rename != 'suffix':
+                    summary['skipped'].append(name)
+                    continue
+                suffix = next_suffix.get(name, 2)
+                while f"{name} ({suffix})" in known_names:
+                    suffix += 1
+                next_suffix[name] = suffix + 1
+                new_name = f"{name} ({suffix})"
+                summary['renamed'].append((name, new_name))
+                proxy = {**proxy, 'name': new_name}
+            known_fingerprints[fingerprint] = proxy['name']
+        elif name in known_names:
+            summary['skipped'].append(name)
+            continue
+        known_names.add(proxy['name'])
+        new_proxies.append(proxy)
+    return new_proxies
+
+def print_merge_summary(summary, dedupe='name', limit=10, log_file=None):
+    """打印合并摘要
+    
+    默认的按名称去重只在确实跳过了同名节点时打印；按指纹去重时总是打印，确认去重的效果。
+    """
+    for name, kept in summary['duplicates'][:limit]:
+        print(f"  合并重复节点: {name} -> {kept}", file=log_file)
+    for name, new_name in summary['renamed'][:limit]:
+        print(f"  重命名同名节点: {name} -> {new_name}", file=log_file)
+    if dedupe == 'name':
+        if summary['skipped']:
+            print(f"去重摘要: 跳过同名节点 {len(summary['skipped'])} 个", file=log_file)
+        return
+    print(f"去重摘要: 合并重复节点 {len(summary['duplicates'])} 个，"
+          f"重命名 {len(summary['renamed'])} 个，跳过同名节点 {len(summary['skipped'])} 个", file=log_file)
+
+def proxy_index_path(output_file):
+    """返回输出文件对应的增量索引文件路径"""
+    return output_file + '.index.json'
+
+def template_sha256(template_file, output_file):
+    """模板与输出不是同一个文件时返回模板的sha256，用于判断模板是否变化"""
+    if os.path.abspath(template_file) == os.path.abspath(output_file):
+        return None
+    return atomic_write.file_sha256(template_file)
+
+def find_proxies_end(data):
+    """返回YAML文本中顶层proxies块末尾的字节偏移，没有块状proxies时返回None"""
+    offset = 0
+    inside = False
+    for line in data.splitlines(keepends=True):
+        if inside and line[:1] not in (b' ', b'-', b'\r', b'\n'):
+            return offset
+        if line.rstrip(b'\r\n') == b'proxies:':
+            inside = True
+        offset += len(line)
+    return offset if inside else None
+
+def write_proxy_index(output_file, data, proxies, template_file):
+    """写入增量索引: 输出文件的内容哈希、proxies块位置、已知节点名称和指纹"""
+    index = {
+        'version': 3,
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'template-sha256': template_sha256(template_file, output_file),
+        'proxies-end': find_proxies_end(data),
+        'names': [proxy['name'] for proxy in proxies],
+        'fingerprints': {proxy_fingerprint(proxy): proxy['name'] for proxy in proxies},
+    }
+    atomic_write.write_if_changed(proxy_index_path(output_file), json.dumps(index, ensure_ascii=False))
+
+def load_proxy_index(output_file, template_file):
+    """读取增量索引，索引不存在或与输出文件、模板不一致时返回None"""
+    try:
+        with open(proxy_index_path(output_file), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    
+    if index.get('version') != 3:
+        return None
+    if index.get('sha256') != atomic_write.file_sha256(output_file):
+        print("增量索引与输出文件不一致，重新生成完整配置")
+        return None
+    if index.get('template-sha256') != template_sha256(template_file, output_file):
+        print("模板文件已变化，重新生成完整配置")
+        return None
+    return index
+
+def merge_proxies_incrementally(proxies, output_file, template_file, dedupe='name', rename='suffix'):
+    """根据增量索引合并新代理，返回(是否合并成功, 输出文件是否改变)，无法增量合并时返回(False, False)"""
+    index = load_proxy_index(output_file, template_file)
+    if index is None:
+        return False, False
+    
+    # 与完整生成使用相同的去重规则
+    summary = new_merge_summary()
+    new_proxies = select_new_proxies(proxies, set(index['names']), dict(index['fingerprints']),
+                                     dedupe, rename, summary)
+    print_merge_summary(summary, dedupe)
+    
+    if not new_proxies:
+        print(f"没有新的代理节点，{output_file} 保持不变")
+        return True, False
+    
+    proxies_end = index['proxies-end']
+    if proxies_end is None:
+        return False, False
+    
+    # 只序列化新节点，插入到原有proxies块的末尾，其余内容按字节保留
+    with open(output_file, 'rb') as f:
+        data = f.read()
+    # 与完整生成时的文本模式写入一致，换行符使用平台默认值
+    chunk = serializer.dump(new_proxies).replace('\n', os.linesep).encode('utf-8')
+    data = data[:proxies_end] + chunk + data[proxies_end:]
+    atomic_write.write_if_changed(output_file, data)
+    
+    index['sha256'] = hashlib.sha256(data).hexdigest()
+    index['proxies-end'] = proxies_end + len(chunk)
+    index['names'].extend(proxy['name'] for proxy in new_proxies)
+    index['fingerprints'].update((proxy_fingerprint(proxy), proxy['name']) for proxy in new_proxies)
+    atomic_write.write_if_changed(proxy_index_path(output_file), json.dumps(index, ensure_ascii=False))
+    
+    print(f"已增量追加 {len(new_proxies)} 个代理节点到 {output_file}")
+    return True, True
+
+def reconcile_proxy_groups(groups, specs):
+    """按规格一次遍历协调代理组: 名称索引只建立一次，不存在的组按顺序追加"""
+    # 同名组只认第一个，与逐个查找的结果一致
+    name_index = {}
+    for position, group in enumerate(groups):
+        name_index.setdefault(group.get('name'), position)
+    
+    for spec in specs:
+        name = spec['group']['name']
+        position = name_index.get(name)
+        if position is None:
+            # 深拷贝，避免多个组共享同一对象导致YAML中出现锚点
+            name_index[name] = len(groups)
+            groups.append(copy.deepcopy(spec['group']))
+        elif spec['policy'] == 'update':
+            groups[position].update(copy.deepcopy(spec['fields']))
+        elif spec['policy'] != 'preserve':
+            raise ValueError(f"未知的代理组协调策略: {spec['policy']}")
+    
+    return groups
+
+def restore_filter_groups(groups, originals):
+    """把上次--expand-filters list展开为节点列表的组恢复为原来的定义，使新节点也能重新参与计算
+
+    originals为{组名: 展开前的组}，只来自load_expanded_groups，用户自己定义的同名组不受影响。
+    """
+    for position, group in enumerate(groups):
+        original = originals.get(group.get('name'))
+        if original and 'filter' not in group:
+            groups[position] = copy.deepcopy(original)
+
+def expanded_groups_path(output_file):
+    """返回记录输出文件中被展开的代理组的文件路径"""
+    return output_file + '.groups.json'
+
+def load_expanded_groups(template_file):
+    """读取模板(上次的输出)中被展开为节点列表的组原来的定义，模板之后被修改过时返回空字典"""
+    try:
+        with open(expanded_groups_path(template_file), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if record.get('version') != 1 or record.get('sha256') != atomic_write.file_sha256(template_file):
+        return {}
+    return record.get('groups') or {}
+
+def write_expanded_groups(output_file, groups):
+    """记录输出文件中被展开的组原来的定义，没有展开的组时删除旧记录"""
+    path = expanded_groups_path(output_file)
+    if not groups:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    record = {'version': 1, 'sha256': atomic_write.file_sha256(output_file), 'groups': groups}
+    atomic_write.write_if_changed(path, json.dumps(record, ensure_ascii=False, default=list))
+
+def default_base_config():
+    """返回没有模板文件时使用的基本配置"""
+    return {
+        'mixed-port': 7890,
+        'allow-lan': True,
+        'log-level': 'info',
+        'external-controller': '0.0.0.0:9090',
+        'dns': copy.deepcopy(clash_template.DNS_CONFIG),
+    }
+
+def build_clash_config(proxies, config=None, dedupe='name', rename='suffix', expand_filters=None,
+                       verify_filters=False, probe_options=None, log_file=None, restore_groups=None,
+                       expanded_groups=None):
+    """把新节点合并进config并补全代理组、规则和规则集，返回config
+    
+    config会被就地修改，为None时使用default_base_config()。参数含义见generate_clash_config，
+    去重和filter计算的摘要输出到log_file(默认为标准输出)。restore_groups为模板中要恢复的
+    被展开的组(见load_expanded_groups)；expanded_groups不为None时记录这次展开的组原来的定义。
+    """
+    if config is None:
+        config = default_base_config()
     
     # 更新代理列表，保留现有代理并添加新代理
     existing_proxies = config.get('proxies', [])
     existing_names = {proxy['name'] for proxy in existing_proxies}
+    existing_fingerprints = {}
+    if dedupe == 'fingerprint':
+        for proxy in existing_proxies:
+            existing_fingerprints.setdefault(proxy_fingerprint(proxy), proxy['name'])
     
     # 只添加不重复的新代理
-    new_proxies = []
-    for proxy in proxies:
-        if proxy['name'] not in existing_names:
-            new_proxies.append(proxy)
-            existing_names.add(proxy['name'])
+    summary = new_merge_summary()
+    with profiler.stage('dedupe'):
+        new_proxies = select_new_proxies(proxies, existing_names, existing_fingerprints,
+                                         dedupe, rename, summary)
+    print_merge_summary(summary, dedupe, log_file=log_file)
     
     # 合并代理列表
     config['proxies'] = existing_proxies + new_proxies
     
+    # 探测节点连通性，处理不可达节点
+    if probe_options is not None:
+        with profiler.stage('probe'):
+            probe.probe_config(config, **probe_options)
+    
     # 自动生成代理组
     proxy_names = [proxy['name'] for proxy in config['proxies']]
     
@@ -243,448 +714,393 @@ def generate_clash_config(proxies, output_file='modified_config.yaml'):
     if 'proxy-groups' not in config:
         config['proxy-groups'] = []
     
-    # 检查是否已存在节点选择组
-    select_group_exists = False
-    for group in config.get('proxy-groups', []):
-        if group.get('name') == '节点选择':
-            # 保留原有的基本代理组
-            group['proxies'] = ['延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)']
-            group['include-all'] = True
-            select_group_exists = True
-            break
+    # 按规格协调代理组
+    with profiler.stage('reconcile'):
+        # 模板可能是上次--expand-filters list的输出，先恢复filter，list模式会重新展开，其他模式让新节点也能加入
+        if restore_groups:
+            restore_filter_groups(config['proxy-groups'], restore_groups)
+        reconcile_proxy_groups(config['proxy-groups'], clash_template.PROXY_GROUP_SPECS)
     
-    if not select_group_exists:
-        config['proxy-groups'].append({
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '节点选择',
-            'type': 'select',
-            'proxies': ['延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)'],
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/adjust.svg'
-        })
-    
-    # 检查是否已存在延迟选优组
-    url_test_group_exists = False
-    for group in config.get('proxy-groups', []):
-        if group.get('name') == '延迟选优':
-            group['include-all'] = True
-            url_test_group_exists = True
-            break
+    # 添加规则集
+    if 'rules' not in config:
+        config['rules'] = list(clash_template.RULES)
     
-    if not url_test_group_exists:
-        config['proxy-groups'].append({
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '延迟选优',
-            'type': 'url-test',
-            'tolerance': 100,
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/speed.svg'
-        })
-    
-    # 检查是否已存在故障转移组
-    fallback_group_exists = False
-    for group in config.get('proxy-groups', []):
-        if group.get('name') == '故障转移':
-            group['include-all'] = True
-            fallback_group_exists = True
-            break
+    # 添加规则提供者
+    if 'rule-providers' not in config:
+        config['rule-providers'] = copy.deepcopy(clash_template.RULE_PROVIDERS)
     
-    if not fallback_group_exists:
-        config['proxy-groups'].append({
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '故障转移',
-            'type': 'fallback',
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/ambulance.svg'
-        })
-    
-    # 检查是否已存在负载均衡(散列)组
-    load_balance_hash_group_exists = False
-    for group in config.get('proxy-groups', []):
-        if group.get('name') == '负载均衡(散列)':
-            group['include-all'] = True
-            load_balance_hash_group_exists = True
-            break
+    # 离线计算代理组的filter
+    if expand_filters:
+        with profiler.stage('expand-filters'):
+            summary = group_filter.expand_group_filters(config, expand_filters, verify_filters, expanded_groups)
+        group_filter.print_expand_summary(summary, log_file)
     
-    if not load_balance_hash_group_exists:
-        config['proxy-groups'].append({
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '负载均衡(散列)',
-            'type': 'load-balance',
-            'strategy': 'consistent-hashing',
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/merry_go.svg'
-        })
-    
-    # 检查是否已存在负载均衡(轮询)组
-    load_balance_round_group_exists = False
-    for group in config.get('proxy-groups', []):
-        if group.get('name') == '负载均衡(轮询)':
-            group['include-all'] = True
-            load_balance_round_group_exists = True
-            break
+    return config
+
+TEMPLATE_FILE = 'modified_config.yaml'
+
+# 缓存目录下保存配置各段渲染结果的子目录
+FRAGMENT_CACHE_SUBDIR = 'fragments'
+
+def load_template_config(template_file=TEMPLATE_FILE):
+    """读取现有配置文件作为模板，不存在时返回None"""
+    if not os.path.exists(template_file):
+        return None
+    with profiler.stage('load-template'):
+        with open(template_file, 'r') as f:
+            return serializer.load(f)
+
+def write_config(config, output_file, output_format='yaml', compact=False, cached_keys=()):
+    """写入配置文件并打印结果，返回输出文件的内容是否改变
     
-    if not load_balance_round_group_exists:
-        config['proxy-groups'].append({
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '负载均衡(轮询)',
-            'type': 'load-balance',
-            'strategy': 'round-robin',
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/balance.svg'
-        })
-    
-    # 添加更多代理组
-    proxy_groups = [
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '谷歌服务',
-            'type': 'select',
-            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/google.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '国外媒体',
-            'type': 'select',
-            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/youtube.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '电报消息',
-            'type': 'select',
-            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/telegram.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://chatgpt.com',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'expected-status': '200',
-            'name': 'ChatGPT',
-            'type': 'select',
-            'include-all': True,
-            'filter': 'AD|🇦🇩|AE|🇦🇪|AF|🇦🇫|AG|🇦🇬|AL|🇦🇱|AM|🇦🇲|AO|🇦🇴|AR|🇦🇷|AT|🇦🇹|AU|🇦🇺|AZ|🇦🇿|BA|🇧🇦|BB|🇧🇧|BD|🇧🇩|BE|🇧🇪|BF|🇧🇫|BG|🇧🇬|BH|🇧🇭|BI|🇧🇮|BJ|🇧🇯|BN|🇧🇳|BO|🇧🇴|BR|🇧🇷|BS|🇧🇸|BT|🇧🇹|BW|🇧🇼|BZ|🇧🇿|CA|🇨🇦|CD|🇨🇩|CF|🇨🇫|CG|🇨🇬|CH|🇨🇭|CI|🇨🇮|CL|🇨🇱|CM|🇨🇲|CO|🇨🇴|CR|🇨🇷|CV|🇨🇻|CY|🇨🇾|CZ|🇨🇿|DE|🇩🇪|DJ|🇩🇯|DK|🇩🇰|DM|🇩🇲|DO|🇩🇴|DZ|🇩🇿|EC|🇪🇨|EE|🇪🇪|EG|🇪🇬|ER|🇪🇷|ES|🇪🇸|ET|🇪🇹|FI|🇫🇮|FJ|🇫🇯|FM|🇫🇲|FR|🇫🇷|GA|🇬🇦|GB|🇬🇧|GD|🇬🇩|GE|🇬🇪|GH|🇬🇭|GM|🇬🇲|GN|🇬🇳|GQ|🇬🇶|GR|🇬🇷|GT|🇬🇹|GW|🇬🇼|GY|🇬🇾|HN|🇭🇳|HR|🇭🇷|HT|🇭🇹|HU|🇭🇺|ID|🇮🇩|IE|🇮🇪|IL|🇮🇱|IN|🇮🇳|IQ|🇮🇶|IS|🇮🇸|IT|🇮🇹|JM|🇯🇲|JO|🇯🇴|JP|🇯🇵|KE|🇰🇪|KG|🇰🇬|KH|🇰🇭|KI|🇰🇮|KM|🇰🇲|KN|🇰🇳|KR|🇰🇷|KW|🇰🇼|KZ|🇰🇿|LA|🇱🇦|LB|🇱🇧|LC|🇱🇨|LI|🇱🇮|LK|🇱🇰|LR|🇱🇷|LS|🇱🇸|LT|🇱🇹|LU|🇱🇺|LV|🇱🇻|LY|🇱🇾|MA|🇲🇦|MC|🇲🇨|MD|🇲🇩|ME|🇲🇪|MG|🇲🇬|MH|🇲🇭|MK|🇲🇰|ML|🇲🇱|MM|🇲🇲|MN|🇲🇳|MR|🇲🇷|MT|🇲🇹|MU|🇲🇺|MV|🇲🇻|MW|🇲🇼|MX|🇲🇽|MY|🇲🇾|MZ|🇲🇿|NA|🇳🇦|NE|🇳🇪|NG|🇳🇬|NI|🇳🇮|NL|🇳🇱|NO|🇳🇴|NP|🇳🇵|NR|🇳🇷|NZ|🇳🇿|OM|🇴🇲|PA|🇵🇦|PE|🇵🇪|PG|🇵🇬|PH|🇵🇭|PK|🇵🇰|PL|🇵🇱|PS|🇵🇸|PT|🇵🇹|PW|🇵🇼|PY|🇵🇾|QA|🇶🇦|RO|🇷🇴|RS|🇷🇸|RW|🇷🇼|SA|🇸🇦|SB|🇸🇧|SC|🇸🇨|SD|🇸🇩|SE|🇸🇪|SG|🇸🇬|SI|🇸🇮|SK|🇸🇰|SL|🇸🇱|SM|🇸🇲|SN|🇸🇳|SO|🇸🇴|SR|🇸🇷|SS|🇸🇸|ST|🇸🇹|SV|🇸🇻|SZ|🇸🇿|TD|🇹🇩|TG|🇹🇬|TH|🇹🇭|TJ|🇹🇯|TL|🇹🇱|TM|🇹🇲|TN|🇹🇳|TO|🇹🇴|TR|🇹🇷|TT|🇹🇹|TV|🇹🇻|TW|🇹🇼|TZ|🇹🇿|UA|🇺🇦|UG|🇺🇬|US|🇺🇸|UY|🇺🇾|UZ|🇺🇿|VA|🇻🇦|VC|🇻🇨|VN|🇻🇳|VU|🇻🇺|WS|🇼🇸|YE|🇾🇪|ZA|🇿🇦|ZM|🇿🇲|ZW|🇿🇼',
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/chatgpt.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '微软服务',
-            'type': 'select',
-            'proxies': ['全局直连', '节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)'],
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/microsoft.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '苹果服务',
-            'type': 'select',
-            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/apple.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '广告过滤',
-            'type': 'select',
-            'proxies': ['REJECT', 'DIRECT'],
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/bug.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '全局直连',
-            'type': 'select',
-            'proxies': ['DIRECT', '节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)'],
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/link.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '全局拦截',
-            'type': 'select',
-            'proxies': ['REJECT', 'DIRECT'],
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/block.svg'
-        },
-        {
-            'interval': 300,
-            'timeout': 3000,
-            'url': 'https://www.google.com/generate_204',
-            'lazy': True,
-            'max-failed-times': 3,
-            'hidden': False,
-            'name': '漏网之鱼',
-            'type': 'select',
-            'proxies': ['节点选择', '延迟选优', '故障转移', '负载均衡(散列)', '负载均衡(轮询)', '全局直连'],
-            'include-all': True,
-            'icon': 'https://fastly.jsdelivr.net/gh/clash-verge-rev/clash-verge-rev.github.io@main/docs/assets/icons/fish.svg'
-        }
-    ]
+    输出先写入临时文件，内容与现有文件相同时不替换，避免Clash无谓地重新加载。
+    """
+    if output_format == 'json':
+        with profiler.stage('dump'):
+            data = serializer.dump_json(config, compact=compact)
+        with profiler.stage('write'):
+            changed = atomic_write.write_if_changed(output_file, data)
+    else:
+        # proxies分批序列化后直接写入临时文件，不在内存中生成完整的YAML文本，
+        # 序列化与写入交替进行，无法分开计时，合并为dump-write阶段
+        writer = atomic_write.AtomicWriter(output_file)
+        with profiler.stage('dump-write'):
+            with writer as f:
+                serializer.dump_streaming(config, f, cached_keys=cached_keys)
+        changed = writer.changed
     
-    # 添加新的代理组，避免重复
-    for new_group in proxy_groups:
-        exists = False
-        for group in config.get('proxy-groups', []):
-            if group.get('name') == new_group['name']:
-                exists = True
-                break
-        if not exists:
-            config['proxy-groups'].append(new_group)
+    description = 'JSON格式' if output_format == 'json' else f"YAML后端: {serializer.describe_backend()}"
+    if changed:
+        print(f"配置已保存到 {output_file} ({description})")
+    else:
+        print(f"配置内容没有变化，{output_file} 保持不变 ({description})")
+    return changed
+
+def generate_clash_config(proxies, output_file='modified_config.yaml', incremental=False,
+                          dedupe='name', rename='suffix', expand_filters=None, verify_filters=False,
+                          probe_options=None, output_format='yaml', compact=False):
+    """生成完整的Clash配置文件，incremental为True时通过增量索引只追加新节点，返回输出文件的内容是否改变
     
-    # 添加规则集
-    if 'rules' not in config:
-        config['rules'] = [
-            'DOMAIN-SUFFIX,googleapis.cn,节点选择',
-            'DOMAIN-SUFFIX,gstatic.com,节点选择',
-            'DOMAIN-SUFFIX,xn--ngstr-lra8j.com,节点选择',
-            'DOMAIN-SUFFIX,github.io,节点选择',
-            'DOMAIN,v2rayse.com,节点选择',
-            'RULE-SET,openai,ChatGPT',
-            'RULE-SET,applications,全局直连',
-            'RULE-SET,private,全局直连',
-            'RULE-SET,reject,广告过滤',
-            'RULE-SET,icloud,微软服务',
-            'RULE-SET,apple,苹果服务',
-            'RULE-SET,google,谷歌服务',
-            'RULE-SET,proxy,节点选择',
-            'RULE-SET,gfw,节点选择',
-            'RULE-SET,tld-not-cn,节点选择',
-            'RULE-SET,direct,全局直连',
-            'RULE-SET,lancidr,全局直连,no-resolve',
-            'RULE-SET,cncidr,全局直连,no-resolve',
-            'RULE-SET,telegramcidr,电报消息,no-resolve',
-            'GEOIP,LAN,全局直连,no-resolve',
-            'GEOIP,CN,全局直连,no-resolve',
-            'MATCH,漏网之鱼'
-        ]
-        
-    # 添加规则提供者
-    if 'rule-providers' not in config:
-        config['rule-providers'] = {
-            'reject': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/reject.txt',
-                'path': './ruleset/loyalsoldier/reject.yaml'
-            },
-            'icloud': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/icloud.txt',
-                'path': './ruleset/loyalsoldier/icloud.yaml'
-            },
-            'apple': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/apple.txt',
-                'path': './ruleset/loyalsoldier/apple.yaml'
-            },
-            'google': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/google.txt',
-                'path': './ruleset/loyalsoldier/google.yaml'
-            },
-            'proxy': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/proxy.txt',
-                'path': './ruleset/loyalsoldier/proxy.yaml'
-            },
-            'direct': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/direct.txt',
-                'path': './ruleset/loyalsoldier/direct.yaml'
-            },
-            'private': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/private.txt',
-                'path': './ruleset/loyalsoldier/private.yaml'
-            },
-            'gfw': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/gfw.txt',
-                'path': './ruleset/loyalsoldier/gfw.yaml'
-            },
-            'tld-not-cn': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'domain',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/tld-not-cn.txt',
-                'path': './ruleset/loyalsoldier/tld-not-cn.yaml'
-            },
-            'telegramcidr': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'ipcidr',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/telegramcidr.txt',
-                'path': './ruleset/loyalsoldier/telegramcidr.yaml'
-            },
-            'cncidr': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'ipcidr',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/cncidr.txt',
-                'path': './ruleset/loyalsoldier/cncidr.yaml'
-            },
-            'lancidr': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'ipcidr',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/lancidr.txt',
-                'path': './ruleset/loyalsoldier/lancidr.yaml'
-            },
-            'applications': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'classical',
-                'url': 'https://fastly.jsdelivr.net/gh/Loyalsoldier/clash-rules@release/applications.txt',
-                'path': './ruleset/loyalsoldier/applications.yaml'
-            },
-            'openai': {
-                'type': 'http',
-                'format': 'yaml',
-                'interval': 86400,
-                'behavior': 'classical',
-                'url': 'https://fastly.jsdelivr.net/gh/blackmatrix7/ios_rule_script@master/rule/Clash/OpenAI/OpenAI.yaml',
-                'path': './ruleset/blackmatrix7/openai.yaml'
-            }
-        }
+    expand_filters为'list'或'regex'时离线计算include-all代理组的filter，见group_filter模块。
+    probe_options不为None时先探测节点连通性，参数传给probe.probe_config。
+    output_format为'json'时输出JSON(compact为True时不缩进)，增量索引依赖YAML的块状布局，此时不使用增量追加。
+    """
+    # 展开为节点列表时新节点会改变代理组内容，探测会删除或调整已有节点，都不能只追加proxies
+    incremental = incremental and output_format == 'yaml'
+    if incremental and expand_filters != 'list' and probe_options is None:
+        with profiler.stage('incremental-merge'):
+            merged, changed = merge_proxies_incrementally(proxies, output_file, TEMPLATE_FILE, dedupe, rename)
+        if merged:
+            return changed
+    
+    template_config = load_template_config()
+    expanded_groups = {}
+    config = build_clash_config(proxies, template_config, dedupe, rename, expand_filters, verify_filters,
+                                probe_options, restore_groups=load_expanded_groups(TEMPLATE_FILE),
+                                expanded_groups=expanded_groups)
+    
+    # DNS、代理组、规则集和规则通常不变，复用缓存的渲染结果；与其他段共享对象时serializer会整体序列化
+    changed = write_config(config, output_file, output_format, compact, clash_template.STATIC_SECTION_KEYS)
+    write_expanded_groups(output_file, expanded_groups)
+    
+    # 展开为节点列表的代理组不会随追加的节点更新，这样的输出不写索引，下次总是完整生成
+    if incremental and expand_filters != 'list':
+        with profiler.stage('write-index'):
+            with open(output_file, 'rb') as f:
+                data = f.read()
+            write_proxy_index(output_file, data, config['proxies'], TEMPLATE_FILE)
+    return changed
+
+def generate_provider_config(sources, output_file='modified_config.yaml', shard_by='source',
+                             providers_dir=proxy_providers.DEFAULT_DIRECTORY, dedupe='name', rename='suffix',
+                             expand_filters=None, verify_filters=False, output_format='yaml', compact=False):
+    """节点按来源或地区分片写入proxy-providers文件，主配置只引用这些文件，返回主配置的内容是否改变
+    
+    sources为[(来源, 节点列表)]，来源是订阅地址或输入文件。所有来源按与generate_clash_config
+    相同的规则去重。模板中内联的proxies通常是上次非分片模式的输出，节点改由提供者文件提供，
+    因此主配置中清空proxies，也不参与去重。providers_dir是相对于主配置所在目录的路径。
+    """
+    config = load_template_config() or default_base_config()
+    config['proxies'] = []
+    known_names = set()
+    known_fingerprints = {}
+    
+    # 各来源依次去重，known_names和known_fingerprints在来源之间累积，结果与合并后一次去重相同
+    summary = new_merge_summary()
+    tagged_proxies = []
+    with profiler.stage('dedupe'):
+        for source, proxies in sources:
+            for proxy in select_new_proxies(proxies, known_names, known_fingerprints, dedupe, rename, summary):
+                tagged_proxies.append((source, proxy))
+    print_merge_summary(summary, dedupe)
+    
+    with profiler.stage('write-providers'):
+        shards = proxy_providers.shard_proxies(tagged_proxies, shard_by)
+        results, removed = proxy_providers.write_shards(shards, providers_dir, os.path.dirname(output_file) or '.')
+    proxy_providers.print_shard_results(results, removed)
+    proxy_providers.apply_providers(config, results, providers_dir)
+    
+    # 代理组使用include-all，自动包含提供者中的节点；有proxy-providers时list模式的filter展开会退回regex
+    config = build_clash_config([], config, dedupe, rename, expand_filters, verify_filters,
+                                restore_groups=load_expanded_groups(TEMPLATE_FILE))
+    changed = write_config(config, output_file, output_format, compact)
+    # 有proxy-providers时不会展开为节点列表
+    write_expanded_groups(output_file, {})
+    return changed
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='将vmess链接转换为Clash配置文件')
+    parser.add_argument('input_file', nargs='?',
+                        help='包含代理链接(vmess/vless/trojan/ss/hysteria2)的输入文件或订阅地址，省略时从标准输入读取')
+    parser.add_argument('output_file', nargs='?', default='modified_config.yaml',
+                        help='输出的配置文件 (默认: modified_config.yaml)')
+    parser.add_argument('-o', '--output', help='输出的配置文件，与位置参数output_file相同，便于和--url一起使用')
+    parser.add_argument('--format', choices=['yaml', 'json'], default='yaml',
+                        help='输出格式: json是合法的YAML，Clash和其他程序加载更快 (默认: yaml)')
+    parser.add_argument('--compact', action='store_true',
+                        help='--format json时输出不缩进的紧凑JSON')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式模式: 分块读取输入，将转换后的节点逐个输出到标准输出')
+    parser.add_argument('--stream-format', choices=['ndjson', 'yaml'], default='ndjson',
+                        help='流式模式的输出格式 (默认: ndjson)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='并行转换使用的进程数，0表示使用全部CPU核心 (默认: 1)')
+    parser.add_argument('--dedupe', choices=['name', 'fingerprint'], default='name',
+                        help='去重方式: name按节点名称，fingerprint按服务器/端口/uuid/传输/TLS等连接参数 (默认: name)')
+    parser.add_argument('--rename', choices=['suffix', 'skip'], default='suffix',
+                        help='按指纹去重时，不同节点名称冲突的处理: suffix追加序号，skip跳过 (默认: suffix)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式: 维护输出文件旁的索引，只追加新节点，没有新节点时不改写文件')
+    parser.add_argument('--expand-filters', choices=['list', 'regex'],
+                        help='离线计算include-all代理组的filter: list写成显式节点列表(此时不使用增量追加)，regex写成更短的等价正则')
+    parser.add_argument('--verify-filters', action='store_true',
+                        help='离线计算filter时用原正则逐个核对节点，结果不一致时报错')
+    parser.add_argument('--providers', choices=proxy_providers.SHARD_MODES,
+                        help='把节点按来源订阅(source)或地区(region)分片写入proxy-providers文件，主配置只引用这些文件，'
+                             '订阅更新后只改写变化的分片 (不能与--incremental、--probe、--stream一起使用)')
+    parser.add_argument('--providers-dir', default=proxy_providers.DEFAULT_DIRECTORY,
+                        help=f'分片文件的目录，相对于输出文件所在目录 (默认: {proxy_providers.DEFAULT_DIRECTORY})')
+    parser.add_argument('--push', action='store_true',
+                        help='写入后通过external-controller推送到运行中的Clash: 只有结构变化时才完整重新加载，'
+                             '否则只修改常规设置和刷新变化的代理提供者')
+    parser.add_argument('--controller', help='--push使用的控制器地址 (默认: 配置中的external-controller)')
+    parser.add_argument('--controller-secret', help='--push使用的控制器secret (默认: 配置中的secret)')
+    parser.add_argument('--probe', choices=['drop', 'demote'],
+                        help='写入前并发探测节点的TCP连通性: drop删除不可达节点，demote移到列表末尾 (此时不使用增量追加)')
+    parser.add_argument('--probe-tls', action='store_true',
+                        help='对启用TLS的节点在TCP连接后再做TLS握手')
+    parser.add_argument('--probe-timeout', type=float, default=probe.DEFAULT_TIMEOUT,
+                        help=f'每个节点的探测超时秒数 (默认: {probe.DEFAULT_TIMEOUT})')
+    parser.add_argument('--probe-concurrency', type=int, default=probe.DEFAULT_CONCURRENCY,
+                        help=f'同时进行的探测数 (默认: {probe.DEFAULT_CONCURRENCY})')
+    parser.add_argument('--probe-report', help='把每个节点的探测结果和延迟保存为JSON文件')
+    parser.add_argument('--watch', action='store_true',
+                        help='常驻模式: 监视输入文件，内容变化时在当前进程内重新生成配置')
+    parser.add_argument('--watch-interval', type=float, default=watch.DEFAULT_INTERVAL,
+                        help=f'监视模式检查文件的间隔秒数 (默认: {watch.DEFAULT_INTERVAL})')
+    parser.add_argument('-u', '--url', action='append', default=[],
+                        help='订阅地址，可重复指定，多个订阅并发下载')
+    parser.add_argument('--cache-dir', default=subscription.DEFAULT_CACHE_DIR,
+                        help=f'缓存目录，保存订阅(用于ETag/Last-Modified条件请求)和配置各段的渲染结果 (默认: {subscription.DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用缓存，总是完整下载订阅并重新渲染配置')
+    parser.add_argument('--profile', action='store_true',
+                        help='记录读取、扫描、解码、代理组协调、序列化、写入等各阶段的耗时和峰值内存，结束时打印汇总表')
+    parser.add_argument('--profile-report', help='把性能剖析结果保存为JSON文件 (需要--profile)')
+    parser.add_argument('--profile-no-memory', action='store_true',
+                        help='性能剖析时不使用tracemalloc统计内存，耗时更接近未剖析时')
+    args = parser.parse_args(argv)
+    if args.output:
+        args.output_file = args.output
+    if subscription.is_url(args.input_file):
+        args.url.insert(0, args.input_file)
+        args.input_file = None
+    if args.jobs <= 0:
+        args.jobs = os.cpu_count() or 1
+    return args
+
+def probe_options_from_args(args):
+    """从命令行参数构造探测参数，未指定--probe时返回None"""
+    if not args.probe:
+        return None
+    return {
+        'timeout': args.probe_timeout,
+        'concurrency': max(1, args.probe_concurrency),
+        'tls': args.probe_tls,
+        'action': args.probe,
+        'report_file': args.probe_report,
+    }
+
+def fetch_subscription_texts(args, log_file=None):
+    """并发下载订阅，返回(订阅内容列表, 是否全部未变化)"""
+    cache_dir = None if args.no_cache else args.cache_dir
+    with profiler.stage('fetch'):
+        results = subscription.fetch_subscriptions(args.url, cache_dir=cache_dir)
+    status_text = {
+        'fetched': '已更新',
+        'unchanged': '未变化',
+        'stale': '下载失败，使用缓存',
+        'failed': '下载失败',
+    }
+    for result in results:
+        message = f"订阅 {result.url}: {status_text[result.status]}"
+        if result.error:
+            message += f" ({result.error})"
+        print(message, file=log_file)
+    return [result.text for result in results], all(result.status == 'unchanged' for result in results)
+
+def generate_from_sources(args, sources):
+    """按命令行参数生成配置，sources为[(来源, 输入文本)]，返回是否生成(并按要求推送)成功"""
+    if args.providers:
+        sources = [(source, process_vmess_links(text, jobs=args.jobs)) for source, text in sources]
+        if any(proxies for _, proxies in sources):
+            generate_provider_config(sources, args.output_file, shard_by=args.providers,
+                                     providers_dir=args.providers_dir, dedupe=args.dedupe, rename=args.rename,
+                                     expand_filters=args.expand_filters, verify_filters=args.verify_filters,
+                                     output_format=args.format, compact=args.compact)
+            return push_output(args)
+        return False
+    
+    proxies = process_vmess_links('\n'.join(text for _, text in sources), jobs=args.jobs)
+    if proxies:
+        generate_clash_config(proxies, args.output_file, incremental=args.incremental,
+                              dedupe=args.dedupe, rename=args.rename,
+                              expand_filters=args.expand_filters, verify_filters=args.verify_filters,
+                              probe_options=probe_options_from_args(args),
+                              output_format=args.format, compact=args.compact)
+        return push_output(args)
+    return False
+
+def push_output(args):
+    """指定--push时把输出文件推送到运行中的Clash，返回是否成功(不推送时为True)"""
+    if not args.push:
+        return True
+    with profiler.stage('push'):
+        return controller.push_and_report(args.output_file, args.controller, args.controller_secret)
+
+# 不影响输出内容的命令行参数，不计入生成选项的哈希
+_RUNTIME_OPTIONS = {'input_file', 'output', 'jobs', 'cache_dir', 'no_cache', 'watch', 'watch_interval',
+                    'profile', 'profile_report', 'profile_no_memory'}
+
+def generation_digest(args):
+    """订阅地址和影响输出的命令行参数(格式、去重、分片、推送等)的哈希"""
+    options = {key: value for key, value in vars(args).items() if key not in _RUNTIME_OPTIONS}
+    data = json.dumps(options, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def output_up_to_date(args):
+    """上次用相同的订阅和选项生成了输出文件，且文件之后没有被修改"""
+    if args.no_cache:
+        return False
+    state = subscription.SubscriptionCache(args.cache_dir).load_output_state(args.output_file)
+    if not state or state.get('options') != generation_digest(args):
+        return False
+    return state.get('sha256') == atomic_write.file_sha256(args.output_file)
+
+def save_output_state(args):
+    """记录这次生成使用的选项和输出文件的哈希，供下次判断是否可以跳过生成"""
+    digest = atomic_write.file_sha256(args.output_file)
+    if args.no_cache or digest is None:
+        return
+    try:
+        subscription.SubscriptionCache(args.cache_dir).save_output_state(
+            args.output_file, {'options': generation_digest(args), 'sha256': digest})
+    except OSError as e:
+        print(f"无法保存生成状态: {e}")
+
+def run_stream(args):
+    """流式模式: 日志输出到标准错误，节点输出到标准输出"""
+    streams = []
+    if args.url:
+        texts, _ = fetch_subscription_texts(args, log_file=sys.stderr)
+        streams.extend(io.StringIO(text) for text in texts)
+    
+    if args.input_file:
+        with open(args.input_file, 'r') as f, profiler.stage('stream'):
+            stream_clash_proxies(streams + [f], output_format=args.stream_format, log_file=sys.stderr, jobs=args.jobs)
+        return
+    if not args.url:
+        print("请粘贴vmess链接，完成后按Ctrl+D (Unix/Linux/Mac) 或 Ctrl+Z (Windows):", file=sys.stderr)
+        streams.append(sys.stdin)
+    with profiler.stage('stream'):
+        stream_clash_proxies(streams, output_format=args.stream_format, log_file=sys.stderr, jobs=args.jobs)
+
+def run_watch(args):
+    """监视模式: 输入文件内容变化时重新转换并生成配置"""
+    if not args.input_file or args.url or args.stream:
+        print("错误: --watch 需要指定输入文件，不能与订阅地址或 --stream 一起使用")
+        return
+    
+    def regenerate():
+        with profiler.stage('read'):
+            with open(args.input_file, 'r') as f:
+                text = f.read()
+        generate_from_sources(args, [(args.input_file, text)])
+    
+    watch.watch([args.input_file], profiler.wrap(regenerate, args.profile, args.profile_report,
+                                                trace_memory=not args.profile_no_memory),
+                args.watch_interval)
+
+def run_convert(args):
+    """普通模式: 读取输入和订阅，转换后生成完整配置"""
+    sources = []
+    if args.url:
+        # 从订阅地址下载
+        texts, unchanged = fetch_subscription_texts(args)
+        sources.extend(zip(args.url, texts))
+        if unchanged and not args.input_file and output_up_to_date(args):
+            print(f"所有订阅均未变化，{args.output_file} 保持不变")
+            return
     
-    # 写入配置文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        yaml.dump(config, f, allow_unicode=True, sort_keys=False)
+    if args.input_file:
+        # 从文件读取
+        input_file = args.input_file
+        try:
+            with open(input_file, 'r') as f, profiler.stage('read'):
+                sources.append((input_file, f.read()))
+        except FileNotFoundError:
+            print(f"错误: 找不到文件 '{input_file}'")
+            print_usage()
+            return
+        except Exception as e:
+            print(f"读取文件时出错: {e}")
+            return
+    elif not args.url:
+        # 从标准输入读取
+        print("请粘贴vmess链接，完成后按Ctrl+D (Unix/Linux/Mac) 或 Ctrl+Z (Windows):")
+        sources.append(('stdin', sys.stdin.read()))
     
-    print(f"配置已保存到 {output_file}")
+    # 只有全部来自订阅时下次才可能跳过生成，推送失败时不记录，下次重新推送
+    if generate_from_sources(args, sources) and args.url and not args.input_file:
+        save_output_state(args)
 
 def main():
     """主函数"""
+    args = parse_args()
+    trace_memory = not args.profile_no_memory
+    if not args.no_cache:
+        serializer.set_fragment_cache(os.path.join(args.cache_dir, FRAGMENT_CACHE_SUBDIR))
+    if args.providers and (args.incremental or args.probe or args.stream):
+        print("错误: --providers 不能与 --incremental、--probe 或 --stream 一起使用")
+        return
+    if args.push and args.stream:
+        print("错误: --push 不能与 --stream 一起使用")
+        return
     try:
-        if len(sys.argv) > 1:
-            # 从文件读取
-            input_file = sys.argv[1]
-            try:
-                with open(input_file, 'r') as f:
-                    input_text = f.read()
-            except FileNotFoundError:
-                print(f"错误: 找不到文件 '{input_file}'")
-                print_usage()
-                return
-            except Exception as e:
-                print(f"读取文件时出错: {e}")
-                return
-        else:
-            # 从标准输入读取
-            print("请粘贴vmess链接，完成后按Ctrl+D (Unix/Linux/Mac) 或 Ctrl+Z (Windows):")
-            input_text = sys.stdin.read()
-        
-        proxies = process_vmess_links(input_text)
-        
-        if proxies:
-            output_file = 'modified_config.yaml'
-            if len(sys.argv) > 2:
-                output_file = sys.argv[2]
-            
-            generate_clash_config(proxies, output_file)
+        if args.stream:
+            # 流式模式的标准输出是节点数据，剖析汇总表输出到标准错误
+            profiler.wrap(lambda: run_stream(args), args.profile, args.profile_report,
+                          trace_memory, file=sys.stderr)()
+            return
+        if args.watch:
+            run_watch(args)
+            return
+        profiler.wrap(lambda: run_convert(args), args.profile, args.profile_report, trace_memory)()
     except KeyboardInterrupt:
-        print("\n操作已取消")
+        print("\n操作已取消", file=sys.stderr if args.stream else None)
     except Exception as e:
-        print(f"发生错误: {e}")
+        print(f"发生错误: {e}", file=sys.stderr if args.stream else None)
         print_usage()
 
 def print_usage():
@@ -694,6 +1110,14 @@ def print_usage():
     print("     然后粘贴vmess链接，完成后按Ctrl+D (Mac/Linux) 或 Ctrl+Z (Windows)")
     print("  2. 从文件读取: ./vmess_to_yaml.py input.txt")
     print("  3. 指定输出文件: ./vmess_to_yaml.py input.txt custom_config.yaml")
+    print("  4. 下载订阅: ./vmess_to_yaml.py -u https://example.com/sub1 -u https://example.com/sub2 -o config.yaml")
+    print("  5. 增量合并: ./vmess_to_yaml.py --incremental input.txt")
+    print("  6. 多进程转换: ./vmess_to_yaml.py --jobs 8 input.txt")
+    print("  7. 流式输出: ./vmess_to_yaml.py --stream [--stream-format ndjson|yaml] input.txt")
+    print("  8. 探测节点: ./vmess_to_yaml.py --probe drop [--probe-tls] input.txt")
+    print("  9. 监视输入: ./vmess_to_yaml.py --watch input.txt")
+    print("  10. 分片提供者: ./vmess_to_yaml.py --providers source -u https://example.com/sub1 -u https://example.com/sub2")
+    print("  11. 推送到运行中的Clash: ./vmess_to_yaml.py --providers region --push input.txt")
     print("\n配置文件说明:")
     print("  - 生成的配置文件包含完整的Clash配置，包括代理、代理组和规则")
     print("  - 自动创建多个代理组：自动选择、手动选择、国外网站、电报消息等")
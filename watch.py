@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""监视输入文件，内容变化时在当前进程内重新生成配置
+
+按固定间隔检查文件的修改时间和大小，只有这两项变化时才读取文件计算哈希，
+内容哈希确实改变后才调用回调，touch或写入相同内容不会触发重新生成。
+"""
+
+import hashlib
+import os
+import time
+
+DEFAULT_INTERVAL = 0.5
+
+def _stat_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _content_hash(path):
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+class FileWatcher:
+    """记录每个文件的stat签名和内容哈希，poll返回内容发生变化的文件"""
+
+    def __init__(self, paths):
+        self.paths = list(dict.fromkeys(paths))
+        self._signatures = {}
+        self._hashes = {}
+        for path in self.paths:
+            self._signatures[path] = _stat_signature(path)
+            self._hashes[path] = _content_hash(path)
+
+    def poll(self):
+        """检查所有文件，返回内容哈希改变的文件列表"""
+        changed = []
+        for path in self.paths:
+            signature = _stat_signature(path)
+            if signature == self._signatures[path]:
+                continue
+            self._signatures[path] = signature
+            content_hash = _content_hash(path)
+            if content_hash != self._hashes[path]:
+                self._hashes[path] = content_hash
+                changed.append(path)
+        return changed
+
+def watch(paths, callback, interval=DEFAULT_INTERVAL):
+    """先调用一次callback，之后每当paths中的文件内容变化时再调用，直到Ctrl+C
+
+    callback中的异常只打印不退出，修正输入文件后会再次生成。
+    """
+    watcher = FileWatcher(paths)
+    print(f"正在监视 {', '.join(watcher.paths)}，按Ctrl+C退出")
+
+    def run(reason):
+        started = time.perf_counter()
+        try:
+            callback()
+        except Exception as e:
+            print(f"生成失败: {e}")
+            return
+        print(f"{reason}，用时 {time.perf_counter() - started:.3f} 秒")
+
+    run("初次生成完成")
+    try:
+        while True:
+            time.sleep(interval)
+            changed = watcher.poll()
+            if changed:
+                run(f"检测到 {', '.join(changed)} 变化，已重新生成")
+    except KeyboardInterrupt:
+        print("\n已停止监视")